@@ -99,8 +99,11 @@ async def name_add(message: types.Message, state: FSMContext):
         'На английском' : eng_name
     }
     
-    sucsess = update_resume_by_id(resume_id=resume_id, update_data=update_data, worksheet_name='Имя')
-    two_sucsess = update_cell_by_id_and_column(resume_id, 'Имя', name)
+    results = await asyncio.to_thread(update_resume_rows, resume_id, {
+        'Имя': update_data,
+        MAIN_WORKSHEET_NAME: {'Имя': name},
+    })
+    sucsess, two_sucsess = results['Имя'], results[MAIN_WORKSHEET_NAME]
     
     if sucsess and two_sucsess:
         await message.answer('✅Данные обновлены')
@@ -136,8 +139,11 @@ async def surname_add(message: types.Message, state: FSMContext):
         'На английском' : eng_name
     }
     
-    sucsess = update_resume_by_id(resume_id=resume_id, update_data=update_data, worksheet_name='Фамилия')
-    two_sucsess = update_cell_by_id_and_column(resume_id, 'Фамилия', name)
+    results = await asyncio.to_thread(update_resume_rows, resume_id, {
+        'Фамилия': update_data,
+        MAIN_WORKSHEET_NAME: {'Фамилия': name},
+    })
+    sucsess, two_sucsess = results['Фамилия'], results[MAIN_WORKSHEET_NAME]
     
     if sucsess and two_sucsess:
         await message.answer('✅Данные обновлены')
@@ -230,8 +236,11 @@ async def cancel_add_new_lang(callback: types.CallbackQuery, state: FSMContext):
     
     lang_str = ", ".join([f"{lang}: {lvl}" for lang, lvl in lang_dict.items()])
     
-    sucsess = update_resume_by_id(resume_id=resume_id, update_data=lang_dict, worksheet_name='Иностранные языки')
-    two_sucsess = update_cell_by_id_and_column(resume_id, 'Иностранные языки', lang_str)
+    results = await asyncio.to_thread(update_resume_rows, resume_id, {
+        'Иностранные языки': dict(lang_dict),
+        MAIN_WORKSHEET_NAME: {'Иностранные языки': lang_str},
+    })
+    sucsess, two_sucsess = results['Иностранные языки'], results[MAIN_WORKSHEET_NAME]
     
     if sucsess and two_sucsess:
         await callback.message.answer('✅Данные обновлены')
@@ -292,8 +301,11 @@ async def location_add(message: types.Message, state: FSMContext):
     
     location = data['country'] + ', ' + city
     
-    sucsess = update_resume_by_id(resume_id=resume_id, update_data=update_data, worksheet_name='Локация')
-    two_sucsess = update_cell_by_id_and_column(resume_id, 'Локация', location)
+    results = await asyncio.to_thread(update_resume_rows, resume_id, {
+        'Локация': update_data,
+        MAIN_WORKSHEET_NAME: {'Локация': location},
+    })
+    sucsess, two_sucsess = results['Локация'], results[MAIN_WORKSHEET_NAME]
     
     if sucsess and two_sucsess:
         await message.answer('✅Данные обновлены')
@@ -318,8 +330,9 @@ async def salary_add(message: types.Message, state: FSMContext):
         await message.answer('❌ Вы ввели не число')
         return
     value = int(value)
-    sucsess = update_cell_by_id_and_column(resume_id, 'Зарплатные ожидания (на руки)', salary)
-    
+    sucsess = (await asyncio.to_thread(update_resume_rows, resume_id, {
+        MAIN_WORKSHEET_NAME: {'Зарплатные ожидания (на руки)': salary},
+    }))[MAIN_WORKSHEET_NAME]
     
     currency = salary.split(" ")[1].upper()
     print(currency)
@@ -336,19 +349,29 @@ async def salary_add(message: types.Message, state: FSMContext):
         await message.answer('Неверная валюта')
         return
     
-    contract_data_sng = search_and_extract_values(search_col, value, ["M",'N','O','P'], "Расчет ставки (штат/контракт) СНГ")
-    ip_data_sng = search_and_extract_values(search_col, value, ["M",'N','O','P'], "Расчет ставки (ИП) СНГ")
-    samozanyatii_data_sng = search_and_extract_values(search_col, value, ["M",'N','O','P'], "Расчет ставки (Самозанятый) СНГ")
+    # Поиск по листам расчёта может загружать лист целиком, поэтому идёт в отдельном потоке
+    contract_data_sng = await asyncio.to_thread(search_and_extract_values, search_col, value, ["M",'N','O','P'], "Расчет ставки (штат/контракт) СНГ")
+    ip_data_sng = await asyncio.to_thread(search_and_extract_values, search_col, value, ["M",'N','O','P'], "Расчет ставки (ИП) СНГ")
+    samozanyatii_data_sng = await asyncio.to_thread(search_and_extract_values, search_col, value, ["M",'N','O','P'], "Расчет ставки (Самозанятый) СНГ")
             
-    contract_data_es = search_and_extract_values(search_col, value, ['M','N','O', 'P'], "Расчет ставки (штат/контракт) ЕС/США")
-    ip_data_es = search_and_extract_values(search_col, value, ["M",'N','O','P'], "Расчет ставки (ИП) ЕС/США")
-    samozanyatii_data_es = search_and_extract_values(search_col, value, ["M",'N','O','P'], "Расчет ставки (Самозанятый) ЕС/США")
+    contract_data_es = await asyncio.to_thread(search_and_extract_values, search_col, value, ['M','N','O', 'P'], "Расчет ставки (штат/контракт) ЕС/США")
+    ip_data_es = await asyncio.to_thread(search_and_extract_values, search_col, value, ["M",'N','O','P'], "Расчет ставки (ИП) ЕС/США")
+    samozanyatii_data_es = await asyncio.to_thread(search_and_extract_values, search_col, value, ["M",'N','O','P'], "Расчет ставки (Самозанятый) ЕС/США")
     print(contract_data_es)
     print(ip_data_es)
     print(samozanyatii_data_es)
     print(contract_data_sng)
     print(ip_data_sng)
     print(samozanyatii_data_sng)
+    rate_lookups = [contract_data_sng, ip_data_sng, samozanyatii_data_sng, contract_data_es, ip_data_es, samozanyatii_data_es]
+    if not all(rate_lookups):
+        # Ставки не нашлись в листах расчёта — сохраняем только зарплату
+        if sucsess:
+            await message.answer('✅ Зарплата сохранена, но ставки для неё не найдены в листах расчёта')
+        else:
+            await message.answer('❌ Не удалось обновить данные')
+        await state.clear()
+        return
     try:
         data_for_sng_rate_sheet = {
 
@@ -383,18 +406,20 @@ async def salary_add(message: types.Message, state: FSMContext):
         }
         
         
-        sucsess = update_resume_by_id(resume_id, data_for_sng_rate_sheet, 'Рейт для Заказчика (СНГ)')
-        two_sucsess = update_resume_by_id(resume_id, date_for_eur_rate_sheet, 'Рейт для Заказчика (ЕС/США)')
-        if sucsess and two_sucsess:
+        # Оба листа рейтов обновляются одним запросом
+        results = await asyncio.to_thread(update_resume_rows, resume_id, {
+            'Рейт для Заказчика (СНГ)': data_for_sng_rate_sheet,
+            'Рейт для Заказчика (ЕС/США)': date_for_eur_rate_sheet,
+        })
+        if sucsess and all(results.values()):
             await message.answer('✅Данные обновлены')
         else:
             await message.answer('❌ Не удалось обновить данные')
                 
     except Exception as e:
-        await message.answer(f"⚠️ Не удалось добавить {k} в Google таблицу. Проверьте настройки.")
+        print(f"❌ Ошибка при обновлении зарплаты: {e}")
+        await message.answer("⚠️ Не удалось обновить зарплату в Google таблице. Проверьте настройки.")
     
-    if sucsess:
-        await message.answer('✅Данные обновлены')
     await state.clear()
 
 
@@ -436,8 +461,11 @@ async def cancel_add_contacts(callback: types.CallbackQuery, state: FSMContext):
     
     contacts_str = ", ".join(contacts_dict.values())
     
-    sucsess = update_resume_by_id(resume_id=resume_id, update_data=contacts_dict, worksheet_name='Контакты')
-    two_sucsess = update_cell_by_id_and_column(resume_id, 'Контакты', contacts_str)
+    results = await asyncio.to_thread(update_resume_rows, resume_id, {
+        'Контакты': dict(contacts_dict),
+        MAIN_WORKSHEET_NAME: {'Контакты': contacts_str},
+    })
+    sucsess, two_sucsess = results['Контакты'], results[MAIN_WORKSHEET_NAME]
     
     if sucsess and two_sucsess:
         await callback.message.answer('✅Данные обновлены')
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Скрипт для сравнения движков разбора PDF на локальной папке с резюме
+
+Пример: python benchmark_pdf_backends.py ./cv_corpus --backends pypdf2 pypdfium2 pdfminer
+"""
+
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from pdf_backends import PDF_BACKENDS
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss в Linux в килобайтах, в macOS — в байтах
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_backend(backend_name: str, paths: list, results):
+    """Разбирает все файлы одним движком (в отдельном процессе, чтобы пиковая память не смешивалась)"""
+    backend = PDF_BACKENDS[backend_name]
+    pages = 0
+    chars = 0
+    errors = 0
+    started = time.perf_counter()
+    for path in paths:
+        try:
+            for page_text in backend.iter_page_texts(path):
+                pages += 1
+                chars += len(page_text)
+        except Exception as e:
+            errors += 1
+            print(f"❌ {backend_name}: {os.path.basename(path)}: {e}")
+    elapsed = time.perf_counter() - started
+    results.put({
+        'backend': backend_name,
+        'pages': pages,
+        'chars': chars,
+        'errors': errors,
+        'seconds': elapsed,
+        'pages_per_second': pages / elapsed if elapsed else 0.0,
+        'peak_rss_mb': _peak_rss_mb(),
+    })
+
+
+def main():
+    """Запускает каждый движок на всех PDF из папки и печатает сводную таблицу"""
+    parser = argparse.ArgumentParser(description="Сравнение движков разбора PDF")
+    parser.add_argument('corpus', help="Папка с PDF-файлами")
+    parser.add_argument('--backends', nargs='+', default=list(PDF_BACKENDS), help="Движки для сравнения")
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(args.corpus)
+        for name in names
+        if name.lower().endswith('.pdf')
+    )
+    if not paths:
+        print(f"❌ В папке {args.corpus} нет PDF-файлов")
+        return
+
+    print(f"📄 Файлов: {len(paths)}")
+    rows = []
+    for backend_name in args.backends:
+        backend = PDF_BACKENDS.get(backend_name)
+        if backend is None or not backend.available:
+            print(f"⚠️ Движок {backend_name} не установлен, пропускаю")
+            continue
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_run_backend, args=(backend_name, paths, results))
+        process.start()
+        rows.append(results.get())
+        process.join()
+
+    print(f"\n{'движок':<12}{'страниц':>10}{'стр/с':>10}{'пик RSS, МБ':>14}{'символов':>12}{'ошибок':>9}")
+    for row in rows:
+        print(
+            f"{row['backend']:<12}{row['pages']:>10}{row['pages_per_second']:>10.1f}"
+            f"{row['peak_rss_mb']:>14.1f}{row['chars']:>12}{row['errors']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
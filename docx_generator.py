@@ -117,10 +117,8 @@ def create_styled_document():
     
     return doc
 
-def process_styled_text_to_docx(doc: Document, text: str, title: str = "Документ"):
-    """Обрабатывает текст с HTML-тегами стилизации и добавляет в документ Word"""
-    
-    # Добавляем заголовок документа
+def add_document_title(doc: Document, title: str):
+    """Добавляет заголовок документа и возвращает его run (текст можно задать позже)"""
     title_paragraph = doc.add_paragraph()
     title_run = title_paragraph.add_run(title)
     
@@ -133,79 +131,118 @@ def process_styled_text_to_docx(doc: Document, text: str, title: str = "Доку
         title_run.font.bold = True
         title_run.font.color.rgb = RGBColor(51, 51, 51)  # DARK_GRAY
         title_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    return title_run
+
+def add_styled_paragraph(doc: Document, paragraph_text: str):
+    """Добавляет в документ одну строку текста с HTML-тегами стилизации"""
+    if not paragraph_text.strip():
+        # Добавляем пустой параграф для пустых строк
+        doc.add_paragraph()
+        return
+    
+    safe_paragraph = paragraph_text.strip()
+    
+    # Обрабатываем <br> теги
+    if safe_paragraph == '<br>' or safe_paragraph == '<br/>':
+        doc.add_paragraph()  # Добавляем пустой параграф
+        return
+    
+    # Удаляем проблемные символы
+    safe_paragraph = safe_paragraph.replace('■', '')
+    safe_paragraph = safe_paragraph.replace('\ufffd', '')
+    safe_paragraph = safe_paragraph.replace('\u25a0', '')
+    safe_paragraph = ' '.join(safe_paragraph.split())
+    
+    # Удаляем одиночные <br> теги
+    safe_paragraph = re.sub(r'<br\s*/?>', '', safe_paragraph, flags=re.IGNORECASE)
+    
+    if not safe_paragraph:
+        return
+    
+    # Определяем стиль и обрабатываем HTML теги
+    paragraph = doc.add_paragraph()
+    
+    # Проверяем, является ли это заголовком секции (поддерживаем оба цвета)
+    if re.search(r'<b color="#(1F4E79|4A90E2)">', safe_paragraph, re.IGNORECASE):
+        try:
+            paragraph.style = 'SectionHeader'
+        except KeyError:
+            # Применяем форматирование напрямую
+            pass
+        # Убираем HTML теги и делаем текст заглавными буквами
+        clean_text = re.sub(r'<b color="#(1F4E79|4A90E2)">(.*?)</b>', r'\2', safe_paragraph, flags=re.IGNORECASE)
+        run = paragraph.add_run(clean_text.upper())
+        run.font.size = Pt(14)
+        run.font.bold = True
+        run.font.color.rgb = RGBColor(31, 78, 121)  # PRIMARY_BLUE
+        
+    # Проверяем, является ли это подзаголовком
+    elif re.search(r'<b>(?!.*color)', safe_paragraph, re.IGNORECASE):
+        try:
+            paragraph.style = 'SubHeader'
+        except KeyError:
+            pass
+        clean_text = re.sub(r'<b>(.*?)</b>', r'\1', safe_paragraph, flags=re.IGNORECASE)
+        run = paragraph.add_run(clean_text)
+        run.font.size = Pt(12)
+        run.font.bold = True
+        run.font.color.rgb = RGBColor(0, 0, 0)  # BLACK
+        
+    # Проверяем, содержит ли вторичный текст
+    elif re.search(r'color="#555555"', safe_paragraph, re.IGNORECASE):
+        try:
+            paragraph.style = 'SecondaryText'
+        except KeyError:
+            pass
+        # Обрабатываем смешанный контент с тегами
+        process_mixed_content(paragraph, safe_paragraph)
+        
+    else:
+        # Обычный текст с возможными цветными вставками
+        try:
+            paragraph.style = 'CustomBody'
+        except KeyError:
+            pass
+        process_mixed_content(paragraph, safe_paragraph)
+
+def process_styled_text_to_docx(doc: Document, text: str, title: str = "Документ"):
+    """Обрабатывает текст с HTML-тегами стилизации и добавляет в документ Word"""
+    
+    # Добавляем заголовок документа
+    add_document_title(doc, title)
     
     # Разбиваем текст на параграфы
-    paragraphs = text.split('\n')
+    for paragraph_text in text.split('\n'):
+        add_styled_paragraph(doc, paragraph_text)
+
+def document_to_bytes(doc: Document) -> bytes:
+    """Сохраняет документ Word в память и возвращает его байты"""
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    docx_bytes = buffer.getvalue()
+    buffer.close()
+    return docx_bytes
+
+class StreamingDocxBuilder:
+    """Собирает документ Word по строкам по мере их генерации моделью"""
     
-    for paragraph_text in paragraphs:
-        if paragraph_text.strip():
-            safe_paragraph = paragraph_text.strip()
-            
-            # Обрабатываем <br> теги
-            if safe_paragraph == '<br>' or safe_paragraph == '<br/>':
-                doc.add_paragraph()  # Добавляем пустой параграф
-                continue
-            
-            # Удаляем проблемные символы
-            safe_paragraph = safe_paragraph.replace('■', '')
-            safe_paragraph = safe_paragraph.replace('\ufffd', '')
-            safe_paragraph = safe_paragraph.replace('\u25a0', '')
-            safe_paragraph = ' '.join(safe_paragraph.split())
-            
-            # Удаляем одиночные <br> теги
-            safe_paragraph = re.sub(r'<br\s*/?>', '', safe_paragraph, flags=re.IGNORECASE)
-            
-            if not safe_paragraph:
-                continue
-            
-            # Определяем стиль и обрабатываем HTML теги
-            paragraph = doc.add_paragraph()
-            
-            # Проверяем, является ли это заголовком секции (поддерживаем оба цвета)
-            if re.search(r'<b color="#(1F4E79|4A90E2)">', safe_paragraph, re.IGNORECASE):
-                try:
-                    paragraph.style = 'SectionHeader'
-                except KeyError:
-                    # Применяем форматирование напрямую
-                    pass
-                # Убираем HTML теги и делаем текст заглавными буквами
-                clean_text = re.sub(r'<b color="#(1F4E79|4A90E2)">(.*?)</b>', r'\2', safe_paragraph, flags=re.IGNORECASE)
-                run = paragraph.add_run(clean_text.upper())
-                run.font.size = Pt(14)
-                run.font.bold = True
-                run.font.color.rgb = RGBColor(31, 78, 121)  # PRIMARY_BLUE
-                
-            # Проверяем, является ли это подзаголовком
-            elif re.search(r'<b>(?!.*color)', safe_paragraph, re.IGNORECASE):
-                try:
-                    paragraph.style = 'SubHeader'
-                except KeyError:
-                    pass
-                clean_text = re.sub(r'<b>(.*?)</b>', r'\1', safe_paragraph, flags=re.IGNORECASE)
-                run = paragraph.add_run(clean_text)
-                run.font.size = Pt(12)
-                run.font.bold = True
-                run.font.color.rgb = RGBColor(0, 0, 0)  # BLACK
-                
-            # Проверяем, содержит ли вторичный текст
-            elif re.search(r'color="#555555"', safe_paragraph, re.IGNORECASE):
-                try:
-                    paragraph.style = 'SecondaryText'
-                except KeyError:
-                    pass
-                # Обрабатываем смешанный контент с тегами
-                process_mixed_content(paragraph, safe_paragraph)
-                
-            else:
-                # Обычный текст с возможными цветными вставками
-                try:
-                    paragraph.style = 'CustomBody'
-                except KeyError:
-                    pass
-                process_mixed_content(paragraph, safe_paragraph)
-        else:
-            # Добавляем пустой параграф для пустых строк
-            doc.add_paragraph()
+    def __init__(self):
+        self.doc = create_styled_document()
+        # Заголовок (имя кандидата) может быть ещё неизвестен — он задаётся при сохранении
+        self._title_run = add_document_title(self.doc, "")
+        self.line_count = 0
+    
+    def add_line(self, line: str):
+        add_styled_paragraph(self.doc, line)
+        self.line_count += 1
+    
+    def to_bytes(self, title: str = "Документ") -> Optional[bytes]:
+        try:
+            self._title_run.text = title
+            return document_to_bytes(self.doc)
+        except Exception as e:
+            logger.error(f"Ошибка создания Word документа в памяти: {e}")
+            return None
 
 def process_mixed_content(paragraph, text):
     """Обрабатывает текст со смешанным содержимым (обычный текст + HTML теги)"""
@@ -295,13 +332,8 @@ def create_docx_bytes_from_text(text: str, title: str = "Документ") -> O
         # Обрабатываем и добавляем текст
         process_styled_text_to_docx(doc, text, title)
         
-        # Создаем буфер в памяти
-        buffer = io.BytesIO()
-        doc.save(buffer)
-        
-        # Получаем байты
-        docx_bytes = buffer.getvalue()
-        buffer.close()
+        # Сохраняем документ в память
+        docx_bytes = document_to_bytes(doc)
         
         logger.info("Word документ успешно создан в памяти")
         return docx_bytes
@@ -310,21 +342,19 @@ def create_docx_bytes_from_text(text: str, title: str = "Документ") -> O
         logger.error(f"Ошибка создания Word документа в памяти: {e}")
         return None
 
-def create_and_upload_docx_to_drive(
-    text: str, 
+def upload_docx_bytes_to_drive(
+    docx_bytes: bytes,
     file_name: str,
     folder_name: Optional[str] = None,
-    title: str = "Документ",
     credentials_path: str = "oauth.json"
 ) -> Dict[str, Any]:
     """
-    Создает Word документ из текста и загружает его в Google Drive
+    Загружает готовый Word документ из байтов в Google Drive и делает его общедоступным
     
     Args:
-        text: Текст для записи в документ
+        docx_bytes: Байты Word документа
         file_name: Имя файла (без расширения .docx)
         folder_name: Имя папки в Google Drive (создается если не существует)
-        title: Заголовок документа
         credentials_path: Путь к файлу OAuth credentials
     
     Returns:
@@ -335,14 +365,6 @@ def create_and_upload_docx_to_drive(
         if not file_name.endswith('.docx'):
             file_name += '.docx'
         
-        # Создаем Word документ в памяти
-        docx_bytes = create_docx_bytes_from_text(text, title)
-        if not docx_bytes:
-            return {
-                'success': False,
-                'error': 'Не удалось создать Word документ'
-            }
-        
         # Инициализируем Google Drive Manager
         drive_manager = GoogleDriveManager(credentials_path=credentials_path)
         
@@ -378,18 +400,46 @@ def create_and_upload_docx_to_drive(
                     logger.info(f"Word документ '{file_name}' успешно загружен и сделан общедоступным")
                 else:
                     logger.warning(f"Word документ '{file_name}' загружен, но не удалось сделать его общедоступным")
-            
-            return upload_result
-        else:
-            return upload_result
+        
+        return upload_result
             
     except Exception as e:
-        logger.error(f"Ошибка создания и загрузки Word документа: {e}")
+        logger.error(f"Ошибка загрузки Word документа: {e}")
         return {
             'success': False,
             'error': str(e)
         }
 
+def create_and_upload_docx_to_drive(
+    text: str, 
+    file_name: str,
+    folder_name: Optional[str] = None,
+    title: str = "Документ",
+    credentials_path: str = "oauth.json"
+) -> Dict[str, Any]:
+    """
+    Создает Word документ из текста и загружает его в Google Drive
+    
+    Args:
+        text: Текст для записи в документ
+        file_name: Имя файла (без расширения .docx)
+        folder_name: Имя папки в Google Drive (создается если не существует)
+        title: Заголовок документа
+        credentials_path: Путь к файлу OAuth credentials
+    
+    Returns:
+        Словарь с результатом операции
+    """
+    # Создаем Word документ в памяти
+    docx_bytes = create_docx_bytes_from_text(text, title)
+    if not docx_bytes:
+        return {
+            'success': False,
+            'error': 'Не удалось создать Word документ'
+        }
+    
+    return upload_docx_bytes_to_drive(docx_bytes, file_name, folder_name, credentials_path)
+
 def save_docx_locally_and_upload(
     text: str,
     file_name: str,
@@ -0,0 +1,149 @@
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+
+try:
+    import resource
+except ImportError:
+    # На Windows модуля resource нет: ограничение памяти не применяется
+    resource = None
+
+load_dotenv()
+
+# Количество процессов для разбора файлов (по умолчанию — по числу ядер)
+EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', str(os.cpu_count() or 1)))
+# Максимальное время разбора одного файла в секундах
+EXTRACTION_TIMEOUT = float(os.getenv('EXTRACTION_TIMEOUT', '60'))
+# Сколько памяти (МБ) процесс разбора может занять сверх унаследованной при запуске (0 — без ограничения)
+EXTRACTION_MEMORY_LIMIT_MB = int(os.getenv('EXTRACTION_MEMORY_LIMIT_MB', '1024'))
+
+_pool_lock = threading.Lock()
+_pool = None
+# Файл отправляется в пул, только когда есть свободный процесс: иначе таймаут учитывал бы ожидание в очереди
+_slots = None
+
+
+def _current_address_space() -> int:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _limit_worker_memory(limit_mb: int):
+    """Инициализатор процесса: ограничивает адресное пространство, чтобы огромный файл вызвал MemoryError"""
+    if resource is None or limit_mb <= 0:
+        return
+    limit = _current_address_space() + limit_mb * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError) as e:
+        print(f"⚠️ Не удалось ограничить память процесса разбора: {e}")
+
+
+def _context(method: str):
+    if method not in multiprocessing.get_all_start_methods():
+        return None
+    context = multiprocessing.get_context(method)
+    if method == 'forkserver':
+        # По умолчанию forkserver предзагружает __main__, то есть main.py со всеми обработчиками бота;
+        # процессам разбора нужен только funcs
+        context.set_forkserver_preload(['funcs'])
+    return context
+
+
+def _new_pool(context) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=max(1, EXTRACTION_WORKERS),
+        mp_context=context,
+        initializer=_limit_worker_memory,
+        initargs=(EXTRACTION_MEMORY_LIMIT_MB,),
+    )
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def start_extraction_pool():
+    """
+    Запускает процессы разбора при старте бота, пока в процессе нет других потоков
+
+    Вызывается из main.py до asyncio.run: fork из многопоточного процесса (потоки asyncio.to_thread,
+    gRPC-клиента Gemini) может оставить в дочернем процессе блокировки, захваченные другими потоками.
+    fork быстрее spawn и не импортирует заново main.py в каждом процессе разбора.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _new_pool(_context('fork'))
+            # Процессы fork-пула создаются при первой задаче — создаём их сейчас, пока нет потоков
+            _pool.submit(_warm_up).result()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Пул не запускался при старте или пересоздаётся после зависшего файла: бот уже многопоточный,
+            # поэтому процессы порождает forkserver — однопоточный процесс, а не сам бот
+            _pool = _new_pool(_context('forkserver'))
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor, terminate: bool = False):
+    """Убирает пул, чтобы следующий файл запустил новый; зависшие процессы завершаются принудительно"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    if terminate:
+        # У ProcessPoolExecutor нет публичного способа остановить зависшую задачу
+        for process in list((getattr(pool, '_processes', None) or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_in_extraction_pool(func, *args, timeout: float = EXTRACTION_TIMEOUT):
+    """
+    Выполняет разбор файла в отдельном процессе, не блокируя цикл событий бота
+
+    Args:
+        func: Функция уровня модуля (должна сериализоваться pickle)
+        *args: Аргументы функции
+        timeout: Максимальное время разбора в секундах
+
+    Returns:
+        Результат func
+
+    Raises:
+        Exception: если разбор не уложился во время или в лимит памяти
+    """
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(max(1, EXTRACTION_WORKERS))
+    async with _slots:
+        return await _run_with_retry(func, args, timeout)
+
+
+async def _run_with_retry(func, args: tuple, timeout: float):
+    for attempt in range(2):
+        pool = _get_pool()
+        try:
+            future = pool.submit(func, *args)
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            _discard_pool(pool, terminate=True)
+            raise Exception(f"разбор файла занял больше {timeout:.0f} с")
+        except MemoryError:
+            raise Exception(f"разбор файла превысил лимит памяти {EXTRACTION_MEMORY_LIMIT_MB} МБ")
+        except BrokenProcessPool:
+            # Пул сломан (процесс аварийно завершился или был остановлен по таймауту другого файла) — пробуем ещё раз
+            _discard_pool(pool)
+            if attempt:
+                raise Exception("процесс разбора файла аварийно завершился")
@@ -1,27 +1,67 @@
 import os
-import PyPDF2
+import re
 import docx
 import random
 import string
+import codecs
+import datetime
 from striprtf.striprtf import rtf_to_text
 from bs4 import BeautifulSoup
+try:
+    import charset_normalizer
+except ImportError:
+    charset_normalizer = None
+from typing import Optional, Union
+from extraction_pool import run_in_extraction_pool
+from pdf_backends import get_pdf_backend, open_binary
 
-async def process_pdf(file_path: str) -> str:
-    """Извлекает текст из PDF"""
-    text = ""
-    with open(file_path, "rb") as f:
-        reader = PyPDF2.PdfReader(f)
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
+# Ограничения разбора PDF: портфолио на сотни страниц не нужно целиком (0 — без ограничения)
+PDF_MAX_PAGES = int(os.getenv('PDF_MAX_PAGES', '30'))
+PDF_MAX_CHARS = int(os.getenv('PDF_MAX_CHARS', '200000'))
+
+
+def iter_pdf_page_lines(source: Union[str, bytes], max_pages: int = PDF_MAX_PAGES, max_chars: int = PDF_MAX_CHARS,
+                        backend: Optional[str] = None):
+    """
+    Постранично извлекает текст из PDF
     
-    # Удаляем пустые строки
-    lines = text.split('\n')
-    non_empty_lines = [line.strip() for line in lines if line.strip()]
-    return '\n'.join(non_empty_lines)
+    Args:
+        source: Путь к PDF или содержимое файла
+        max_pages: После скольких страниц остановиться
+        max_chars: После скольких символов остановиться
+        backend: Движок разбора (pypdf2, pypdfium2, pdfminer); по умолчанию — из PDF_BACKEND
+    
+    Yields:
+        Список непустых строк очередной страницы
+    """
+    pdf_backend = get_pdf_backend(backend)
+    label = os.path.basename(source) if isinstance(source, str) else "PDF"
+    total_chars = 0
+    page_number = 0
+    info = {}
+    for page_number, page_text in enumerate(pdf_backend.iter_page_texts(source, max_pages, info), start=1):
+        lines = [line.strip() for line in page_text.split('\n') if line.strip()]
+        yield lines
+        total_chars += sum(len(line) + 1 for line in lines)
+        if max_chars and total_chars >= max_chars:
+            print(f"✂️ {label}: текст обрезан на странице {page_number} (лимит {max_chars} символов)")
+            return
+    if max_pages and page_number == max_pages:
+        # Число страниц берётся из уже открытого документа: повторный разбор ради лога свёл бы на нет раннюю остановку
+        page_count = info.get('page_count')
+        if page_count is None:
+            print(f"✂️ {label}: разобраны первые {max_pages} страниц (лимит PDF_MAX_PAGES)")
+        elif page_count > max_pages:
+            print(f"✂️ {label}: разобрано {max_pages} из {page_count} страниц")
 
-async def process_docx(file_path: str) -> str:
+def extract_pdf_text(source: Union[str, bytes]) -> str:
+    """Извлекает текст из PDF; страницы разделены символом \\f (по ним compact_resume_text находит колонтитулы)"""
+    return '\f'.join('\n'.join(lines) for lines in iter_pdf_page_lines(source))
+
+def extract_docx_text(source: Union[str, bytes]) -> str:
     """Извлекает текст из DOCX"""
-    doc = docx.Document(file_path)
+    with open_binary(source) as f:
+        doc = docx.Document(f)
     text = "\n".join([para.text for para in doc.paragraphs])
     
     # Удаляем пустые строки
@@ -29,10 +69,10 @@ async def process_docx(file_path: str) -> str:
     non_empty_lines = [line.strip() for line in lines if line.strip()]
     return '\n'.join(non_empty_lines)
 
-async def process_rtf(file_path: str) -> str:
+def extract_rtf_text(source: Union[str, bytes]) -> str:
     """Извлекает текст из RTF"""
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        rtf_content = f.read()
+    with open_binary(source) as f:
+        rtf_content = f.read().decode('utf-8', errors='ignore')
     
     # Конвертируем RTF в текст
     text = rtf_to_text(rtf_content)
@@ -43,23 +83,86 @@ async def process_rtf(file_path: str) -> str:
     print('\n'.join(non_empty_lines))
     return '\n'.join(non_empty_lines)
 
-async def process_txt(file_path: str) -> str:
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    # BOM UTF-32 LE начинается с BOM UTF-16 LE, поэтому проверяется раньше
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+# Однобайтовые кириллические кодировки старых файлов
+_CYRILLIC_ENCODINGS = ['cp1251', 'koi8_r', 'cp866']
+_FREQUENT_RUSSIAN_LETTERS = set('оеаинтсрвлкмдпуяыь')
+
+
+def _utf16_without_bom(data: bytes) -> str | None:
+    """UTF-16 без BOM: в латинице и кириллице каждый второй байт почти всегда 0x00 или 0x04"""
+    sample = data[:4096]
+    if len(sample) < 4 or len(sample) % 2:
+        return None
+    high_even = sum(byte in (0, 4) for byte in sample[0::2]) / (len(sample) // 2)
+    high_odd = sum(byte in (0, 4) for byte in sample[1::2]) / (len(sample) // 2)
+    encoding = 'utf-16-le' if high_odd > 0.6 else 'utf-16-be' if high_even > 0.6 else None
+    if encoding is None:
+        return None
+    try:
+        return data.decode(encoding)
+    except UnicodeDecodeError:
+        return None
+
+
+def _russian_text_score(text: str) -> float:
+    """Доля частых строчных русских букв среди всех букв: у неверной кодировки она близка к нулю"""
+    letters = [ch for ch in text if ch.isalpha()]
+    if not letters:
+        return 0.0
+    return sum(ch in _FREQUENT_RUSSIAN_LETTERS for ch in letters) / len(letters)
+
+
+def decode_text_bytes(data: bytes) -> str:
+    """
+    Определяет кодировку текстового файла по содержимому и декодирует его за один проход
+    
+    Порядок: BOM, UTF-16 без BOM, UTF-8, однобайтовые кириллические кодировки
+    (cp1251, KOI8-R, cp866) по частоте русских букв, затем charset_normalizer.
+    
+    Args:
+        data: Содержимое файла
+    
+    Returns:
+        Декодированный текст
+    """
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return data.decode(encoding, errors='replace')
+
+    text = _utf16_without_bom(data)
+    if text is not None:
+        return text
+
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        pass
+
+    sample = data[:65536]
+    scores = {encoding: _russian_text_score(sample.decode(encoding, errors='replace')) for encoding in _CYRILLIC_ENCODINGS}
+    best_encoding = max(scores, key=scores.get)
+    if scores[best_encoding] >= 0.3:
+        return data.decode(best_encoding, errors='replace')
+
+    if charset_normalizer is not None:
+        best = charset_normalizer.from_bytes(data).best()
+        if best is not None:
+            return str(best)
+    return data.decode('cp1252', errors='replace')
+
+def extract_txt_text(source: Union[str, bytes]) -> str:
     """Извлекает текст из TXT"""
     try:
-        # Пробуем разные кодировки
-        encodings = ['utf-8', 'cp1251', 'windows-1251', 'iso-8859-1']
-        
-        for encoding in encodings:
-            try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    text = f.read()
-                break
-            except UnicodeDecodeError:
-                continue
-        else:
-            # Если все кодировки не сработали, используем utf-8 с игнорированием ошибок
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                text = f.read()
+        with open_binary(source) as f:
+            text = decode_text_bytes(f.read())
     
         # Удаляем пустые строки
         lines = text.split('\n')
@@ -70,6 +173,293 @@ async def process_txt(file_path: str) -> str:
         raise Exception(f"Ошибка при чтении TXT файла: {str(e)}") 
 
 
+# Разбор файлов нагружает процессор, поэтому выполняется в пуле процессов, а не в цикле событий бота.
+# Все функции принимают путь к файлу или его содержимое (для файлов, загруженных в память)
+async def process_pdf(source: Union[str, bytes]) -> str:
+    """Извлекает текст из PDF"""
+    return await run_in_extraction_pool(extract_pdf_text, source)
+
+async def process_docx(source: Union[str, bytes]) -> str:
+    """Извлекает текст из DOCX"""
+    return await run_in_extraction_pool(extract_docx_text, source)
+
+async def process_rtf(source: Union[str, bytes]) -> str:
+    """Извлекает текст из RTF"""
+    return await run_in_extraction_pool(extract_rtf_text, source)
+
+async def process_txt(source: Union[str, bytes]) -> str:
+    """Извлекает текст из TXT"""
+    return await run_in_extraction_pool(extract_txt_text, source)
+
+
+# Транслитерация кириллицы для сравнения имён, записанных разными алфавитами
+_CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+# Распространённые варианты латинского написания одних и тех же звуков
+_LATIN_NAME_VARIANTS = [
+    ('x', 'ks'),
+    ('kh', 'h'),
+    ('w', 'v'),
+]
+
+
+def normalize_name(name: str) -> str:
+    """Приводит имя к нижнему регистру, заменяет ё на е и схлопывает пробелы"""
+    if not name:
+        return ""
+    return " ".join(str(name).lower().replace('ё', 'е').split())
+
+
+def name_match_key(name: str) -> str:
+    """
+    Ключ для сравнения имён независимо от алфавита
+    
+    Кириллица транслитерируется, латинские варианты написания приводятся
+    к одному виду: "Иванов" и "Ivanov" дают одинаковый ключ "ivanov".
+    """
+    text = "".join(_CYRILLIC_TO_LATIN.get(ch, ch) for ch in normalize_name(name))
+    for variant, canonical in _LATIN_NAME_VARIANTS:
+        text = text.replace(variant, canonical)
+    text = re.sub(r'(iy|ij|ii)\b', 'y', text)
+    return re.sub(r'[^a-z]', '', text)
+
+
+# Локальное извлечение полей, которые регулярные выражения находят надёжнее модели
+_EMAIL_RE = re.compile(r'(?<![\w.+-])[\w.+-]+@[\w-]+(?:\.[\w-]+)*\.[a-z]{2,}', re.IGNORECASE)
+_PHONE_RE = re.compile(r'(?<![\w+])\+?\d[\d\s().\-–]{8,18}\d(?!\w)')
+# Номер без +, 8 или 7 в начале принимается, только если перед ним есть подпись вроде "Тел.:"
+_PHONE_KEYWORD_RE = re.compile(r'(?:тел|phone|mobile|моб|cell|whatsapp|viber)[^\n\d]{0,15}$', re.IGNORECASE)
+# Периоды работы ("01.2018 - 12.2020", "2015 – 2017") похожи на номер по количеству цифр
+_DATE_LIKE_RE = re.compile(r'(?<!\d)\d{1,2}\.(?:19|20)\d{2}(?!\d)|(?<!\d)(?:19|20)\d{2}\s*[-–—]\s*(?:19|20)\d{2}(?!\d)')
+_LINKEDIN_RE = re.compile(r'(?:https?://)?(?:[\w-]+\.)?linkedin\.com/in/[\w\-%.]+', re.IGNORECASE)
+_GITHUB_RE = re.compile(r'(?:https?://)?(?:www\.)?github\.com/[\w-]+', re.IGNORECASE)
+_GITLAB_RE = re.compile(r'(?:https?://)?(?:www\.)?gitlab\.com/[\w.-]+', re.IGNORECASE)
+_TELEGRAM_LINK_RE = re.compile(r'(?:https?://)?(?<![\w.])(?:t|telegram)\.me/(?P<handle>[A-Za-z]\w{4,31})', re.IGNORECASE)
+_TELEGRAM_HANDLE_RE = re.compile(
+    r'\b(?:telegram|телеграм|tg|тг)\b\s*[:\-–]?\s*@?(?P<handle>[A-Za-z]\w{4,31})\b', re.IGNORECASE
+)
+_BIRTH_KEYWORDS = r'(?:дата\s+рождения|д\.\s?р\.|родил(?:ся|ась)|date\s+of\s+birth|birth\s*date|born|dob)'
+_BIRTH_NUMERIC_RE = re.compile(
+    _BIRTH_KEYWORDS + r'\s*[:\-–]?\s*(?P<day>\d{1,2})[./-](?P<month>\d{1,2})[./-](?P<year>\d{4})',
+    re.IGNORECASE,
+)
+_BIRTH_WORDS_RE = re.compile(
+    _BIRTH_KEYWORDS + r'\s*[:\-–]?\s*(?P<day>\d{1,2})\s+(?P<month>[A-Za-zА-Яа-яё]+)\.?\s+(?P<year>\d{4})',
+    re.IGNORECASE,
+)
+_MONTHS = {
+    'янв': 1, 'фев': 2, 'мар': 3, 'апр': 4, 'мая': 5, 'май': 5, 'июн': 6, 'июл': 7, 'авг': 8,
+    'сен': 9, 'окт': 10, 'ноя': 11, 'дек': 12,
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6, 'jul': 7, 'aug': 8,
+    'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+_SALARY_IN_NAME_RE = re.compile(
+    r'(?P<prefix>[$€])?\s*(?<!\d)(?P<amount>\d{1,3}(?: \d{3})+|\d+)(?!\d)\s*(?P<thousands>[кk](?![a-zа-я]))?\s*'
+    r'(?P<currency>usd|eur|byn|rub|руб|р\.|у\.?\s?е\.?|\$|€)?',
+    re.IGNORECASE,
+)
+_SALARY_HINT_RE = re.compile(r'(?:^|[^a-zа-я])(?:от|до|зп|з/п|salary)\s*$', re.IGNORECASE)
+
+# Ключи контактов, которые заполняет локальный извлекатель
+LOCAL_CONTACT_KEYS = ['phone', 'email', 'linkedin', 'github', 'gitlab', 'telegram']
+
+# Ключи контактов модели, которые в листе «Контакты» называются иначе
+_CONTACT_SHEET_KEYS = {
+    'phone': 'телефон',
+    'email': 'e-mail',
+    'github': 'github/gitlab',
+    'gitlab': 'github/gitlab',
+    'twitter': 'x (twitter)',
+    'microsoftTeams': 'microsoft teams',
+    'googleMeet': 'google meet',
+    'stackoverflow': 'stack overflow',
+    'habrCareer': 'habr career',
+}
+
+
+def _normalize_phone(value: str) -> str | None:
+    digits = re.sub(r'\D', '', value)
+    if not 10 <= len(digits) <= 15:
+        return None
+    if len(digits) == 11 and digits[0] == '8':
+        digits = '7' + digits[1:]
+    elif len(digits) == 10 and digits[0] == '9':
+        digits = '7' + digits
+    return '+' + digits
+
+
+def _phone_from_match(text: str, match: re.Match) -> str | None:
+    value = match.group(0)
+    if _DATE_LIKE_RE.search(value):
+        return None
+    has_prefix = value[0] in '+78'
+    has_keyword = bool(_PHONE_KEYWORD_RE.search(text[max(0, match.start() - 30):match.start()]))
+    if not (has_prefix or has_keyword):
+        return None
+    return _normalize_phone(value)
+
+
+def _with_scheme(url: str) -> str:
+    return url if url.lower().startswith('http') else 'https://' + url
+
+
+def extract_contacts(text: str) -> dict:
+    """Извлекает телефон, e-mail, LinkedIn, GitHub, GitLab и Telegram из текста резюме"""
+    contacts = {}
+    text = text or ""
+
+    email = _EMAIL_RE.search(text)
+    if email:
+        contacts['email'] = email.group(0)
+
+    for match in _PHONE_RE.finditer(text):
+        phone = _phone_from_match(text, match)
+        if phone:
+            contacts['phone'] = phone
+            break
+
+    for key, pattern in (('linkedin', _LINKEDIN_RE), ('github', _GITHUB_RE), ('gitlab', _GITLAB_RE)):
+        match = pattern.search(text)
+        if match:
+            contacts[key] = _with_scheme(match.group(0).rstrip('.'))
+
+    telegram = _TELEGRAM_LINK_RE.search(text) or _TELEGRAM_HANDLE_RE.search(text)
+    if telegram:
+        contacts['telegram'] = '@' + telegram.group('handle')
+
+    return contacts
+
+
+def _format_date(day: int, month: int, year: int) -> str | None:
+    try:
+        return datetime.date(year, month, day).strftime('%d.%m.%Y')
+    except ValueError:
+        return None
+
+
+def extract_date_of_birth(text: str) -> str | None:
+    """Ищет дату рождения рядом с ключевыми словами и возвращает её в формате ДД.ММ.ГГГГ"""
+    text = text or ""
+    match = _BIRTH_NUMERIC_RE.search(text)
+    if match:
+        return _format_date(int(match.group('day')), int(match.group('month')), int(match.group('year')))
+    match = _BIRTH_WORDS_RE.search(text)
+    if match:
+        month = _MONTHS.get(match.group('month')[:3].lower())
+        if month:
+            return _format_date(int(match.group('day')), month, int(match.group('year')))
+    return None
+
+
+def extract_salary_from_file_name(file_name: str, allow_bare: bool = False) -> dict | None:
+    """
+    Ищет зарплатные ожидания в названии файла
+    
+    Число считается зарплатой, если рядом есть валюта, "к" или подсказка "от"/"до"/"зп"/"salary".
+    Голое число не меньше 10 000 принимается только при allow_bare: в названиях часто бывают
+    номера сканов, выгрузок и вакансий. Без валюты сумма считается в рублях, "у.е." — в долларах.
+    
+    Args:
+        file_name: Название файла
+        allow_bare: Принимать числа без валюты и подсказок
+    
+    Returns:
+        Словарь {'amount': '200000', 'currency': 'RUB'} или None
+    """
+    stem = os.path.splitext(os.path.basename(file_name or ""))[0].replace('_', ' ')
+    for match in _SALARY_IN_NAME_RE.finditer(stem):
+        amount = int(match.group('amount').replace(' ', ''))
+        marker = (match.group('prefix') or match.group('currency') or '').lower().replace(' ', '')
+        has_hint = bool(_SALARY_HINT_RE.search(stem[:match.start('amount')].rstrip('$€ ')))
+        if match.group('thousands'):
+            amount *= 1000
+        if not (marker or match.group('thousands') or has_hint or (allow_bare and amount >= 10000)):
+            continue
+        if not 0 < amount <= 10_000_000:
+            continue
+        if marker in ('$', 'usd') or marker.startswith('у'):
+            currency = 'USD'
+        elif marker in ('€', 'eur'):
+            currency = 'EUR'
+        elif marker == 'byn':
+            currency = 'BYN'
+        else:
+            currency = 'RUB'
+        return {'amount': str(amount), 'currency': currency}
+    return None
+
+
+def _is_valid_contact(key: str, value) -> bool:
+    if not isinstance(value, str) or not value.strip():
+        return False
+    if key == 'phone':
+        return _normalize_phone(value) is not None and not _DATE_LIKE_RE.search(value)
+    if key == 'email':
+        return bool(_EMAIL_RE.fullmatch(value.strip()))
+    if key in ('linkedin', 'github', 'gitlab'):
+        return f"{key}.com" in value.lower()
+    if key == 'telegram':
+        return bool(re.fullmatch(r'(?:@|(?:https?://)?t\.me/)?[A-Za-z]\w{4,31}', value.strip()))
+    return True
+
+
+def apply_local_fields(resume_data: dict, text: str, file_name: str = "") -> dict:
+    """
+    Дополняет и проверяет ответ модели данными локального извлечения
+    
+    Контакты из текста заполняют только те поля, которые модель не вернула или вернула
+    некорректными; дата рождения из текста заменяет значение модели. Зарплата из названия файла
+    с валютой или подсказкой заменяет зарплату модели, а голое число только заполняет пустую.
+    Текст нужно передавать до сжатия (compact_resume_text), чтобы не потерять колонтитулы.
+    
+    Args:
+        resume_data: Данные резюме от модели (изменяются на месте)
+        text: Текст резюме
+        file_name: Название файла
+    
+    Returns:
+        Те же resume_data
+    """
+    contacts = dict(resume_data.get('contacts') or {})
+    for key in LOCAL_CONTACT_KEYS:
+        if key in contacts and not _is_valid_contact(key, contacts[key]):
+            print(f"⚠️ Контакт {key} от модели отброшен как некорректный: {contacts[key]}")
+            del contacts[key]
+    for key, value in extract_contacts(text).items():
+        contacts.setdefault(key, value)
+    resume_data['contacts'] = contacts
+
+    date_of_birth = extract_date_of_birth(text)
+    if date_of_birth:
+        resume_data['dateOfBirth'] = date_of_birth
+
+    salary = extract_salary_from_file_name(file_name)
+    if not salary and not (resume_data.get('salaryExpectations') or {}).get('amount'):
+        salary = extract_salary_from_file_name(file_name, allow_bare=True)
+    if salary:
+        resume_data['salaryExpectations'] = salary
+    return resume_data
+
+
+def contacts_for_sheet(contacts: dict | None) -> dict:
+    """Переименовывает ключи контактов модели в названия столбцов листа «Контакты»"""
+    result = {}
+    for key, value in (contacts or {}).items():
+        sheet_key = _CONTACT_SHEET_KEYS.get(key, key)
+        if sheet_key in result:
+            # GitHub и GitLab попадают в один столбец
+            result[sheet_key] = f"{result[sheet_key]}, {value}"
+        else:
+            result[sheet_key] = value
+    return result
+
+
 def generate_random_id():
     letter = random.choice(string.ascii_lowercase)  # случайная буква a-z
     number = random.randint(10000, 99999)           # случайное число 10000-99999
@@ -326,6 +326,25 @@ class GoogleDriveManager:
         except Exception as e:
             logger.error(f"Ошибка установки разрешений: {e}")
             return False
+    
+    def delete_file(self, file_id: str) -> bool:
+        """
+        Удаление файла или папки (вместе с содержимым) из Google Drive
+        
+        Args:
+            file_id: ID файла или папки
+        
+        Returns:
+            True если удаление прошло успешно
+        """
+        try:
+            self.service.files().delete(fileId=file_id).execute()
+            logger.info(f"Файл {file_id} удалён из Google Drive")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка удаления файла: {e}")
+            return False
 
 
 # Функции-обертки для удобного использования
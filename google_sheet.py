@@ -1,6 +1,7 @@
 from calendar import c
 import gspread
 from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import Request
 import json
 from datetime import datetime
 import os
@@ -8,8 +9,13 @@ from dotenv import load_dotenv
 from typing import List, Dict, Any, Optional
 import re
 import requests
+import asyncio
+import random
+import time
+import threading
+import bisect
 from gspread.utils import a1_to_rowcol, rowcol_to_a1
-from funcs import parse_cb_rf, parse_myfin
+from funcs import parse_cb_rf, parse_myfin, normalize_name, name_match_key
 from aiogram import Bot
 
 
@@ -26,9 +32,96 @@ SHEET_URL = os.getenv('GOOGLE_SHEET_URL')
 if not SHEET_URL:
     SHEET_URL = None
 
+# Повторы запросов при превышении квоты Sheets API (HTTP 429)
+SHEETS_MAX_RETRIES = int(os.getenv('SHEETS_MAX_RETRIES', '5'))
+SHEETS_RETRY_BASE_DELAY = float(os.getenv('SHEETS_RETRY_BASE_DELAY', '2'))
+
+
+def call_with_retry(func, *args, **kwargs):
+    """
+    Вызывает метод Sheets API, повторяя запрос с экспоненциальной задержкой при ответе 429
+    
+    Args:
+        func: Вызываемый метод gspread
+        *args, **kwargs: Аргументы метода
+    
+    Returns:
+        Результат вызова func
+    """
+    for attempt in range(SHEETS_MAX_RETRIES + 1):
+        try:
+            return func(*args, **kwargs)
+        except gspread.exceptions.APIError as e:
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+            if status != 429 or attempt == SHEETS_MAX_RETRIES:
+                raise
+            delay = SHEETS_RETRY_BASE_DELAY * (2 ** attempt) + random.uniform(0, 1)
+            print(f"⚠️ Превышена квота Sheets API, повтор через {delay:.1f} с (попытка {attempt + 1}/{SHEETS_MAX_RETRIES})")
+            time.sleep(delay)
+
+
+def format_cell_value(value) -> str:
+    """Приводит значение к строке для записи в ячейку, пустые значения заменяет точкой"""
+    if value is None or value == '' or value == 'null':
+        return '.'
+    return str(value)
+
+
+def build_row_values(data, headers=None) -> Optional[List[str]]:
+    """
+    Преобразует словарь или список в строку значений для записи в лист
+    
+    Args:
+        data (dict or list): Данные строки
+        headers (list): Порядок ключей словаря (если None, используются ключи словаря)
+    
+    Returns:
+        Список строковых значений или None, если тип данных не поддерживается
+    """
+    if isinstance(data, dict):
+        if not headers:
+            headers = list(data.keys())
+        return [format_cell_value(data.get(header, '')) for header in headers]
+    if isinstance(data, list):
+        return [format_cell_value(item) for item in data]
+    return None
+
+
+# Кэш клиента, основной таблицы и её листов на всё время работы процесса
+_sheets_lock = threading.RLock()
+_credentials = None
+_client = None
+_spreadsheet = None
+_worksheets: Dict[str, gspread.Worksheet] = {}
+
+
+def get_google_sheet_client(force_refresh: bool = False):
+    """
+    Получить клиент для работы с Google Sheets
+    
+    Клиент создаётся один раз на процесс; токен сервисного аккаунта
+    обновляется при истечении, не пересоздавая клиент.
+    
+    Args:
+        force_refresh: Пересоздать клиент заново (например, после смены ключа)
+    """
+    global _client, _credentials
+    with _sheets_lock:
+        if _client is not None and not force_refresh:
+            if _credentials is not None and _credentials.token and _credentials.expired:
+                try:
+                    _credentials.refresh(Request())
+                except Exception as e:
+                    print(f"⚠️ Не удалось обновить токен Google Sheets: {e}")
+            return _client
+        
+        _client = _create_google_sheet_client()
+        return _client
+
 
-def get_google_sheet_client():
-    """Получить клиент для работы с Google Sheets"""
+def _create_google_sheet_client():
+    """Создаёт новый авторизованный клиент Google Sheets"""
+    global _credentials
     try:
         # Сначала пытаемся использовать переменную окружения
         creds_json = os.getenv('GOOGLE_CREDENTIALS_JSON')
@@ -44,11 +137,134 @@ def get_google_sheet_client():
                 raise FileNotFoundError("Файл credentials.json не найден в папке проекта")
         
         client = gspread.authorize(creds)
+        _credentials = creds
         return client
     except Exception as e:
         print(f"Ошибка при подключении к Google Sheets: {e}")
         return None
 
+
+def get_spreadsheet(force_refresh: bool = False):
+    """
+    Получить основную таблицу (GOOGLE_SHEET_URL) из кэша
+    
+    Args:
+        force_refresh: Заново открыть таблицу и перечитать список листов
+    
+    Returns:
+        Объект gspread.Spreadsheet или None в случае ошибки
+    """
+    global _spreadsheet
+    with _sheets_lock:
+        if _spreadsheet is not None and not force_refresh:
+            return _spreadsheet
+        
+        if not SHEET_URL:
+            print("❌ URL Google таблицы не настроен")
+            return None
+        
+        client = get_google_sheet_client()
+        if not client:
+            print("❌ Не удалось подключиться к Google Sheets")
+            return None
+        
+        try:
+            _spreadsheet = call_with_retry(client.open_by_url, SHEET_URL)
+            _load_worksheets(_spreadsheet)
+            return _spreadsheet
+        except Exception as e:
+            print(f"❌ Ошибка при открытии Google таблицы: {e}")
+            _spreadsheet = None
+            return None
+
+
+def _load_worksheets(spreadsheet):
+    """Перечитывает список листов таблицы в кэш"""
+    worksheets = call_with_retry(spreadsheet.worksheets)
+    _worksheets.clear()
+    _worksheets.update({ws.title: ws for ws in worksheets})
+
+
+def get_worksheet(worksheet_name: str, create: bool = False):
+    """
+    Получить лист основной таблицы из кэша
+    
+    Если листа нет в кэше, список листов перечитывается один раз (лист могли
+    создать вручную), и только после этого лист считается отсутствующим.
+    
+    Args:
+        worksheet_name: Название листа
+        create: Создать лист, если он не найден
+    
+    Returns:
+        Объект gspread.Worksheet или None, если лист не найден или произошла ошибка
+    """
+    with _sheets_lock:
+        spreadsheet = get_spreadsheet()
+        if not spreadsheet:
+            return None
+        
+        worksheet = _worksheets.get(worksheet_name)
+        if worksheet:
+            return worksheet
+        
+        try:
+            _load_worksheets(spreadsheet)
+            worksheet = _worksheets.get(worksheet_name)
+            if worksheet:
+                return worksheet
+            
+            if not create:
+                print(f"❌ Лист '{worksheet_name}' не найден")
+                return None
+            
+            worksheet = call_with_retry(spreadsheet.add_worksheet, title=worksheet_name, rows=1000, cols=20)
+            _worksheets[worksheet_name] = worksheet
+            print(f"Создан новый лист: {worksheet_name}")
+            return worksheet
+        except Exception as e:
+            print(f"❌ Ошибка при получении листа '{worksheet_name}': {e}")
+            return None
+
+
+def get_all_worksheets() -> List[gspread.Worksheet]:
+    """Получить все листы основной таблицы из кэша"""
+    with _sheets_lock:
+        spreadsheet = get_spreadsheet()
+        if not spreadsheet:
+            return []
+        if not _worksheets:
+            try:
+                _load_worksheets(spreadsheet)
+            except Exception as e:
+                print(f"❌ Ошибка при получении списка листов: {e}")
+                return []
+        return list(_worksheets.values())
+
+
+def invalidate_worksheet(worksheet_name: Optional[str]):
+    """
+    Удаляет лист из кэша: при следующем обращении список листов будет перечитан
+    
+    Args:
+        worksheet_name: Название листа; None сбрасывает все листы
+    """
+    with _sheets_lock:
+        if worksheet_name is None:
+            _worksheets.clear()
+        else:
+            _worksheets.pop(worksheet_name, None)
+
+
+def reset_sheets_cache():
+    """Полностью сбрасывает кэш клиента, таблицы и листов"""
+    global _client, _credentials, _spreadsheet
+    with _sheets_lock:
+        _client = None
+        _credentials = None
+        _spreadsheet = None
+        _worksheets.clear()
+
 def create_or_get_sheet(sheet_name="Resume_Database"):
     """Создать или получить существующую Google таблицу"""
     client = get_google_sheet_client()
@@ -99,6 +315,9 @@ def create_or_get_sheet(sheet_name="Resume_Database"):
 
 def create_worksheet(worksheet_name, sheet_url=None, sheet_name="Resume_Database"):
     """Создать новый лист в существующей таблице"""
+    if sheet_url and sheet_url == SHEET_URL:
+        return get_worksheet(worksheet_name, create=True)
+    
     client = get_google_sheet_client()
     if not client:
         return None
@@ -129,6 +348,9 @@ def create_worksheet(worksheet_name, sheet_url=None, sheet_name="Resume_Database
 
 def get_sheet_by_url(sheet_url, worksheet_name=None):
     """Получить Google таблицу по URL с возможностью выбора конкретного листа"""
+    if sheet_url == SHEET_URL and worksheet_name:
+        return get_worksheet(worksheet_name, create=True)
+    
     client = get_google_sheet_client()
     if not client:
         return None
@@ -156,6 +378,14 @@ def get_sheet_by_url(sheet_url, worksheet_name=None):
         return None
 
 async def add_data_to_worksheet(data, headers=None, worksheet_name=None):
+    """
+    Асинхронная обёртка над append_data_to_worksheet: запрос к Sheets API
+    выполняется в отдельном потоке и не блокирует event loop бота
+    """
+    return await asyncio.to_thread(append_data_to_worksheet, data, headers, worksheet_name)
+
+
+def append_data_to_worksheet(data, headers=None, worksheet_name=None):
     """
     Универсальная функция для добавления любых данных в Google таблицу
     
@@ -181,33 +411,14 @@ async def add_data_to_worksheet(data, headers=None, worksheet_name=None):
     
     try:
         # Подготовить данные
-        if isinstance(data, dict):
-            # Если передан словарь
-            if not headers:
-                headers = list(data.keys())
-            
-            # Подготовить строку данных
-            def format_value(value):
-                if value is None or value == '' or value == 'null':
-                    return '.'
-                return str(value)
-            
-            row_data = [format_value(data.get(header, '')) for header in headers]
-            
-        elif isinstance(data, list):
-            # Если передан список
-            def format_value(value):
-                if value is None or value == '' or value == 'null':
-                    return '.'
-                return str(value)
-            
-            row_data = [format_value(item) for item in data]
-        else:
+        row_data = build_row_values(data, headers)
+        if row_data is None:
             print("❌ Неподдерживаемый тип данных. Используйте dict или list")
             return False
         
         # Добавить строку в таблицу
-        worksheet.append_row(row_data)
+        call_with_retry(worksheet.append_row, row_data)
+        _index_added_rows(worksheet_name, [row_data])
         
         worksheet_info = f" (лист: {worksheet_name})" if worksheet_name else ""
         print(f"✅ Данные успешно добавлены в Google таблицу{worksheet_info}")
@@ -215,13 +426,228 @@ async def add_data_to_worksheet(data, headers=None, worksheet_name=None):
         
     except Exception as e:
         print(f"❌ Ошибка при добавлении данных в Google таблицу: {e}")
+        if worksheet_name:
+            invalidate_worksheet(worksheet_name)
         return False
 
 
-def check_duplicate_by_fio(first_name: str, last_name: str, worksheet_name: str = "Свободные ресурсы на аутстафф") -> bool:
+async def add_rows_to_worksheets(rows_by_worksheet: Dict[str, List[Any]]) -> Dict[str, bool]:
+    """
+    Асинхронная обёртка над append_rows_to_worksheets: запрос к Sheets API
+    выполняется в отдельном потоке и не блокирует event loop бота
+    """
+    return await asyncio.to_thread(append_rows_to_worksheets, rows_by_worksheet)
+
+
+def append_rows_to_worksheets(rows_by_worksheet: Dict[str, List[Any]]) -> Dict[str, bool]:
+    """
+    Добавляет строки сразу в несколько листов одним запросом spreadsheets.batchUpdate
+    
+    Подходит как для всех листов одного резюме, так и для целой пачки резюме:
+    каждому листу соответствует список строк, строки дописываются в конец листа
+    (appendCells) в переданном порядке.
+    
+    Args:
+        rows_by_worksheet: Словарь {название листа: список строк (dict или list)}
+    
+    Returns:
+        Словарь {название листа: True если строки добавлены, False если ошибка}
+    """
+    results = {worksheet_name: False for worksheet_name in rows_by_worksheet}
+    
+    spreadsheet = get_spreadsheet()
+    if not spreadsheet:
+        print("Не удалось подключиться к Google Sheets")
+        return results
+    
+    try:
+        requests_body = []
+        written = {}
+        for worksheet_name, rows in rows_by_worksheet.items():
+            worksheet = get_worksheet(worksheet_name, create=True)
+            if not worksheet:
+                continue
+            
+            row_values = [build_row_values(row) for row in rows]
+            if any(values is None for values in row_values):
+                print(f"❌ Неподдерживаемый тип данных для листа '{worksheet_name}'. Используйте dict или list")
+                continue
+            
+            requests_body.append({
+                'appendCells': {
+                    'sheetId': worksheet.id,
+                    'rows': [
+                        {'values': [{'userEnteredValue': {'stringValue': value}} for value in values]}
+                        for values in row_values
+                    ],
+                    'fields': 'userEnteredValue',
+                }
+            })
+            written[worksheet_name] = row_values
+        
+        if requests_body:
+            call_with_retry(spreadsheet.batch_update, {'requests': requests_body})
+        
+        for worksheet_name, row_values in written.items():
+            results[worksheet_name] = True
+            _index_added_rows(worksheet_name, row_values)
+        print(f"✅ Данные добавлены в {len(written)} листов одним запросом")
+        return results
+        
+    except Exception as e:
+        print(f"❌ Ошибка при пакетном добавлении данных в Google таблицу: {e}")
+        # Лист мог быть удалён или переименован — перечитаем список листов при следующем вызове
+        for worksheet_name in rows_by_worksheet:
+            invalidate_worksheet(worksheet_name)
+        return results
+
+
+# Основной лист с кандидатами: A - ID, B - фамилия, C - имя
+MAIN_WORKSHEET_NAME = "Свободные ресурсы на аутстафф"
+# Как часто полностью перечитывать индекс кандидатов (на случай ручных правок в таблице)
+CANDIDATE_INDEX_TTL = int(os.getenv('CANDIDATE_INDEX_TTL', str(60 * 60)))
+
+
+class CandidateIndex:
+    """Локальный индекс кандидатов листа по паре (фамилия, имя) для поиска дубликатов"""
+    
+    def __init__(self, worksheet_name: str):
+        self.worksheet_name = worksheet_name
+        self._lock = threading.RLock()
+        self._ids_by_key: Dict[tuple, set] = {}
+        self._names_by_id: Dict[str, tuple] = {}
+        self._loaded_at: Optional[float] = None
+    
+    @staticmethod
+    def _keys(last_name: str, first_name: str) -> List[tuple]:
+        """Ключи кандидата: нормализованное написание и транслитерация"""
+        keys = [
+            ('name', normalize_name(last_name), normalize_name(first_name)),
+            ('translit', name_match_key(last_name), name_match_key(first_name)),
+        ]
+        return [key for key in keys if key[1] and key[2]]
+    
+    def load(self) -> bool:
+        """Загружает колонки A:C листа одним запросом и перестраивает индекс"""
+        worksheet = get_worksheet(self.worksheet_name)
+        if not worksheet:
+            return False
+        rows = call_with_retry(worksheet.get, 'A2:C')
+        with self._lock:
+            self._ids_by_key.clear()
+            self._names_by_id.clear()
+            for row in rows:
+                if len(row) >= 3 and row[0].strip():
+                    self._add(row[0].strip(), row[1], row[2])
+            self._loaded_at = time.time()
+        print(f"✅ Индекс кандидатов листа '{self.worksheet_name}' загружен: {len(self._names_by_id)} записей")
+        return True
+    
+    def ensure_loaded(self) -> bool:
+        """Загружает индекс, если он ещё не загружен или устарел"""
+        with self._lock:
+            if self._loaded_at is not None and time.time() - self._loaded_at < CANDIDATE_INDEX_TTL:
+                return True
+            return self.load()
+    
+    def _add(self, resume_id: str, last_name: str, first_name: str):
+        self._names_by_id[resume_id] = (last_name, first_name)
+        for key in self._keys(last_name, first_name):
+            self._ids_by_key.setdefault(key, set()).add(resume_id)
+    
+    def add(self, resume_id: str, last_name: str, first_name: str):
+        """Добавляет (или обновляет) кандидата в индексе"""
+        with self._lock:
+            self._remove(resume_id)
+            self._add(resume_id, last_name, first_name)
+    
+    def _remove(self, resume_id: str):
+        names = self._names_by_id.pop(resume_id, None)
+        if not names:
+            return
+        for key in self._keys(*names):
+            ids = self._ids_by_key.get(key)
+            if ids:
+                ids.discard(resume_id)
+                if not ids:
+                    del self._ids_by_key[key]
+    
+    def remove(self, resume_id: str):
+        """Удаляет кандидата из индекса"""
+        with self._lock:
+            self._remove(resume_id)
+    
+    def update_name(self, resume_id: str, last_name: Optional[str] = None, first_name: Optional[str] = None):
+        """Обновляет фамилию и/или имя уже проиндексированного кандидата"""
+        with self._lock:
+            current = self._names_by_id.get(resume_id)
+            if not current:
+                return
+            self.add(resume_id, last_name if last_name is not None else current[0],
+                     first_name if first_name is not None else current[1])
+    
+    def find(self, last_name: str, first_name: str) -> Optional[str]:
+        """Возвращает ID найденного кандидата или None"""
+        with self._lock:
+            for key in self._keys(last_name, first_name):
+                ids = self._ids_by_key.get(key)
+                if ids:
+                    return next(iter(ids))
+            return None
+
+
+_candidate_indexes: Dict[str, CandidateIndex] = {}
+_candidate_indexes_lock = threading.Lock()
+
+
+def get_candidate_index(worksheet_name: str = MAIN_WORKSHEET_NAME) -> CandidateIndex:
+    """Возвращает индекс кандидатов для листа (создаётся один раз на процесс)"""
+    with _candidate_indexes_lock:
+        index = _candidate_indexes.get(worksheet_name)
+        if index is None:
+            index = CandidateIndex(worksheet_name)
+            _candidate_indexes[worksheet_name] = index
+        return index
+
+
+def warm_candidate_index(worksheet_name: str = MAIN_WORKSHEET_NAME) -> bool:
+    """Загружает индекс кандидатов заранее, чтобы первая проверка не ждала Sheets API"""
+    try:
+        return get_candidate_index(worksheet_name).load()
+    except Exception as e:
+        print(f"❌ Ошибка при загрузке индекса кандидатов: {e}")
+        return False
+
+
+def _index_added_rows(worksheet_name: str, rows: List[List[str]]):
+    """Добавляет в индекс кандидатов строки, только что записанные в лист"""
+    index = _candidate_indexes.get(worksheet_name)
+    if index is None:
+        return
+    for row in rows:
+        if len(row) >= 3 and row[0].strip():
+            index.add(row[0].strip(), row[1], row[2])
+
+
+def _index_updated_cell(worksheet_name: str, resume_id: str, column_name: str, new_value: str):
+    """Обновляет индекс кандидатов после изменения фамилии или имени в листе"""
+    index = _candidate_indexes.get(worksheet_name)
+    if index is None:
+        return
+    column = column_name.strip().lower()
+    if column == 'фамилия':
+        index.update_name(resume_id, last_name=new_value)
+    elif column == 'имя':
+        index.update_name(resume_id, first_name=new_value)
+
+
+def check_duplicate_by_fio(first_name: str, last_name: str, worksheet_name: str = MAIN_WORKSHEET_NAME) -> bool:
     """
     Проверяет наличие дубликата по ФИ в указанном листе Google таблицы
     
+    Проверка идёт по локальному индексу кандидатов (с учётом транслитерации),
+    поэтому не обращается к Sheets API, пока индекс не устарел.
+    
     Args:
         first_name: Имя кандидата
         last_name: Фамилия кандидата  
@@ -230,51 +656,25 @@ def check_duplicate_by_fio(first_name: str, last_name: str, worksheet_name: str
     Returns:
         True если найден дубликат, False если не найден или ошибка
     """
+    if not (last_name and first_name):
+        return False
+    
     try:
-        client = get_google_sheet_client()
-        if not client:
-            print("❌ Не удалось подключиться к Google Sheets")
-            return False
-        
-        # Получаем таблицу
-        if SHEET_URL:
-            sheet = client.open_by_url(SHEET_URL)
-        else:
-            print("❌ URL Google таблицы не настроен")
-            return False
-        
-        # Получаем лист
-        try:
-            worksheet = sheet.worksheet(worksheet_name)
-        except gspread.WorksheetNotFound:
-            print(f"❌ Лист '{worksheet_name}' не найден")
+        index = get_candidate_index(worksheet_name)
+        if not index.ensure_loaded():
             return False
         
-        # Получаем все данные из листа
-        all_values = worksheet.get_all_values()
-        
-        if len(all_values) < 2:  # Нет данных кроме заголовков
-            return False
-        
-        # Ищем совпадения по колонкам B (фамилия), C (имя)
-        for row_index, row in enumerate(all_values[1:], start=2):  # Пропускаем заголовки
-            if len(row) >= 3:  # Убеждаемся что есть колонки A, B, C
-                row_last_name = row[1].strip().lower() if len(row) > 1 else ""  # Колонка B
-                row_first_name = row[2].strip().lower() if len(row) > 2 else ""  # Колонка C  
-                
-                # Сравниваем ФИ (приводим к нижнему регистру для сравнения)
-                if (last_name and first_name and 
-                    row_last_name == last_name.strip().lower() and 
-                    row_first_name == first_name.strip().lower()):
-                    
-                    print(f"✅ Найден дубликат в строке {row_index}: {last_name} {first_name}")
-                    return True
+        duplicate_id = index.find(last_name, first_name)
+        if duplicate_id:
+            print(f"✅ Найден дубликат с ID {duplicate_id}: {last_name} {first_name}")
+            return True
         
         print(f"✅ Дубликат не найден для: {last_name} {first_name}")
         return False
         
     except Exception as e:
         print(f"❌ Ошибка при поиске дубликата: {e}")
+        invalidate_worksheet(worksheet_name)
         return False
 
 
@@ -289,23 +689,9 @@ def get_all_resume_ids(worksheet_name: str = "Свободные ресурсы
         Список ID резюме
     """
     try:
-        client = get_google_sheet_client()
-        if not client:
-            print("❌ Не удалось подключиться к Google Sheets")
-            return []
-        
-        # Получаем таблицу
-        if SHEET_URL:
-            sheet = client.open_by_url(SHEET_URL)
-        else:
-            print("❌ URL Google таблицы не настроен")
-            return []
-        
-        # Получаем лист
-        try:
-            worksheet = sheet.worksheet(worksheet_name)
-        except gspread.WorksheetNotFound:
-            print(f"❌ Лист '{worksheet_name}' не найден")
+        # Получаем лист из кэша
+        worksheet = get_worksheet(worksheet_name)
+        if not worksheet:
             return []
         
         # Получаем все значения из колонки A (ID резюме)
@@ -319,6 +705,7 @@ def get_all_resume_ids(worksheet_name: str = "Свободные ресурсы
         
     except Exception as e:
         print(f"❌ Ошибка при получении ID резюме: {e}")
+        invalidate_worksheet(worksheet_name)
         return []
 
 
@@ -332,58 +719,101 @@ def delete_resume_by_id(resume_id: str) -> bool:
     Returns:
         True если удаление прошло успешно, False в случае ошибки
     """
+    return delete_resumes_by_ids([resume_id]).get(resume_id, 0) > 0
+
+
+def delete_resumes_by_ids(resume_ids: List[str]) -> Dict[str, int]:
+    """
+    Удаляет записи с указанными ID из всех листов одним запросом batchUpdate
+    
+    Из каждого листа читается только колонка A (все листы одним запросом
+    values:batchGet), затем все найденные строки удаляются запросами
+    deleteDimension в одном spreadsheets.batchUpdate. Листы расчёта ставок
+    не содержат ID кандидатов и пропускаются.
+    
+    Args:
+        resume_ids: Список ID резюме для удаления
+    
+    Returns:
+        Словарь {ID: количество удалённых строк}
+    """
+    ids = {resume_id.strip() for resume_id in resume_ids if resume_id and resume_id.strip()}
+    deleted = {resume_id: 0 for resume_id in ids}
+    if not ids:
+        return deleted
+    
     try:
-        client = get_google_sheet_client()
-        if not client:
-            print("❌ Не удалось подключиться к Google Sheets")
-            return False
-        
-        # Получаем таблицу
-        if SHEET_URL:
-            sheet = client.open_by_url(SHEET_URL)
-        else:
-            print("❌ URL Google таблицы не настроен")
-            return False
-        
-        deleted_count = 0
-        
-        # Получаем все листы в таблице
-        worksheets = sheet.worksheets()
-        
-        for worksheet in worksheets:
-            try:
-                # Получаем все данные из листа
-                all_values = worksheet.get_all_values()
-                
-                if len(all_values) < 2:  # Нет данных кроме заголовков
-                    continue
-                
-                # Ищем строки с нужным ID (обычно в колонке A)
-                rows_to_delete = []
-                for row_index, row in enumerate(all_values[1:], start=2):  # Пропускаем заголовки
-                    if len(row) > 0 and row[0].strip() == resume_id:
-                        rows_to_delete.append(row_index)
-                
-                # Удаляем строки (в обратном порядке, чтобы индексы не сбились)
-                for row_index in reversed(rows_to_delete):
-                    worksheet.delete_rows(row_index)
-                    deleted_count += 1
-                    print(f"✅ Удалена строка {row_index} из листа '{worksheet.title}'")
-                    
-            except Exception as e:
-                print(f"⚠️ Ошибка при обработке листа '{worksheet.title}': {e}")
-                continue
-        
-        if deleted_count > 0:
-            print(f"✅ Всего удалено {deleted_count} записей с ID {resume_id}")
-            return True
+        spreadsheet = get_spreadsheet()
+        worksheets = [ws for ws in get_all_worksheets() if ws.title not in RATE_SHEET_NAMES]
+        if not spreadsheet or not worksheets:
+            return deleted
+        
+        # Читаем колонку A всех листов одним запросом
+        ranges = ["'{}'!A:A".format(ws.title.replace("'", "''")) for ws in worksheets]
+        response = call_with_retry(spreadsheet.values_batch_get, ranges)
+        
+        requests_body = []
+        # Счётчики переносим в результат только после успешного batchUpdate
+        found = {resume_id: 0 for resume_id in ids}
+        for worksheet, value_range in zip(worksheets, response.get('valueRanges', [])):
+            column = value_range.get('values', [])
+            # Индексы строк (с 0) с нужными ID, заголовок пропускаем
+            rows_to_delete = [
+                row_index for row_index, row in enumerate(column)
+                if row_index > 0 and row and row[0].strip() in ids
+            ]
+            for row_index in rows_to_delete:
+                found[column[row_index][0].strip()] += 1
+            
+            # Удаляем строки с конца, соседние строки объединяем в один диапазон,
+            # чтобы индексы следующих запросов не сбились
+            for start, end in reversed(_group_consecutive(rows_to_delete)):
+                requests_body.append({
+                    'deleteDimension': {
+                        'range': {
+                            'sheetId': worksheet.id,
+                            'dimension': 'ROWS',
+                            'startIndex': start,
+                            'endIndex': end,
+                        }
+                    }
+                })
+            if rows_to_delete:
+                print(f"✅ В листе '{worksheet.title}' найдено {len(rows_to_delete)} строк для удаления")
+        
+        if requests_body:
+            call_with_retry(spreadsheet.batch_update, {'requests': requests_body})
+        deleted.update(found)
+        
+        for resume_id in ids:
+            for index in list(_candidate_indexes.values()):
+                index.remove(resume_id)
+        # Номера строк после удаления сдвинулись
+        invalidate_row_index()
+        
+        total = sum(deleted.values())
+        if total > 0:
+            print(f"✅ Всего удалено {total} записей для {len(ids)} ID")
         else:
-            print(f"⚠️ Записи с ID {resume_id} не найдены")
-            return False
+            print(f"⚠️ Записи с ID {', '.join(sorted(ids))} не найдены")
+        return deleted
             
     except Exception as e:
         print(f"❌ Ошибка при удалении записей: {e}")
-        return False
+        # ID листов могли устареть — перечитаем список листов при следующем вызове
+        invalidate_worksheet(None)
+        return {resume_id: 0 for resume_id in ids}
+
+
+def _group_consecutive(row_indices: List[int]) -> List[tuple]:
+    """Группирует отсортированные индексы строк в диапазоны [start, end)"""
+    groups = []
+    for row_index in row_indices:
+        if groups and groups[-1][1] == row_index:
+            groups[-1] = (groups[-1][0], row_index + 1)
+        else:
+            groups.append((row_index, row_index + 1))
+    return groups
 
 def get_sheet_url(sheet_name="Resume_Database"):
     """Получить URL Google таблицы"""
@@ -489,6 +919,105 @@ def find_value_by_column_b(search_value, sheet_url=SHEET_URL, sheet_name="Data_D
         return None
 
 
+# Листы расчёта ставок и колонки, по которым ищется зарплата (B - RUB, C - USD, D - EUR, E - BYN)
+RATE_SHEET_NAMES = [
+    'Расчет ставки (штат/контракт) ЕС/США',
+    'Расчет ставки (штат/контракт) СНГ',
+    'Расчет ставки (Самозанятый) СНГ',
+    'Расчет ставки (Самозанятый) ЕС/США',
+    'Расчет ставки (ИП) СНГ',
+    'Расчет ставки (ИП) ЕС/США',
+]
+RATE_SEARCH_COLUMNS = ['B', 'C', 'D', 'E']
+# Допустимое отклонение найденного значения от искомого
+RATE_SEARCH_TOLERANCE = 40
+
+# Кэш листов расчёта ставок: строки листа и отсортированные индексы по колонкам поиска
+_rate_lock = threading.RLock()
+_rate_rows: Dict[str, List[List[str]]] = {}
+_rate_index: Dict[tuple, tuple] = {}
+
+
+def _parse_rate_number(cell_value: str) -> Optional[int]:
+    """Преобразует значение ячейки в целое число, отбрасывая пробелы и символы валют"""
+    digits = re.sub(r"[^\d]", "", cell_value or "")
+    return int(digits) if digits else None
+
+
+def _get_rate_rows(worksheet_name: str) -> Optional[List[List[str]]]:
+    """Возвращает строки листа расчёта ставок, загружая лист при первом обращении"""
+    with _rate_lock:
+        rows = _rate_rows.get(worksheet_name)
+        if rows is not None:
+            return rows
+        
+        worksheet = get_worksheet(worksheet_name)
+        if not worksheet:
+            return None
+        rows = call_with_retry(worksheet.get_all_values)
+        _rate_rows[worksheet_name] = rows
+        return rows
+
+
+def _get_rate_index(worksheet_name: str, search_column: str) -> Optional[tuple]:
+    """
+    Возвращает отсортированный индекс колонки поиска листа расчёта ставок
+    
+    Returns:
+        Кортеж (отсортированные значения, номера строк в том же порядке, строки листа) или None.
+        Строки входят в кортеж, чтобы номера строк не применялись к строкам, перечитанным
+        после refresh_rate_index
+    """
+    key = (worksheet_name, search_column.upper())
+    with _rate_lock:
+        index = _rate_index.get(key)
+        if index is not None:
+            return index
+        
+        rows = _get_rate_rows(worksheet_name)
+        if rows is None:
+            return None
+        
+        search_col_index = column_letter_to_index(search_column)
+        pairs = []
+        for row_index, row in enumerate(rows[1:], start=1):  # Пропускаем заголовки
+            if len(row) <= search_col_index:
+                continue
+            numeric_value = _parse_rate_number(row[search_col_index])
+            if numeric_value is not None:
+                pairs.append((numeric_value, row_index))
+        pairs.sort()
+        
+        index = ([value for value, _ in pairs], [row_index for _, row_index in pairs], rows)
+        _rate_index[key] = index
+        return index
+
+
+def invalidate_rate_index(worksheet_name: Optional[str] = None):
+    """Сбрасывает кэш листа расчёта ставок (или всех листов, если название не указано)"""
+    with _rate_lock:
+        if worksheet_name is None:
+            _rate_rows.clear()
+            _rate_index.clear()
+            return
+        _rate_rows.pop(worksheet_name, None)
+        for key in [key for key in _rate_index if key[0] == worksheet_name]:
+            del _rate_index[key]
+
+
+def refresh_rate_index():
+    """Перечитывает все листы расчёта ставок и заново строит индексы по колонкам поиска"""
+    invalidate_rate_index()
+    for worksheet_name in RATE_SHEET_NAMES:
+        for search_column in RATE_SEARCH_COLUMNS:
+            try:
+                _get_rate_index(worksheet_name, search_column)
+            except Exception as e:
+                print(f"❌ Ошибка при построении индекса листа '{worksheet_name}': {e}")
+                break
+    print(f"✅ Индекс ставок построен для {len(RATE_SHEET_NAMES)} листов")
+
+
 def search_and_extract_values(
     search_column: str, 
     search_value: float, 
@@ -498,6 +1027,9 @@ def search_and_extract_values(
     """
     Поиск значения в указанной колонке и извлечение данных из других колонок
     
+    Лист загружается один раз и кэшируется; поиск ближайшего значения в
+    пределах ±RATE_SEARCH_TOLERANCE идёт бинарным поиском по индексу колонки.
+    
     Args:
         search_column: Буква колонки для поиска (например, 'B')
         search_value: Числовое значение для поиска
@@ -508,107 +1040,42 @@ def search_and_extract_values(
         Словарь с найденными значениями или None если ничего не найдено
     """
     try:
-        # Получаем клиент и таблицу
-        client = get_google_sheet_client()
-        if not client:
+        index = _get_rate_index(worksheet_name, search_column)
+        if index is None:
             return None
         
-        # Используем URL из переменной окружения
-        if SHEET_URL:
-            spreadsheet = client.open_by_url(SHEET_URL)
-        else:
-            print("❌ GOOGLE_SHEET_URL не установлен в переменных окружения")
-            return None
-        
-        # Выбираем лист по названию
-        try:
-            worksheet = spreadsheet.worksheet(worksheet_name)
-        except gspread.WorksheetNotFound:
-            print(f"❌ Лист '{worksheet_name}' не найден")
-            return None
-        
-        # Получаем все данные из листа
-        all_values = worksheet.get_all_values()
-        if not all_values:
-            print("❌ Лист пуст")
+        values, row_indices, rows = index
+        if not values:
+            print(f"❌ В колонке {search_column} листа '{worksheet_name}' нет числовых значений")
             return None
         
-        # Преобразуем букву колонки в индекс (A=0, B=1, C=2, ...)
-        search_col_index = ord(search_column.upper()) - ord('A')
-        
-        # Создаем диапазон поиска ±40 от искомого значения
-        search_range = list(range(int(search_value) - 40, int(search_value) + 41))
-        print(f"🔍 Поиск в диапазоне {search_range[0]} - {search_range[-1]} в колонке {search_column}")
-        
-        target_row_index = None
-        exact_match_row = None
-        valid_values = []  # Для отладки
-        
-        for row_index, row in enumerate(all_values):
-            if row_index == 0:  # Пропускаем заголовки
-                continue
-                
-            if len(row) <= search_col_index:
-                continue
-                
-            cell_value = row[search_col_index]
-            
-            if not cell_value:
-                continue
-                
-            try:
-                # Пытаемся преобразовать в число
-                numeric_value = int(re.sub(r"[^\d]", "", cell_value))
-                valid_values.append(numeric_value)  # Для отладки
-                
-                # Проверяем точное совпадение
-                if numeric_value == search_value:
-                    exact_match_row = row_index
-                    target_row_index = row_index
-                    print(f"✅ Найдено точное совпадение: {numeric_value} в строке {row_index + 1}")
-                    break
-                
-                # Проверяем, есть ли это значение в нашем диапазоне поиска
-                if int(numeric_value) in search_range:
-                    target_row_index = row_index
-                    print(f"✅ Найдено первое совпадение: {numeric_value} в строке {row_index + 1}")
-                    break  # Берем первое найденное
-                    
-            except (ValueError, AttributeError):
-                continue
+        # Ближайшие кандидаты: первое значение >= искомого и последнее значение < искомого
+        position = bisect.bisect_left(values, search_value)
+        candidates = [i for i in (position, position - 1) if 0 <= i < len(values)]
+        best = min(candidates, key=lambda i: (abs(values[i] - search_value), row_indices[i]))
         
-        # Проверяем результат
-        if target_row_index is None:
-            print(f"❌ Не найдено значений в диапазоне ±10 от {search_value} в колонке {search_column}")
-            print(f"📋 Найденные значения в колонке: {sorted(set(valid_values))[:10]}...")
+        if abs(values[best] - search_value) > RATE_SEARCH_TOLERANCE:
+            print(f"❌ Не найдено значений в диапазоне ±{RATE_SEARCH_TOLERANCE} от {search_value} в колонке {search_column}")
             return None
         
-        target_row = all_values[target_row_index]
+        target_row = rows[row_indices[best]]
         
         # Извлекаем значения из указанных колонок
-        result = {
-            'found_row': target_row_index + 1,  # +1 для человекочитаемого номера строки
-            'search_value_found': target_row[search_col_index] if len(target_row) > search_col_index else '',
-            'is_exact_match': exact_match_row is not None,
-            'extracted_values': {}
-        }
-        
+        extracted_values = {}
         for col_letter in extract_columns:
-            col_index = ord(col_letter.upper()) - ord('A')
+            col_index = column_letter_to_index(col_letter)
             if len(target_row) > col_index:
                 # Очищаем значение от неразрывных пробелов и других символов
-                clean_value = target_row[col_index].replace('\xa0', '').strip()
-                result['extracted_values'][col_letter] = clean_value
+                extracted_values[col_letter] = target_row[col_index].replace('\xa0', '').strip()
             else:
-                result['extracted_values'][col_letter] = ''
-        
-        # Выводим только extracted_values
-        print(result['extracted_values'])
+                extracted_values[col_letter] = ''
         
-        return result['extracted_values']
+        return extracted_values
         
     except Exception as e:
         print(f"❌ Ошибка при поиске и извлечении данных: {e}")
+        invalidate_worksheet(worksheet_name)
+        invalidate_rate_index(worksheet_name)
         return None
 
 
@@ -638,7 +1105,9 @@ def get_all_sheet_headers(sheet_url=None, sheet_name="Resume_Database"):
         return {}
     
     try:
-        if sheet_url:
+        if sheet_url and sheet_url == SHEET_URL:
+            spreadsheet = get_spreadsheet()
+        elif sheet_url:
             spreadsheet = client.open_by_url(sheet_url)
         else:
             spreadsheet = client.open(sheet_name)
@@ -735,6 +1204,183 @@ def print_mapping_variables(sheet_url=None, sheet_name="Resume_Database"):
     print("="*50)
 
 
+# Как долго считать актуальным кэш соответствия ID → номер строки
+ROW_INDEX_TTL = int(os.getenv('ROW_INDEX_TTL', str(5 * 60)))
+
+# Кэш разметки листов: заголовок → номер колонки и ID → номер строки (нумерация с 1)
+_layout_lock = threading.RLock()
+_header_columns: Dict[str, Dict[str, int]] = {}
+_id_rows: Dict[str, tuple] = {}
+
+
+def _a1_sheet_range(worksheet_name: str, cells: str) -> str:
+    """Формирует A1-диапазон с экранированным названием листа"""
+    return "'{}'!{}".format(worksheet_name.replace("'", "''"), cells)
+
+
+def _store_sheet_layout(worksheet_name: str, header_range: Dict[str, Any], id_range: Dict[str, Any]):
+    """Сохраняет в кэш заголовки листа и соответствие ID → номер строки"""
+    header_row = (header_range.get('values') or [[]])[0]
+    id_column = id_range.get('values', [])
+    id_rows = {}
+    for row_index, row in enumerate(id_column[1:], start=2):  # Пропускаем заголовки
+        if row and row[0].strip() and row[0].strip() not in id_rows:
+            id_rows[row[0].strip()] = row_index
+    with _layout_lock:
+        _header_columns[worksheet_name] = {
+            header.strip().lower(): column_index
+            for column_index, header in enumerate(header_row, start=1)
+            if header.strip()
+        }
+        _id_rows[worksheet_name] = (time.time(), id_rows)
+
+
+def _load_sheet_layouts(worksheet_names: List[str]):
+    """Загружает заголовки и колонку A нескольких листов одним запросом values:batchGet"""
+    spreadsheet = get_spreadsheet()
+    if not spreadsheet or not worksheet_names:
+        return
+    
+    ranges = []
+    for worksheet_name in worksheet_names:
+        ranges.append(_a1_sheet_range(worksheet_name, '1:1'))
+        ranges.append(_a1_sheet_range(worksheet_name, 'A:A'))
+    response = call_with_retry(spreadsheet.values_batch_get, ranges)
+    value_ranges = response.get('valueRanges', [])
+    
+    for position, worksheet_name in enumerate(worksheet_names):
+        _store_sheet_layout(worksheet_name, value_ranges[2 * position], value_ranges[2 * position + 1])
+
+
+def _resolve_rows(spreadsheet, worksheet_names: List[str], resume_id: str) -> Dict[str, Optional[int]]:
+    """
+    Находит строку резюме в каждом листе и сверяет ID в колонке A перед записью
+    
+    Для листов с кэшированной разметкой читается только ячейка A найденной строки,
+    для остальных — заголовки и колонка A; всё одним запросом values:batchGet.
+    Если лист отсортировали или строки сдвинулись и ID в ячейке не совпал,
+    кэш листа сбрасывается и разметка загружается заново.
+    
+    Returns:
+        Словарь {название листа: номер строки или None, если ID не найден}
+    """
+    ranges = []
+    plan = []
+    for worksheet_name in worksheet_names:
+        row_index = _find_row(worksheet_name, resume_id) if worksheet_name in _header_columns else None
+        if row_index is None:
+            plan.append((worksheet_name, None, len(ranges)))
+            ranges.append(_a1_sheet_range(worksheet_name, '1:1'))
+            ranges.append(_a1_sheet_range(worksheet_name, 'A:A'))
+        else:
+            plan.append((worksheet_name, row_index, len(ranges)))
+            ranges.append(_a1_sheet_range(worksheet_name, f'A{row_index}'))
+    response = call_with_retry(spreadsheet.values_batch_get, ranges)
+    value_ranges = response.get('valueRanges', [])
+    
+    moved = []
+    for worksheet_name, row_index, position in plan:
+        if row_index is None:
+            _store_sheet_layout(worksheet_name, value_ranges[position], value_ranges[position + 1])
+            continue
+        cell = (value_ranges[position].get('values') or [['']])[0]
+        if not cell or cell[0].strip() != resume_id:
+            print(f"⚠️ Строки листа '{worksheet_name}' сдвинулись, перечитываю колонку ID")
+            invalidate_row_index(worksheet_name)
+            moved.append(worksheet_name)
+    if moved:
+        _load_sheet_layouts(moved)
+    
+    return {worksheet_name: _find_row(worksheet_name, resume_id) for worksheet_name in worksheet_names}
+
+
+def invalidate_row_index(worksheet_name: Optional[str] = None):
+    """Сбрасывает кэш ID → номер строки (после удаления строк номера сдвигаются)"""
+    with _layout_lock:
+        if worksheet_name is None:
+            _id_rows.clear()
+        else:
+            _id_rows.pop(worksheet_name, None)
+
+
+def _find_row(worksheet_name: str, resume_id: str) -> Optional[int]:
+    """Ищет номер строки по ID в кэше, не обращаясь к API"""
+    with _layout_lock:
+        cached = _id_rows.get(worksheet_name)
+        if not cached or time.time() - cached[0] > ROW_INDEX_TTL:
+            return None
+        return cached[1].get(resume_id)
+
+
+def update_resume_rows(resume_id: str, updates_by_worksheet: Dict[str, Dict[str, Any]]) -> Dict[str, bool]:
+    """
+    Обновляет данные резюме сразу в нескольких листах одним запросом values:batchUpdate
+    
+    Номера колонок (по заголовкам) и строк (по ID в колонке A) берутся из кэша;
+    ID в найденных строках сверяется, а для листов, которых нет в кэше или где
+    ID не найден, разметка загружается — всё одним запросом values:batchGet.
+    
+    Args:
+        resume_id: ID резюме
+        updates_by_worksheet: Словарь {название листа: {название колонки: новое значение}}
+    
+    Returns:
+        Словарь {название листа: True если обновлена хотя бы одна ячейка}
+    """
+    results = {worksheet_name: False for worksheet_name in updates_by_worksheet}
+    resume_id = resume_id.strip()
+    
+    try:
+        spreadsheet = get_spreadsheet()
+        if not spreadsheet:
+            return results
+        
+        rows = _resolve_rows(spreadsheet, list(updates_by_worksheet), resume_id)
+        
+        data = []
+        updated_cells = {}
+        for worksheet_name, update_data in updates_by_worksheet.items():
+            row_index = rows[worksheet_name]
+            if row_index is None:
+                print(f"❌ Резюме с ID '{resume_id}' не найдено в листе '{worksheet_name}'")
+                continue
+            
+            headers = _header_columns.get(worksheet_name, {})
+            for column_name, new_value in update_data.items():
+                column_index = headers.get(column_name.strip().lower())
+                if column_index is None:
+                    print(f"⚠️ Колонка '{column_name}' не найдена в заголовках листа '{worksheet_name}'")
+                    continue
+                data.append({
+                    'range': _a1_sheet_range(worksheet_name, rowcol_to_a1(row_index, column_index)),
+                    'values': [[str(new_value)]],
+                })
+                updated_cells.setdefault(worksheet_name, []).append((column_name, str(new_value)))
+        
+        if not data:
+            print(f"❌ Не удалось обновить ни одного поля для резюме ID {resume_id}")
+            return results
+        
+        call_with_retry(spreadsheet.values_batch_update, {
+            'valueInputOption': 'USER_ENTERED',
+            'data': data,
+        })
+        
+        for worksheet_name, cells in updated_cells.items():
+            results[worksheet_name] = True
+            for column_name, new_value in cells:
+                _index_updated_cell(worksheet_name, resume_id, column_name, new_value)
+        print(f"✅ Обновлено {len(data)} ячеек в {len(updated_cells)} листах для резюме ID {resume_id}")
+        return results
+        
+    except Exception as e:
+        print(f"❌ Ошибка при обновлении резюме: {e}")
+        for worksheet_name in updates_by_worksheet:
+            invalidate_worksheet(worksheet_name)
+            invalidate_row_index(worksheet_name)
+        return results
+
+
 def update_cell_by_id_and_column(resume_id: str, column_name: str, new_value: str, worksheet_name: str = "Свободные ресурсы на аутстафф") -> bool:
     """
     Обновляет конкретную ячейку в Google таблице по ID резюме и названию колонки
@@ -748,68 +1394,7 @@ def update_cell_by_id_and_column(resume_id: str, column_name: str, new_value: st
     Returns:
         bool: True если обновление прошло успешно, False в случае ошибки
     """
-    try:
-        client = get_google_sheet_client()
-        if not client:
-            print("❌ Не удалось подключиться к Google Sheets")
-            return False
-        
-        # Получаем таблицу
-        if SHEET_URL:
-            sheet = client.open_by_url(SHEET_URL)
-        else:
-            print("❌ URL Google таблицы не настроен")
-            return False
-        
-        # Получаем лист
-        try:
-            worksheet = sheet.worksheet(worksheet_name)
-        except gspread.WorksheetNotFound:
-            print(f"❌ Лист '{worksheet_name}' не найден")
-            return False
-        
-        # Получаем все данные из листа
-        all_values = worksheet.get_all_values()
-        
-        if len(all_values) < 2:  # Нет данных кроме заголовков
-            print("❌ В листе нет данных для обновления")
-            return False
-        
-        # Получаем заголовки (первая строка)
-        headers = all_values[0]
-        
-        # Ищем индекс колонки по названию
-        column_index = None
-        for i, header in enumerate(headers):
-            if header.strip().lower() == column_name.strip().lower():
-                column_index = i + 1  # +1 для gspread (1-based indexing)
-                break
-        
-        if column_index is None:
-            print(f"❌ Колонка '{column_name}' не найдена в заголовках")
-            print(f"📋 Доступные колонки: {', '.join(headers)}")
-            return False
-        
-        # Ищем строку с нужным ID (предполагаем что ID в первой колонке)
-        target_row_index = None
-        for row_index, row in enumerate(all_values[1:], start=2):  # Пропускаем заголовки
-            if len(row) > 0 and row[0].strip() == resume_id:
-                target_row_index = row_index
-                break
-        
-        if target_row_index is None:
-            print(f"❌ Резюме с ID '{resume_id}' не найдено в листе '{worksheet_name}'")
-            return False
-        
-        # Обновляем ячейку
-        worksheet.update_cell(target_row_index, column_index, str(new_value))
-        print(f"✅ Обновлена ячейка в строке {target_row_index}, колонка '{column_name}': '{new_value}'")
-        
-        return True
-            
-    except Exception as e:
-        print(f"❌ Ошибка при обновлении ячейки: {e}")
-        return False
+    return update_resume_rows(resume_id, {worksheet_name: {column_name: new_value}})[worksheet_name]
 
 
 def update_resume_by_id(resume_id: str, update_data: Dict[str, Any], worksheet_name: str = "Свободные ресурсы на аутстафф") -> bool:
@@ -824,81 +1409,7 @@ def update_resume_by_id(resume_id: str, update_data: Dict[str, Any], worksheet_n
     Returns:
         bool: True если обновление прошло успешно, False в случае ошибки
     """
-    try:
-        client = get_google_sheet_client()
-        if not client:
-            print("❌ Не удалось подключиться к Google Sheets")
-            return False
-        
-        # Получаем таблицу
-        if SHEET_URL:
-            sheet = client.open_by_url(SHEET_URL)
-        else:
-            print("❌ URL Google таблицы не настроен")
-            return False
-        
-        # Получаем лист
-        try:
-            worksheet = sheet.worksheet(worksheet_name)
-        except gspread.WorksheetNotFound:
-            print(f"❌ Лист '{worksheet_name}' не найден")
-            return False
-        
-        # Получаем все данные из листа
-        all_values = worksheet.get_all_values()
-        
-        if len(all_values) < 2:  # Нет данных кроме заголовков
-            print("❌ В листе нет данных для обновления")
-            return False
-        
-        # Получаем заголовки (первая строка)
-        headers = all_values[0]
-        
-        # Ищем строку с нужным ID (предполагаем что ID в первой колонке)
-        target_row_index = None
-        for row_index, row in enumerate(all_values[1:], start=2):  # Пропускаем заголовки
-            if len(row) > 0 and row[0].strip() == resume_id:
-                target_row_index = row_index
-                break
-        
-        if target_row_index is None:
-            print(f"❌ Резюме с ID '{resume_id}' не найдено в листе '{worksheet_name}'")
-            return False
-        
-        # Обновляем данные
-        updated_count = 0
-        for column_name, new_value in update_data.items():
-            try:
-                # Ищем индекс колонки по названию
-                column_index = None
-                for i, header in enumerate(headers):
-                    if header.strip().lower() == column_name.strip().lower():
-                        column_index = i + 1  # +1 для gspread (1-based indexing)
-                        break
-                
-                if column_index is None:
-                    print(f"⚠️ Колонка '{column_name}' не найдена в заголовках")
-                    continue
-                
-                # Обновляем ячейку
-                worksheet.update_cell(target_row_index, column_index, str(new_value))
-                updated_count += 1
-                print(f"✅ Обновлена колонка '{column_name}': '{new_value}'")
-                
-            except Exception as e:
-                print(f"❌ Ошибка при обновлении колонки '{column_name}': {e}")
-                continue
-        
-        if updated_count > 0:
-            print(f"✅ Успешно обновлено {updated_count} полей для резюме ID {resume_id} в листе '{worksheet_name}'")
-            return True
-        else:
-            print(f"❌ Не удалось обновить ни одного поля для резюме ID {resume_id}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Ошибка при обновлении резюме: {e}")
-        return False
+    return update_resume_rows(resume_id, {worksheet_name: update_data})[worksheet_name]
 
 
 def generate_and_save_mapping_variables(sheet_url=None, sheet_name="Resume_Database"):
@@ -974,21 +1485,9 @@ def fill_column_with_sequential_numbers(
         True если успешно, иначе False.
     """
     try:
-        client = get_google_sheet_client()
-        if not client:
-            print("❌ Не удалось подключиться к Google Sheets")
-            return False
-
-        if SHEET_URL:
-            sheet = client.open_by_url(SHEET_URL)
-        else:
-            print("❌ URL Google таблицы не настроен")
-            return False
-
-        try:
-            worksheet = sheet.worksheet(worksheet_name)
-        except gspread.WorksheetNotFound:
-            print(f"❌ Лист '{worksheet_name}' не найден")
+        # Получаем лист из кэша
+        worksheet = get_worksheet(worksheet_name)
+        if not worksheet:
             return False
 
         all_values = worksheet.get_all_values()
@@ -1010,13 +1509,13 @@ def fill_column_with_sequential_numbers(
         return True
     except Exception as e:
         print(f"❌ Ошибка при заполнении колонки: {e}")
+        invalidate_worksheet(worksheet_name)
         return False
 
-import asyncio
 
 async def update_currency_sheet(bot : Bot):
     print(ADMIN_ID)
-    sheet_names = ['Расчет ставки (штат/контракт) ЕС/США', 'Расчет ставки (штат/контракт) СНГ','Расчет ставки (Самозанятый) СНГ','Расчет ставки (Самозанятый) ЕС/США','Расчет ставки (ИП) СНГ','Расчет ставки (ИП) ЕС/США']
+    sheet_names = RATE_SHEET_NAMES
     curses = parse_cb_rf()
     zp = parse_myfin()
     while True:
@@ -1037,6 +1536,8 @@ async def update_currency_sheet(bot : Bot):
                     await asyncio.sleep(3)
             fill_column_with_sequential_numbers("J", sheet_name, 2, zp)
             await asyncio.sleep(3)
+        # Ставки в листах пересчитались — перестраиваем индекс для поиска по зарплате
+        await asyncio.to_thread(refresh_rate_index)
         await bot.send_message(ADMIN_ID, f"✅ Курсы валют обновлены BYN {byn}, USD {usd}, EUR {eur}")
         await asyncio.sleep(86400)
     
@@ -2,11 +2,190 @@ import google.generativeai as genai
 import os
 import json
 import re
-from maps_for_sheet import (
-    ROLES_MAP, GRADE_MAP, PROGRAM_LANG_MAP, FRAMEWORKS_MAP, TECH_MAP,
-    PRODUCT_INDUSTRIES_MAP, LANG_MAP, PORTFOLIO_MAP, WORK_TIME_MAP,
-    WORK_FORM_MAP, AVAILABILITY_MAP, CONTACTS_MAP
-)
+import asyncio
+import hashlib
+import threading
+import datetime
+import time
+from llm_cache import make_cache_key, cache_get, cache_set
+from llm_metrics import record_call, record_cache_hit, record_retry
+from llm_scheduler import llm_scheduler, estimate_tokens
+from resume_schema import build_response_schema, to_resume_dict, validate_resume_data, CONTACT_KEYS
+import maps_for_sheet
+
+
+# Максимальное время ожидания ответа модели (секунды)
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '180'))
+
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+# Температура генерации; если не задана, используется значение модели по умолчанию
+GEMINI_TEMPERATURE = os.getenv('GEMINI_TEMPERATURE')
+# Версии промптов: при изменении текста промпта увеличьте версию, чтобы не брать старые ответы из кэша
+PROCESS_RESUME_PROMPT_VERSION = "3"
+NEW_RESUME_PROMPT_VERSION = "1"
+# Режим генерации нового резюме: 'json' — один JSON с обеими версиями, 'stream' — потоковый текст по разделам,
+# 'split' — русская и английская версии отдельными параллельными запросами
+NEW_RESUME_MODE = os.getenv('NEW_RESUME_MODE', 'json')
+# В режиме 'split': переводить английскую версию с готовой русской вместо генерации по исходному тексту
+NEW_RESUME_EN_FROM_RU = os.getenv('NEW_RESUME_EN_FROM_RU', '0') in ('1', 'true', 'True')
+# Сколько раз повторять генерацию языковой версии, не прошедшей проверку
+NEW_RESUME_RETRIES = int(os.getenv('NEW_RESUME_RETRIES', '1'))
+# В кэше ID резюме заменяется на метку: один и тот же текст может прийти под разными ID
+_RESUME_ID_PLACEHOLDER = "{{RESUME_ID}}"
+
+
+# Использовать ли кэширование контекста Gemini для статической части промпта process_resume
+GEMINI_CONTEXT_CACHE = os.getenv('GEMINI_CONTEXT_CACHE', '0') in ('1', 'true', 'True')
+GEMINI_CONTEXT_CACHE_TTL = int(os.getenv('GEMINI_CONTEXT_CACHE_TTL', str(60 * 60)))
+# Запрашивать ли у process_resume ответ строго по JSON-схеме, построенной из мап
+GEMINI_RESPONSE_SCHEMA = os.getenv('GEMINI_RESPONSE_SCHEMA', '1') in ('1', 'true', 'True')
+
+_RESPONSE_FORMAT_NOTE = """
+
+**ФОРМАТ ОТВЕТА:** ответ возвращается строго по JSON-схеме запроса. Поля со словарями канонических значений (`grade`, `specialization`, `programmingLanguages`, `frameworks`, `technologies`, `portfolio`, `projectIndustries`, `availability`, `workTime`, `workForm`) передаются не словарями, а списком найденных значений, например `"grade": ["Senior"]`. Поле `languages` передаётся списком объектов, например `[{"language": "English", "level": "B2"}]`; если уровень не указан, `level` равен `null`."""
+
+
+_models_lock = threading.Lock()
+_configured = False
+# Реестр моделей: одна модель на пару (системная инструкция, параметры генерации).
+# genai.configure сбрасывает клиентов библиотеки, поэтому вызывается один раз,
+# и все модели используют общее соединение с API
+_models = {}
+
+
+def _ensure_configured():
+    global _configured
+    if not _configured:
+        genai.configure(api_key=os.getenv("GPT_KEY"))
+        _configured = True
+
+
+def _with_default_generation_config(generation_config: dict | None) -> dict | None:
+    if GEMINI_TEMPERATURE is None:
+        return generation_config
+    return {'temperature': float(GEMINI_TEMPERATURE), **(generation_config or {})}
+
+
+def _get_model(system_instruction: str | None = None, generation_config: dict | None = None):
+    """Возвращает настроенную модель из реестра, создавая её при первом обращении"""
+    generation_config = _with_default_generation_config(generation_config)
+    key = (
+        hashlib.sha256((system_instruction or '').encode('utf-8')).hexdigest(),
+        json.dumps(generation_config, sort_keys=True, ensure_ascii=False),
+    )
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            _ensure_configured()
+            model = genai.GenerativeModel(
+                GEMINI_MODEL,
+                system_instruction=system_instruction,
+                generation_config=generation_config,
+            )
+            _models[key] = model
+        return model
+
+
+def _request_options(timeout: float = LLM_TIMEOUT) -> dict:
+    return {'timeout': timeout}
+
+
+def _strip_json_fences(response_text: str) -> str:
+    return response_text.strip().replace("```json", "").replace("```", "").strip()
+
+
+def _is_valid_json(response_text: str) -> bool:
+    try:
+        json.loads(_strip_json_fences(response_text))
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
+def _process_resume_cache_key(text: str, file_name: str) -> str:
+    prompt_version = f"{PROCESS_RESUME_PROMPT_VERSION}:{get_process_resume_fingerprint()}"
+    return make_cache_key('process_resume', text, prompt_version, GEMINI_MODEL, file_name)
+
+
+def _new_resume_cache_key(text: str, kind: str = 'create_new_resume') -> str:
+    return make_cache_key(kind, text, NEW_RESUME_PROMPT_VERSION, GEMINI_MODEL)
+
+
+def _cache_process_resume(key: str, resume_data: dict | None):
+    # Ответы, которые не удалось разобрать, не кэшируем — следующая попытка спросит модель заново
+    if resume_data is not None:
+        cache_set(key, 'process_resume', resume_data)
+
+
+def _cache_new_resume(key: str, response_text: str, id):
+    if _is_valid_json(response_text):
+        cache_set(key, 'create_new_resume', response_text.replace(str(id), _RESUME_ID_PLACEHOLDER))
+
+
+def _cached_new_resume(key: str, id) -> str | None:
+    cached = cache_get(key)
+    if cached is None:
+        return None
+    return cached.replace(_RESUME_ID_PLACEHOLDER, str(id))
+
+
+def _generate_content(model, contents, operation: str, **kwargs):
+    """Синхронный запрос к модели через общую очередь с записью метрик"""
+    def call():
+        started_at = time.monotonic()
+        try:
+            response = model.generate_content(contents, request_options=_request_options(), **kwargs)
+        except Exception:
+            record_call(operation, started_at, status='error')
+            raise
+        record_call(operation, started_at, response)
+        return response
+    
+    return llm_scheduler.run_sync(call, estimate_tokens(contents), operation)
+
+
+async def generate_text_async(prompt: str, timeout: float = LLM_TIMEOUT, model=None,
+                              generation_config: dict | None = None, operation: str = 'generate') -> str:
+    """
+    Асинхронно отправляет запрос в Gemini через общую очередь, не блокируя цикл событий бота
+    
+    Args:
+        prompt: Текст запроса
+        timeout: Максимальное время ожидания ответа в секундах
+        model: Модель (например, с системной инструкцией); по умолчанию — модель без инструкции
+        generation_config: Параметры генерации только для этого запроса
+        operation: Название операции для метрик
+    
+    Returns:
+        Текст ответа модели
+    
+    Raises:
+        asyncio.TimeoutError: если модель не ответила за timeout секунд
+    """
+    if model is None:
+        model = _get_model()
+    
+    async def call():
+        started_at = time.monotonic()
+        try:
+            # wait_for отменяет запрос при таймауте или отмене вызывающей задачи
+            response = await asyncio.wait_for(
+                model.generate_content_async(prompt, generation_config=generation_config), timeout
+            )
+        except asyncio.TimeoutError:
+            record_call(operation, started_at, status='timeout')
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            record_call(operation, started_at, status='error')
+            raise
+        record_call(operation, started_at, response)
+        return response
+    
+    # Очередь соблюдает квоты RPM/TPM, приоритет и повторяет запрос при 429/503
+    response = await llm_scheduler.run(call, estimate_tokens(prompt), operation)
+    return response.text
 
 
 def fix_color_formatting(text: str) -> str:
@@ -20,22 +199,78 @@ def fix_color_formatting(text: str) -> str:
 
 
 
-def process_resume(text: str, file_name: str = "") -> dict | None:
-    file_info = f"\nНазвание файла: {file_name}\n" if file_name else ""
-    
+# Пример ответа process_resume: словари значений (без схемы) и списки (по JSON-схеме)
+_DICT_FORMAT_EXAMPLE = """{
+  "specialization": {"Python Developer": true, "Backend Developer": true},
+  "firstName": {"ru": "Иван", "en": "Ivan"},
+  "lastName": {"ru": "Иванов", "en": "Ivanov"},
+  "patronymic": {"ru": "Иванович", "en": "Ivanovich"},
+  "dateOfBirth": "01.01.2000",
+  "grade": {"Senior": true, "Middle": false, "Junior": false},
+  "totalExperience": "8 лет",
+  "dateOfExit": "2025-08-30",
+  "specialExperience": "Python Developer - 5 лет",
+  "programmingLanguages": {"Python": true, "JavaScript": true, "TypeScript": true},
+  "frameworks": {"Django": true, "FastAPI": true, "React": true},
+  "technologies": {"PostgreSQL": true, "Docker": true, "AWS": true, "Redis": true},
+  "location": {"ru": "Россия", "en": "Russia"},
+  "city": {"ru": "Москва", "en": "Moscow"},
+  "contacts": {"phone": "+79001234567", "email": "ivan.ivanov@example.com", "telegram": "@ivanov_dev", "skype": "ivan.ivanov"},
+  "portfolio": {"GitHub": true, "Medium": true, "Personal Website": false},
+  "languages": {"English": "B2", "Spanish": "A2", "German": null},
+  "projectIndustries": {"FinTech": true, "Healthcare": true, "E-commerce": false},
+  "availability": {"Open to offers": true, "Not looking": false},
+  "workTime": {"Full-time": true, "Part-time": false, "Contract": false},
+  "workForm": {"Оформление в штат": true, "B2B contract": true, "Самозанятый": false},
+  "salaryExpectations": {"amount": "300000", "currency": "RUB"},
+  "rateRub": "1500"
+}
+"""
+
+_SCHEMA_FORMAT_EXAMPLE = """{
+  "specialization": ["Python Developer", "Backend Developer"],
+  "firstName": {"ru": "Иван", "en": "Ivan"},
+  "lastName": {"ru": "Иванов", "en": "Ivanov"},
+  "patronymic": {"ru": "Иванович", "en": "Ivanovich"},
+  "dateOfBirth": "01.01.2000",
+  "grade": ["Senior"],
+  "totalExperience": "8 лет",
+  "dateOfExit": "2025-08-30",
+  "specialExperience": "Python Developer - 5 лет",
+  "programmingLanguages": ["Python", "JavaScript", "TypeScript"],
+  "frameworks": ["Django", "FastAPI", "React"],
+  "technologies": ["PostgreSQL", "Docker", "AWS", "Redis"],
+  "location": {"ru": "Россия", "en": "Russia"},
+  "city": {"ru": "Москва", "en": "Moscow"},
+  "contacts": {"phone": "+79001234567", "email": "ivan.ivanov@example.com", "telegram": "@ivanov_dev", "skype": "ivan.ivanov"},
+  "portfolio": ["GitHub", "Medium"],
+  "languages": [{"language": "English", "level": "B2"}, {"language": "Spanish", "level": "A2"}, {"language": "German", "level": null}],
+  "projectIndustries": ["FinTech", "Healthcare"],
+  "availability": ["Open to offers"],
+  "workTime": ["Full-time"],
+  "workForm": ["Оформление в штат", "B2B contract"],
+  "salaryExpectations": {"amount": "300000", "currency": "RUB"},
+  "rateRub": "1500"
+}
+"""
+
+
+def _build_process_resume_instruction() -> str:
+    """Собирает статическую часть промпта process_resume: правила и канонические значения из мап"""
     # Создаем строки с доступными значениями из всех мап
-    grade_values = ', '.join(f'"{v}"' for v in GRADE_MAP.values())
-    roles_values = ', '.join(f'"{v}"' for v in ROLES_MAP.values())
-    prog_lang_values = ', '.join(f'"{v}"' for v in PROGRAM_LANG_MAP.values())
-    frameworks_values = ', '.join(f'"{v}"' for v in FRAMEWORKS_MAP.values())
-    tech_values = ', '.join(f'"{v}"' for v in TECH_MAP.values())
-    industries_values = ', '.join(f'"{v}"' for v in PRODUCT_INDUSTRIES_MAP.values())
-    lang_values = ', '.join(f'"{v}"' for v in LANG_MAP.values())
-    portfolio_values = ', '.join(f'"{v}"' for v in PORTFOLIO_MAP.values())
-    work_time_values = ', '.join(f'"{v}"' for v in WORK_TIME_MAP.values())
-    work_form_values = ', '.join(f'"{v}"' for v in WORK_FORM_MAP.values())
-    availability_values = ', '.join(f'"{v}"' for v in AVAILABILITY_MAP.values())
-    contacts_values = ', '.join(f'"{v}"' for v in CONTACTS_MAP.values())
+    grade_values = ', '.join(f'"{v}"' for v in maps_for_sheet.GRADE_MAP.values())
+    roles_values = ', '.join(f'"{v}"' for v in maps_for_sheet.ROLES_MAP.values())
+    prog_lang_values = ', '.join(f'"{v}"' for v in maps_for_sheet.PROGRAM_LANG_MAP.values())
+    frameworks_values = ', '.join(f'"{v}"' for v in maps_for_sheet.FRAMEWORKS_MAP.values())
+    tech_values = ', '.join(f'"{v}"' for v in maps_for_sheet.TECH_MAP.values())
+    industries_values = ', '.join(f'"{v}"' for v in maps_for_sheet.PRODUCT_INDUSTRIES_MAP.values())
+    lang_values = ', '.join(f'"{v}"' for v in maps_for_sheet.LANG_MAP.values())
+    portfolio_values = ', '.join(f'"{v}"' for v in maps_for_sheet.PORTFOLIO_MAP.values())
+    work_time_values = ', '.join(f'"{v}"' for v in maps_for_sheet.WORK_TIME_MAP.values())
+    work_form_values = ', '.join(f'"{v}"' for v in maps_for_sheet.WORK_FORM_MAP.values())
+    availability_values = ', '.join(f'"{v}"' for v in maps_for_sheet.AVAILABILITY_MAP.values())
+    contacts_values = ', '.join(f'"{v}"' for v in maps_for_sheet.CONTACTS_MAP.values())
+    example = _SCHEMA_FORMAT_EXAMPLE if GEMINI_RESPONSE_SCHEMA else _DICT_FORMAT_EXAMPLE
     
     prompt = f"""Твоя задача — выступить в роли умного парсера резюме. Ты должен извлечь информацию из предоставленного текста и структурировать её в JSON-формате, строго следуя приведённым ниже правилам и структурам.
 
@@ -68,9 +303,7 @@ def process_resume(text: str, file_name: str = "") -> dict | None:
     * **Доступность (`availability`):** {availability_values}
 
 ---
-**ТЕКСТ РЕЗЮМЕ ДЛЯ АНАЛИЗА:**
-{text}
-{file_info}
+**ТЕКСТ РЕЗЮМЕ ДЛЯ АНАЛИЗА** передаётся отдельным сообщением после этих инструкций.
 ---
 
 **СТРУКТУРА JSON ДЛЯ ЗАПОЛНЕНИЯ:**
@@ -95,7 +328,7 @@ def process_resume(text: str, file_name: str = "") -> dict | None:
 **КОНТАКТНАЯ ИНФОРМАЦИЯ:**
 - `location`: Страна.
 - `city`: Город.
-- `contacts`: Словарь со всеми найденными контактами (phone, email, telegram, linkedin, github и т.д.).
+- `contacts`: Словарь со всеми найденными контактами. Ключи: {', '.join(CONTACT_KEYS)}.
 
 **ПРОЧЕЕ:**
 - `portfolio`: Словарь, где ключи **строго** из списка {portfolio_values}.
@@ -106,72 +339,242 @@ def process_resume(text: str, file_name: str = "") -> dict | None:
 - `availability`: Словарь, где ключи **строго** из списка {availability_values}.
 - `workTime`: Словарь, где ключи **строго** из списка {work_time_values}.
 - `workForm`: Словарь, где ключи **строго** из списка {work_form_values}.
-- `salaryExpectations`: Словарь с суммой и валютой (`amount`, `currency`). Валюты: RUB, USD, EUR, BYN. Проверяй текст и название файла. "у.е." всегда USD. Числа в названии файла (например, "от 200000") — это зарплата в RUB.
+- `salaryExpectations`: Словарь с суммой и валютой (`amount`, `currency`) из текста резюме. Валюты: RUB, USD, EUR, BYN. "у.е." всегда USD.
 - `rateRub`: Рейт в рублях.
 **Пример JSON-структуры:**
 ```json
-{{
-  "specialization": {{"Python Developer": true, "Backend Developer": true}},
-  "firstName": {{"ru": "Иван", "en": "Ivan"}},
-  "lastName": {{"ru": "Иванов", "en": "Ivanov"}},
-  "patronymic": {{"ru": "Иванович", "en": "Ivanovich"}},
-  "dateOfBirth": "01.01.2000",
-  "grade": {{"Senior": true, "Middle": false, "Junior": false}},
-  "totalExperience": "8 лет",
-  "dateOfExit": "2025-08-30",
-  "specialExperience": "Python Developer - 5 лет",
-  "programmingLanguages": {{"Python": true, "JavaScript": true, "TypeScript": true}},
-  "frameworks": {{"Django": true, "FastAPI": true, "React": true}},
-  "technologies": {{"PostgreSQL": true, "Docker": true, "AWS": true, "Redis": true}},
-  "location": {{"ru": "Россия", "en": "Russia"}},
-  "city": {{"ru": "Москва", "en": "Moscow"}},
-  "contacts": {{
-    "phone": "+79001234567",
-    "email": "ivan.ivanov@example.com",
-    "linkedin": "https://linkedin.com/in/ivanov",
-    "telegram": "@ivanov_dev",
-    "skype": "ivan.ivanov",
-    "github": "https://github.com/ivanov",
-    "gitlab": "https://gitlab.com/ivanov",
-    "whatsapp": "+79001234567",
-    "viber": "+79001234567",
-    "discord": "ivanov#1234",
-    "slack": "@ivanov",
-    "microsoftTeams": "ivan.ivanov@company.com",
-    "zoom": "ivan.ivanov@company.com",
-    "googleMeet": "ivan.ivanov@gmail.com",
-    "facebook": "https://facebook.com/ivan.ivanov",
-    "instagram": "@ivanov_dev",
-    "twitter": "@ivanov_dev",
-    "vk": "https://vk.com/ivanov",
-    "tiktok": "@ivanov_dev",
-    "reddit": "u/ivanov_dev",
-    "stackoverflow": "https://stackoverflow.com/users/123456/ivanov",
-    "habrCareer": "https://career.habr.com/ivanov"
-  }},
-  "portfolio": {{"GitHub": true, "Medium": true, "Personal Website": false}},
-  "languages": {{"English": "B2", "Spanish": "A2", "German": null}},
-  "projectIndustries": {{"FinTech": true, "Healthcare": true, "E-commerce": false}},
-  "availability": {{"Open to offers": true, "Not looking": false}},
-  "workTime": {{"Full-time": true, "Part-time": false, "Contract": false}},
-  "workForm": {{"Оформление в штат": true, "B2B contract": true, "Самозанятый": false}},
-  "salaryExpectations": {{"amount": "300000", "currency": "RUB"}},
-  "rateRub": "1500"
-}}
-```"""
+{example}```"""
+    return prompt
+
+
+def _build_process_resume_contents(text: str, file_name: str = "") -> str:
+    """Собирает переменную часть запроса process_resume: только текст резюме и имя файла"""
+    file_info = f"\nНазвание файла: {file_name}\n" if file_name else ""
+    return f"""**ТЕКСТ РЕЗЮМЕ ДЛЯ АНАЛИЗА:**
+{text}
+{file_info}"""
+
+
+# Статическая часть промпта собирается один раз за время работы процесса. Мапы не перечитываются
+# на лету: scan_handler импортирует их при запуске, и промпт должен совпадать с маппингом листа,
+# поэтому после generate_maps.py бота нужно перезапустить.
+# Оба состояния — неизменяемые кортежи, которые заменяются целиком: корутины читают их без блокировок
+# (инструкция, отпечаток, параметры генерации)
+_instruction_snapshot = None
+# (модель, время пересоздания кэша контекста или None)
+_model_snapshot = None
+# Только для создания модели в рабочих потоках: внутри идёт сетевой запрос CachedContent.create,
+# поэтому из корутин эту блокировку брать нельзя
+_instruction_lock = threading.Lock()
+
+
+def _process_resume_generation_config(fields: list | None = None) -> dict | None:
+    """Параметры генерации process_resume: JSON-режим и схема (полная или только по указанным полям)"""
+    if not GEMINI_RESPONSE_SCHEMA:
+        return None
+    return {
+        'response_mime_type': 'application/json',
+        'response_schema': build_response_schema(fields),
+    }
+
 
-    genai.configure(api_key=os.getenv("GPT_KEY"))
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    response = model.generate_content(prompt)
-    response_text = response.text.strip().replace("```json", "").replace("```", "").strip()
+def _get_instruction_snapshot() -> tuple:
+    """Возвращает (инструкция, отпечаток, параметры генерации); сборка без сети, повторная сборка безвредна"""
+    global _instruction_snapshot
+    snapshot = _instruction_snapshot
+    if snapshot is None:
+        instruction = _build_process_resume_instruction()
+        if GEMINI_RESPONSE_SCHEMA:
+            instruction += _RESPONSE_FORMAT_NOTE
+        snapshot = (
+            instruction,
+            hashlib.sha256(instruction.encode('utf-8')).hexdigest()[:16],
+            _process_resume_generation_config(),
+        )
+        _instruction_snapshot = snapshot
+    return snapshot
+
+
+def get_process_resume_fingerprint() -> str:
+    """Возвращает отпечаток статической части промпта (меняется вместе с мапами после перезапуска)"""
+    return _get_instruction_snapshot()[1]
+
+
+def _create_cached_content_model(instruction: str, fingerprint: str, generation_config: dict | None):
+    """
+    Создаёт кэш контекста Gemini со статической инструкцией
+    
+    Returns:
+        Кортеж (модель, время пересоздания кэша) или None при ошибке
+    """
+    try:
+        with _models_lock:
+            _ensure_configured()
+        cached_content = genai.caching.CachedContent.create(
+            model=f"models/{GEMINI_MODEL}",
+            display_name=f"process_resume_{fingerprint}",
+            system_instruction=instruction,
+            ttl=datetime.timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL),
+        )
+        # Пересоздаём кэш чуть раньше истечения, чтобы не попасть на удалённый контекст
+        cached_until = datetime.datetime.now() + datetime.timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL * 0.9)
+        model = genai.GenerativeModel.from_cached_content(
+            cached_content=cached_content,
+            generation_config=_with_default_generation_config(generation_config),
+        )
+        return model, cached_until
+    except Exception as e:
+        print(f"⚠️ Не удалось создать кэш контекста Gemini, используется system_instruction: {e}")
+        return None
+
+
+def _ready_process_resume_model():
+    """Возвращает уже созданную модель или None, если её нужно создать (или пересоздать кэш контекста)"""
+    snapshot = _model_snapshot
+    if snapshot is None:
+        return None
+    model, cached_until = snapshot
+    if cached_until is not None and datetime.datetime.now() >= cached_until:
+        return None
+    return model
+
+
+def _get_process_resume_model():
+    """Возвращает модель, в которую статическая часть промпта уже передана как системная инструкция"""
+    global _model_snapshot
+    model = _ready_process_resume_model()
+    if model is not None:
+        return model
+    with _instruction_lock:
+        # Пока ждали блокировку, модель мог создать другой поток
+        model = _ready_process_resume_model()
+        if model is not None:
+            return model
+        instruction, fingerprint, generation_config = _get_instruction_snapshot()
+        snapshot = None
+        if GEMINI_CONTEXT_CACHE:
+            snapshot = _create_cached_content_model(instruction, fingerprint, generation_config)
+        if snapshot is None:
+            snapshot = (_get_model(system_instruction=instruction, generation_config=generation_config), None)
+        _model_snapshot = snapshot
+        return snapshot[0]
+
+
+async def _get_process_resume_model_async():
+    """Асинхронная версия _get_process_resume_model: создание модели и кэша контекста идёт в рабочем потоке"""
+    model = _ready_process_resume_model()
+    if model is not None:
+        return model
+    return await asyncio.to_thread(_get_process_resume_model)
+
+
+def _parse_process_resume_response(response_text: str) -> dict | None:
+    response_text = _strip_json_fences(response_text)
 
     try:
         response_json = json.loads(response_text)
-        
-        return response_json
     except json.JSONDecodeError:
         print(f"Ошибка при разборе JSON: {response_text}")
         return None
+    if not isinstance(response_json, dict):
+        print(f"Ошибка при разборе JSON: ожидался объект, получено {type(response_json).__name__}")
+        return None
+    return to_resume_dict(response_json)
+
+
+def _build_reask_contents(contents: str, invalid_fields: list, resume_data: dict) -> str:
+    """Собирает повторный запрос только по полям, не прошедшим проверку"""
+    previous = {field: resume_data.get(field) for field in invalid_fields}
+    return f"""{contents}
+
+---
+В предыдущем ответе значения этих полей некорректны: {json.dumps(previous, ensure_ascii=False)}
+Извлеки заново ТОЛЬКО поля {', '.join(invalid_fields)}, строго соблюдая правила и форматы. Остальные поля не возвращай."""
+
+
+def _apply_reask(resume_data: dict, invalid_fields: list, reask_text: str | None):
+    """Подставляет исправленные значения; поля, которые так и не прошли проверку, обнуляются"""
+    fixed = _parse_process_resume_response(reask_text) if reask_text else None
+    for field in invalid_fields:
+        resume_data[field] = fixed.get(field) if fixed else None
+    still_invalid = validate_resume_data(resume_data)
+    for field in still_invalid:
+        print(f"⚠️ Поле {field} не прошло проверку после повторного запроса и будет пропущено")
+        resume_data[field] = None
+
+
+def process_resume(text: str, file_name: str = "") -> dict | None:
+    cache_key = _process_resume_cache_key(text, file_name)
+    cached = cache_get(cache_key)
+    if cached is not None:
+        print(f"💾 Данные резюме взяты из кэша ({file_name})")
+        record_cache_hit('process_resume')
+        return cached
+    
+    model = _get_process_resume_model()
+    contents = _build_process_resume_contents(text, file_name)
+    response = _generate_content(model, contents, 'process_resume')
+    resume_data = _parse_process_resume_response(response.text)
+    if resume_data is None:
+        return None
+    
+    invalid_fields = validate_resume_data(resume_data)
+    if invalid_fields:
+        print(f"🔁 Повторный запрос полей {', '.join(invalid_fields)} ({file_name})")
+        record_retry('process_resume')
+        reask = _generate_content(
+            model,
+            _build_reask_contents(contents, invalid_fields, resume_data),
+            'process_resume_reask',
+            generation_config=_process_resume_generation_config(invalid_fields),
+        )
+        _apply_reask(resume_data, invalid_fields, reask.text)
+    
+    _cache_process_resume(cache_key, resume_data)
+    return resume_data
+
+
+async def process_resume_async(text: str, file_name: str = "", timeout: float = LLM_TIMEOUT) -> dict | None:
+    """Асинхронная версия process_resume; при таймауте возвращает None"""
+    cache_key = _process_resume_cache_key(text, file_name)
+    # Чтение и запись SQLite-кэша — в рабочем потоке, чтобы не блокировать цикл событий
+    cached = await asyncio.to_thread(cache_get, cache_key)
+    if cached is not None:
+        print(f"💾 Данные резюме взяты из кэша ({file_name})")
+        record_cache_hit('process_resume')
+        return cached
+    
+    model = await _get_process_resume_model_async()
+    contents = _build_process_resume_contents(text, file_name)
+    try:
+        response_text = await generate_text_async(contents, timeout, model=model, operation='process_resume')
+    except asyncio.TimeoutError:
+        print(f"⏱ Модель не ответила за {timeout:.0f} с при извлечении данных ({file_name})")
+        return None
+    resume_data = _parse_process_resume_response(response_text)
+    if resume_data is None:
+        return None
+    
+    # Некорректные поля запрашиваем повторно по отдельности, а не перезапускаем весь разбор
+    invalid_fields = validate_resume_data(resume_data)
+    if invalid_fields:
+        print(f"🔁 Повторный запрос полей {', '.join(invalid_fields)} ({file_name})")
+        record_retry('process_resume')
+        try:
+            reask_text = await generate_text_async(
+                _build_reask_contents(contents, invalid_fields, resume_data),
+                timeout,
+                model=model,
+                generation_config=_process_resume_generation_config(invalid_fields),
+                operation='process_resume_reask',
+            )
+        except asyncio.TimeoutError:
+            print(f"⏱ Модель не ответила за {timeout:.0f} с при повторном запросе ({file_name})")
+            reask_text = None
+        _apply_reask(resume_data, invalid_fields, reask_text)
+    
+    await asyncio.to_thread(_cache_process_resume, cache_key, resume_data)
+    return resume_data
 
 
 def translate_name_to_english(russian_name: str) -> str:
@@ -229,7 +632,31 @@ def translate_name_to_english(russian_name: str) -> str:
     return result.capitalize()
 
 
-def create_new_resume(text, id):
+_NEW_RESUME_JSON_FORMAT = """ВАЖНО: Верни результат СТРОГО в формате JSON:
+{
+  "russian": "полный текст резюме на русском языке с HTML-тегами для стилизации",
+  "english": "полный текст резюме на английском языке с HTML-тегами для стилизации"
+}"""
+
+_RUSSIAN_MARKER = "[[RUSSIAN]]"
+_ENGLISH_MARKER = "[[ENGLISH]]"
+
+_NEW_RESUME_STREAM_FORMAT = f"""ВАЖНО: Верни результат обычным текстом (НЕ JSON) из двух разделов:
+{_RUSSIAN_MARKER}
+полный текст резюме на русском языке с HTML-тегами для стилизации
+{_ENGLISH_MARKER}
+полный текст резюме на английском языке с HTML-тегами для стилизации
+Строки {_RUSSIAN_MARKER} и {_ENGLISH_MARKER} пиши отдельными строками без других символов. Никакого текста до, между или после разделов."""
+
+
+_NEW_RESUME_SINGLE_FORMAT = """ВАЖНО: Верни ТОЛЬКО {language_name} версию резюме обычным текстом (НЕ JSON) с HTML-тегами для стилизации.
+Другую языковую версию не выводи. Никакого текста до или после резюме."""
+
+_LANGUAGE_NAMES = {"russian": "русскую", "english": "английскую"}
+_LANGUAGE_TITLES = {"russian": "Русская", "english": "Английская"}
+
+
+def _build_new_resume_prompt(text: str, id, output_format: str = _NEW_RESUME_JSON_FORMAT) -> str:
   
   prompt  = f"""PROMPT: Expert Resume Formatter 🧠 Роль: Эксперт по форматированию и унификации резюме 
 
@@ -416,22 +843,36 @@ Additional tools: open-source, mentoring, volunteering
 Если резюме на английском → добавь русскую.  
 В английской версии ни одного русского символа!  
 
-ВАЖНО: Верни результат СТРОГО в формате JSON:
-{{
-  "russian": "полный текст резюме на русском языке с HTML-тегами для стилизации",
-  "english": "полный текст резюме на английском языке с HTML-тегами для стилизации"
-}}
+{output_format}
 
 Текст резюме: {text}
 
 """
+  return prompt
+
 
+def translate_russian_names(english_text: str) -> str:
+  """Заменяет оставшиеся в английской версии русские имена на английские"""
+  
+  # Расширенный паттерн для поиска русских имен, фамилий и отчеств (кириллица)
+  russian_name_pattern = r'\b[А-ЯЁ][а-яё]{1,}(?:\s+[А-ЯЁ][а-яё]{1,})*\b'
+  
+  def replace_russian_names(match):
+    russian_name = match.group(0)
+    # Если это составное имя (имя + фамилия), переводим каждую часть
+    if ' ' in russian_name:
+      parts = russian_name.split()
+      english_parts = [translate_name_to_english(part) for part in parts]
+      return ' '.join(english_parts)
+    else:
+      return translate_name_to_english(russian_name)
+  
+  # Заменяем все найденные русские имена на английские
+  return re.sub(russian_name_pattern, replace_russian_names, english_text)
 
 
-  genai.configure(api_key=os.getenv("GPT_KEY"))
-  model = genai.GenerativeModel("gemini-2.5-flash")
-  response = model.generate_content(prompt)
-  response_text = response.text.strip().replace("```json", "").replace("```", "").strip()
+def _parse_new_resume_response(response_text: str) -> dict:
+  response_text = _strip_json_fences(response_text)
   
   try:
     response_json = json.loads(response_text)
@@ -443,28 +884,7 @@ Additional tools: open-source, mentoring, volunteering
       response_json["english"] = fix_color_formatting(response_json["english"])
       
       # Переводим русские имена на английский в английской версии
-      english_text = response_json["english"]
-      
-      # Ищем русские имена в тексте и заменяем их на английские
-      import re
-      
-      # Расширенный паттерн для поиска русских имен, фамилий и отчеств (кириллица)
-      russian_name_pattern = r'\b[А-ЯЁ][а-яё]{1,}(?:\s+[А-ЯЁ][а-яё]{1,})*\b'
-      
-      def replace_russian_names(match):
-        russian_name = match.group(0)
-        # Если это составное имя (имя + фамилия), переводим каждую часть
-        if ' ' in russian_name:
-          parts = russian_name.split()
-          english_parts = [translate_name_to_english(part) for part in parts]
-          return ' '.join(english_parts)
-        else:
-          return translate_name_to_english(russian_name)
-      
-      # Заменяем все найденные русские имена на английские
-      english_text = re.sub(russian_name_pattern, replace_russian_names, english_text)
-      
-      response_json["english"] = english_text
+      response_json["english"] = translate_russian_names(response_json["english"])
     
     return response_json
   except json.JSONDecodeError:
@@ -475,3 +895,282 @@ Additional tools: open-source, mentoring, volunteering
       "russian": fixed_text,
       "english": fixed_text
     }
+
+
+def create_new_resume(text, id):
+  cache_key = _new_resume_cache_key(text)
+  cached = _cached_new_resume(cache_key, id)
+  if cached is not None:
+    print(f"💾 Новое резюме {id} взято из кэша")
+    record_cache_hit('create_new_resume')
+    return _parse_new_resume_response(cached)
+  
+  prompt = _build_new_resume_prompt(text, id)
+  response = _generate_content(_get_model(), prompt, 'create_new_resume')
+  _cache_new_resume(cache_key, response.text, id)
+  return _parse_new_resume_response(response.text)
+
+
+async def create_new_resume_async(text: str, id, timeout: float = LLM_TIMEOUT) -> dict | None:
+  """Асинхронная версия create_new_resume; при таймауте возвращает None"""
+  cache_key = _new_resume_cache_key(text)
+  cached = await asyncio.to_thread(_cached_new_resume, cache_key, id)
+  if cached is not None:
+    print(f"💾 Новое резюме {id} взято из кэша")
+    record_cache_hit('create_new_resume')
+    return _parse_new_resume_response(cached)
+  
+  prompt = _build_new_resume_prompt(text, id)
+  try:
+    response_text = await generate_text_async(prompt, timeout, operation='create_new_resume')
+  except asyncio.TimeoutError:
+    print(f"⏱ Модель не ответила за {timeout:.0f} с при форматировании резюме {id}")
+    return None
+  await asyncio.to_thread(_cache_new_resume, cache_key, response_text, id)
+  return _parse_new_resume_response(response_text)
+
+
+class NewResumeStreamParser:
+  """
+  Построчно разбирает потоковый ответ с разделами [[RUSSIAN]] и [[ENGLISH]]
+  
+  Каждая готовая строка сразу передаётся в on_paragraph(language, line),
+  а завершение раздела — в on_section_done(language).
+  """
+  
+  _MARKERS = {_RUSSIAN_MARKER: "russian", _ENGLISH_MARKER: "english"}
+  
+  def __init__(self, on_paragraph=None, on_section_done=None):
+    self.on_paragraph = on_paragraph
+    self.on_section_done = on_section_done
+    self.sections = {"russian": [], "english": []}
+    self.current = None
+    self.raw_parts = []
+    self._buffer = ""
+  
+  def feed(self, chunk: str):
+    self.raw_parts.append(chunk)
+    self._buffer += chunk
+    while "\n" in self._buffer:
+      line, self._buffer = self._buffer.split("\n", 1)
+      self._handle_line(line)
+  
+  def close(self):
+    if self._buffer:
+      self._handle_line(self._buffer)
+      self._buffer = ""
+    self._finish_section()
+  
+  @property
+  def raw_text(self) -> str:
+    return "".join(self.raw_parts)
+  
+  def result(self) -> dict:
+    return {language: "\n".join(lines) for language, lines in self.sections.items()}
+  
+  def _finish_section(self):
+    if self.current is not None and self.on_section_done:
+      self.on_section_done(self.current)
+    self.current = None
+  
+  def _handle_line(self, line: str):
+    stripped = line.strip()
+    if stripped in self._MARKERS:
+      self._finish_section()
+      self.current = self._MARKERS[stripped]
+      return
+    # Строки вне разделов (вступление, ограждения ```) пропускаем
+    if self.current is None or stripped.startswith("```"):
+      return
+    line = fix_color_formatting(line.rstrip())
+    if self.current == "english":
+      line = translate_russian_names(line)
+    self.sections[self.current].append(line)
+    if self.on_paragraph:
+      self.on_paragraph(self.current, line)
+
+
+def _replay_new_resume(result: dict, on_paragraph=None, on_section_done=None):
+  """Передаёт готовое резюме в обработчики потокового режима (кэш или ответ не по разделам)"""
+  for language in ("russian", "english"):
+    if on_paragraph:
+      for line in result.get(language, "").split("\n"):
+        on_paragraph(language, line)
+    if on_section_done:
+      on_section_done(language)
+
+
+async def create_new_resume_stream_async(text: str, id, on_paragraph=None, on_section_done=None,
+                                         timeout: float = LLM_TIMEOUT) -> dict | None:
+  """
+  Потоковая версия create_new_resume: резюме генерируется с stream=True
+  и разбирается по строкам по мере поступления
+  
+  Args:
+    text: Текст исходного резюме
+    id: ID резюме
+    on_paragraph: Вызывается для каждой готовой строки: on_paragraph(language, line)
+    on_section_done: Вызывается после завершения раздела: on_section_done(language)
+    timeout: Максимальное время генерации в секундах
+  
+  Returns:
+    Словарь {'russian': ..., 'english': ...} или None при таймауте
+  """
+  cache_key = _new_resume_cache_key(text, kind='create_new_resume_stream')
+  cached = await asyncio.to_thread(_cached_new_resume, cache_key, id)
+  if cached is not None:
+    print(f"💾 Новое резюме {id} взято из кэша")
+    record_cache_hit('create_new_resume_stream')
+    parser = NewResumeStreamParser(on_paragraph, on_section_done)
+    parser.feed(cached)
+    parser.close()
+    return parser.result()
+  
+  prompt = _build_new_resume_prompt(text, id, output_format=_NEW_RESUME_STREAM_FORMAT)
+  parser = NewResumeStreamParser(on_paragraph, on_section_done)
+  
+  async def consume():
+    response = await _get_model().generate_content_async(prompt, stream=True)
+    async for chunk in response:
+      parser.feed(chunk.text)
+    return response
+  
+  async def call():
+    started_at = time.monotonic()
+    try:
+      response = await asyncio.wait_for(consume(), timeout)
+    except asyncio.TimeoutError:
+      record_call('create_new_resume_stream', started_at, status='timeout')
+      raise
+    except asyncio.CancelledError:
+      raise
+    except Exception:
+      record_call('create_new_resume_stream', started_at, status='error')
+      raise
+    # После полного прочтения потока usage_metadata содержит итоговые токены
+    record_call('create_new_resume_stream', started_at, response)
+    return response
+  
+  try:
+    # Повторять можно, только пока ни одна строка не ушла в обработчики
+    await llm_scheduler.run(call, estimate_tokens(prompt), 'create_new_resume_stream',
+                            can_retry=lambda: not parser.raw_text)
+  except asyncio.TimeoutError:
+    print(f"⏱ Модель не ответила за {timeout:.0f} с при форматировании резюме {id}")
+    return None
+  parser.close()
+  
+  result = parser.result()
+  if not result["russian"] and not result["english"]:
+    # Модель не соблюдала разделы — разбираем ответ как обычно и передаём его целиком
+    print(f"⚠️ Ответ для резюме {id} без разделов, используется обычный разбор")
+    result = _parse_new_resume_response(parser.raw_text)
+    _replay_new_resume(result, on_paragraph, on_section_done)
+    return result
+  
+  if result["russian"] and result["english"]:
+    await asyncio.to_thread(
+      cache_set, cache_key, 'create_new_resume_stream', parser.raw_text.replace(str(id), _RESUME_ID_PLACEHOLDER)
+    )
+  return result
+
+
+_CYRILLIC_RE = re.compile(r'[А-Яа-яЁё]')
+
+
+def _build_translation_prompt(russian_text: str) -> str:
+  return f"""Переведи резюме кандидата с русского на английский язык.
+Сохрани структуру, порядок разделов и все HTML-теги стилизации без изменений; заголовки разделов переведи (например, ИНФОРМАЦИЯ О КАНДИДАТЕ → CANDIDATE INFO, РЕЗЮМЕ → SUMMARY).
+Имена пиши только латиницей. В английской версии не должно быть ни одного русского символа.
+Верни только переведённый текст резюме, без пояснений и без JSON.
+
+Резюме:
+{russian_text}
+"""
+
+
+def _postprocess_language_version(response_text: str, language: str) -> str:
+  # Убираем ограждения ``` (```html, ```text и т.п.), если модель их добавила
+  lines = [line for line in response_text.strip().split("\n") if not line.strip().startswith("```")]
+  text = fix_color_formatting("\n".join(lines).strip())
+  if language == "english":
+    text = translate_russian_names(text)
+  return text
+
+
+def _validate_language_version(text: str, language: str) -> str | None:
+  """Проверяет языковую версию резюме; возвращает описание ошибки или None"""
+  letters = sum(1 for char in text if char.isalpha())
+  if not letters:
+    return "пустой ответ"
+  cyrillic = len(_CYRILLIC_RE.findall(text))
+  if language == "russian" and cyrillic < letters * 0.3:
+    return "текст не на русском языке"
+  if language == "english" and cyrillic > letters * 0.02:
+    return "в английской версии остались русские символы"
+  return None
+
+
+async def _generate_language_version(prompt: str, language: str, id, timeout: float, operation: str) -> str | None:
+  """Генерирует одну языковую версию и повторяет запрос, если она не прошла проверку"""
+  for attempt in range(1 + NEW_RESUME_RETRIES):
+    if attempt:
+      record_retry(operation)
+    try:
+      response_text = await generate_text_async(prompt, timeout, operation=operation)
+    except asyncio.TimeoutError:
+      print(f"⏱ Модель не ответила за {timeout:.0f} с ({_LANGUAGE_TITLES[language].lower()} версия резюме {id})")
+      continue
+    version = _postprocess_language_version(response_text, language)
+    error = _validate_language_version(version, language)
+    if error is None:
+      return version
+    print(f"⚠️ {_LANGUAGE_TITLES[language]} версия резюме {id} не прошла проверку ({error}), попытка {attempt + 1}")
+  return None
+
+
+async def _cached_language_version(kind: str, text: str, prompt_factory, language: str, id, timeout: float) -> str | None:
+  cache_key = _new_resume_cache_key(text, kind=kind)
+  cached = await asyncio.to_thread(_cached_new_resume, cache_key, id)
+  if cached is not None:
+    print(f"💾 {_LANGUAGE_TITLES[language]} версия резюме {id} взята из кэша")
+    record_cache_hit(kind)
+    return cached
+  version = await _generate_language_version(prompt_factory(), language, id, timeout, kind)
+  if version:
+    await asyncio.to_thread(cache_set, cache_key, kind, version.replace(str(id), _RESUME_ID_PLACEHOLDER))
+  return version
+
+
+async def create_new_resume_split_async(text: str, id, timeout: float = LLM_TIMEOUT) -> dict | None:
+  """
+  Генерирует русскую и английскую версии резюме отдельными запросами
+  
+  Запросы выполняются параллельно (или английская версия переводится с русской,
+  если задан NEW_RESUME_EN_FROM_RU); каждая версия проверяется и повторяется отдельно,
+  поэтому сбой одной версии не портит другую.
+  
+  Returns:
+    Словарь {'russian': ..., 'english': ...} (неудавшаяся версия — пустая строка)
+    или None, если не получилось ни одной версии
+  """
+  def prompt_for(language):
+    output_format = _NEW_RESUME_SINGLE_FORMAT.format(language_name=_LANGUAGE_NAMES[language])
+    return lambda: _build_new_resume_prompt(text, id, output_format=output_format)
+  
+  if NEW_RESUME_EN_FROM_RU:
+    russian = await _cached_language_version('create_new_resume_ru', text, prompt_for("russian"), "russian", id, timeout)
+    english = None
+    if russian:
+      english = await _cached_language_version(
+        'create_new_resume_en_from_ru', text, lambda: _build_translation_prompt(russian), "english", id, timeout
+      )
+  else:
+    russian, english = await asyncio.gather(
+      _cached_language_version('create_new_resume_ru', text, prompt_for("russian"), "russian", id, timeout),
+      _cached_language_version('create_new_resume_en', text, prompt_for("english"), "english", id, timeout),
+    )
+  
+  if not russian and not english:
+    return None
+  return {"russian": russian or "", "english": english or ""}
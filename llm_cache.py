@@ -0,0 +1,133 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Путь к файлу кэша ответов модели
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', 'llm_cache.sqlite3')
+# Максимальное количество записей; при превышении удаляются давно не использованные
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '2000'))
+# Кэш можно отключить, например при отладке промптов
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') not in ('0', 'false', 'False', '')
+
+
+def normalize_text(text: str) -> str:
+    """Нормализует текст резюме: одинаковые по содержанию файлы дают одинаковый ключ"""
+    return re.sub(r'\s+', ' ', text or '').strip().lower()
+
+
+def make_cache_key(kind: str, text: str, prompt_version: str, model_name: str, extra: str = "") -> str:
+    """
+    Формирует ключ кэша
+
+    Args:
+        kind: Тип запроса (например, 'process_resume')
+        text: Текст резюме
+        prompt_version: Версия промпта; при её изменении старые записи перестают использоваться
+        model_name: Название модели
+        extra: Дополнительные данные, влияющие на ответ (например, имя файла)
+
+    Returns:
+        SHA-256 хэш в виде hex-строки
+    """
+    payload = "\x1f".join([kind, prompt_version, model_name, extra, normalize_text(text)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """Постоянный кэш ответов модели в SQLite с вытеснением давно не использованных записей"""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, kind TEXT, value TEXT, "
+                "created_at REAL, last_access REAL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache(last_access)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """Возвращает сохранённый ответ или None"""
+        with self._lock:
+            try:
+                conn = self._connect()
+                row = conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+                self.hits += 1
+                return json.loads(row[0])
+            except (sqlite3.Error, json.JSONDecodeError) as e:
+                print(f"❌ Ошибка чтения кэша ответов модели: {e}")
+                self.misses += 1
+                return None
+
+    def set(self, key: str, kind: str, value: Any):
+        """Сохраняет ответ и при необходимости вытесняет старые записи"""
+        with self._lock:
+            try:
+                conn = self._connect()
+                now = time.time()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, kind, value, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, kind, json.dumps(value, ensure_ascii=False), now, now)
+                )
+                count = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+                if count > self.max_entries:
+                    conn.execute(
+                        "DELETE FROM llm_cache WHERE key IN ("
+                        "SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                        (count - self.max_entries,)
+                    )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"❌ Ошибка записи в кэш ответов модели: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счётчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+llm_cache = LLMCache()
+
+
+def cache_get(key: str) -> Optional[Any]:
+    if not LLM_CACHE_ENABLED:
+        return None
+    return llm_cache.get(key)
+
+
+def cache_set(key: str, kind: str, value: Any):
+    if LLM_CACHE_ENABLED and value is not None:
+        llm_cache.set(key, kind, value)
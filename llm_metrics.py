@@ -0,0 +1,215 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Файл с метриками в текстовом формате Prometheus (для node_exporter textfile collector)
+LLM_METRICS_FILE = os.getenv('LLM_METRICS_FILE', 'llm_metrics.prom')
+# Не чаще чем раз в столько секунд перезаписывать файл метрик
+LLM_METRICS_WRITE_INTERVAL = float(os.getenv('LLM_METRICS_WRITE_INTERVAL', '10'))
+# Цены за 1 млн токенов (USD) для оценки стоимости
+LLM_PRICE_INPUT_PER_M = float(os.getenv('LLM_PRICE_INPUT_PER_M', '0.30'))
+LLM_PRICE_OUTPUT_PER_M = float(os.getenv('LLM_PRICE_OUTPUT_PER_M', '2.50'))
+
+_COUNTER_FIELDS = (
+    'requests', 'errors', 'timeouts', 'retries', 'cache_hits',
+    'prompt_tokens', 'response_tokens', 'cached_tokens', 'latency_seconds', 'saved_tokens',
+)
+
+
+class LLMStats:
+    """Счётчики запросов к модели, сгруппированные по операциям"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operations: Dict[str, Dict[str, float]] = {}
+
+    def _bucket(self, operation: str) -> Dict[str, float]:
+        bucket = self.operations.get(operation)
+        if bucket is None:
+            bucket = dict.fromkeys(_COUNTER_FIELDS, 0)
+            self.operations[operation] = bucket
+        return bucket
+
+    def add(self, operation: str, **values):
+        with self._lock:
+            bucket = self._bucket(operation)
+            for field, value in values.items():
+                bucket[field] += value
+
+    def totals(self) -> Dict[str, float]:
+        with self._lock:
+            totals = dict.fromkeys(_COUNTER_FIELDS, 0)
+            for bucket in self.operations.values():
+                for field in _COUNTER_FIELDS:
+                    totals[field] += bucket[field]
+            return totals
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {operation: dict(bucket) for operation, bucket in self.operations.items()}
+
+    def format_summary(self) -> str:
+        """Формирует краткую сводку для сообщения рекрутеру"""
+        totals = self.totals()
+        if not totals['requests'] and not totals['cache_hits']:
+            return "🤖 Запросов к модели не было"
+        average_latency = totals['latency_seconds'] / totals['requests'] if totals['requests'] else 0.0
+        lines = [
+            f"🤖 Модель: {int(totals['requests'])} запросов, "
+            f"токены {int(totals['prompt_tokens'])} → {int(totals['response_tokens'])}, "
+            f"≈ ${estimate_cost(totals):.4f}",
+            f"⏱ Среднее время ответа {average_latency:.1f} с; "
+            f"из кэша {int(totals['cache_hits'])}, повторов {int(totals['retries'])}, "
+            f"таймаутов {int(totals['timeouts'])}, ошибок {int(totals['errors'])}",
+        ]
+        if totals['saved_tokens']:
+            lines.append(f"✂️ Сжатие текста резюме: ≈ −{int(totals['saved_tokens'])} токенов в каждом промпте с текстом резюме")
+        return "\n".join(lines)
+
+
+def estimate_cost(counters: Dict[str, float]) -> float:
+    """Оценивает стоимость запросов в USD по числу токенов"""
+    return (
+        counters['prompt_tokens'] * LLM_PRICE_INPUT_PER_M
+        + counters['response_tokens'] * LLM_PRICE_OUTPUT_PER_M
+    ) / 1_000_000
+
+
+# Общие метрики процесса и метрики текущей пачки (пачка задаётся через batch())
+llm_stats = LLMStats()
+_current_batch: contextvars.ContextVar[Optional[LLMStats]] = contextvars.ContextVar('llm_batch_stats', default=None)
+_write_lock = threading.Lock()
+# Файл метрик пишет фоновый поток, а не цикл событий бота
+_flush_requested = threading.Event()
+_flush_thread: Optional[threading.Thread] = None
+_dirty = False
+
+
+def _add(operation: str, **values):
+    llm_stats.add(operation, **values)
+    batch_stats = _current_batch.get()
+    if batch_stats is not None:
+        batch_stats.add(operation, **values)
+    _mark_dirty()
+
+
+def _usage_value(usage: Any, name: str) -> int:
+    if usage is None:
+        return 0
+    return int(getattr(usage, name, 0) or 0)
+
+
+def record_call(operation: str, started_at: float, response: Any = None, status: str = 'ok'):
+    """
+    Записывает один запрос к модели
+
+    Args:
+        operation: Название операции (process_resume, create_new_resume и т.д.)
+        started_at: Время начала запроса (time.monotonic())
+        response: Ответ модели; токены берутся из usage_metadata
+        status: 'ok', 'timeout' или 'error'
+    """
+    usage = getattr(response, 'usage_metadata', None) if response is not None else None
+    _add(
+        operation,
+        requests=1,
+        errors=1 if status == 'error' else 0,
+        timeouts=1 if status == 'timeout' else 0,
+        prompt_tokens=_usage_value(usage, 'prompt_token_count'),
+        response_tokens=_usage_value(usage, 'candidates_token_count'),
+        cached_tokens=_usage_value(usage, 'cached_content_token_count'),
+        latency_seconds=time.monotonic() - started_at,
+    )
+
+
+def record_cache_hit(operation: str):
+    _add(operation, cache_hits=1)
+
+
+def record_retry(operation: str):
+    _add(operation, retries=1)
+
+
+def record_compaction(saved_tokens: int):
+    """Записывает, сколько токенов сэкономило сжатие текста резюме"""
+    _add('compaction', saved_tokens=saved_tokens)
+
+
+@contextmanager
+def batch():
+    """Собирает метрики всех запросов к модели внутри блока (включая созданные в нём задачи)"""
+    batch_stats = LLMStats()
+    token = _current_batch.set(batch_stats)
+    try:
+        yield batch_stats
+    finally:
+        _current_batch.reset(token)
+        request_flush()
+
+
+def render_prometheus() -> str:
+    """Формирует метрики в текстовом формате Prometheus"""
+    snapshot = llm_stats.snapshot()
+    lines = []
+    for field in _COUNTER_FIELDS:
+        metric = f"resume_bot_llm_{field}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for operation, bucket in sorted(snapshot.items()):
+            lines.append(f'{metric}{{operation="{operation}"}} {bucket[field]:g}')
+    lines.append("# TYPE resume_bot_llm_estimated_cost_usd_total counter")
+    for operation, bucket in sorted(snapshot.items()):
+        lines.append(f'resume_bot_llm_estimated_cost_usd_total{{operation="{operation}"}} {estimate_cost(bucket):.6f}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_file(path: str = LLM_METRICS_FILE):
+    """Атомарно перезаписывает файл метрик (блокирующий вызов; из цикла событий используйте request_flush)"""
+    if not path:
+        return
+    with _write_lock:
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(render_prometheus())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"❌ Не удалось записать метрики модели: {e}")
+
+
+def _flush_loop():
+    global _dirty
+    while True:
+        # Пишем не чаще раза в LLM_METRICS_WRITE_INTERVAL, а по request_flush — сразу
+        _flush_requested.wait(LLM_METRICS_WRITE_INTERVAL)
+        _flush_requested.clear()
+        if _dirty:
+            _dirty = False
+            write_prometheus_file()
+
+
+def _ensure_flush_thread():
+    global _flush_thread
+    if _flush_thread is not None or not LLM_METRICS_FILE:
+        return
+    with _write_lock:
+        if _flush_thread is None:
+            _flush_thread = threading.Thread(target=_flush_loop, name='llm-metrics-flush', daemon=True)
+            _flush_thread.start()
+
+
+def _mark_dirty():
+    global _dirty
+    _dirty = True
+    _ensure_flush_thread()
+
+
+def request_flush():
+    """Просит фоновый поток записать файл метрик, не дожидаясь интервала"""
+    _mark_dirty()
+    _flush_requested.set()
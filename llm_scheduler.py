@@ -0,0 +1,238 @@
+import os
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+from google.api_core import exceptions as google_exceptions
+from dotenv import load_dotenv
+from llm_metrics import record_retry
+
+load_dotenv()
+
+# Квоты Gemini API: запросов и токенов в минуту (0 — без ограничения)
+LLM_RPM_LIMIT = int(os.getenv('LLM_RPM_LIMIT', '60'))
+LLM_TPM_LIMIT = int(os.getenv('LLM_TPM_LIMIT', '1000000'))
+# Максимальное количество одновременных запросов к модели
+LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', '2'))
+# Повторы при перегрузке модели (HTTP 429 и 503)
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '4'))
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '2'))
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', '60'))
+# Сколько токенов ответа закладывать в оценку запроса до получения usage_metadata
+LLM_ESTIMATED_OUTPUT_TOKENS = int(os.getenv('LLM_ESTIMATED_OUTPUT_TOKENS', '2000'))
+
+# Полосы приоритета: меньшее значение обслуживается раньше
+INTERACTIVE = 0
+BATCH = 1
+
+# Как часто ожидающий запрос проверяет, не подошла ли его очередь
+_POLL_INTERVAL = 0.1
+
+_current_priority: contextvars.ContextVar[int] = contextvars.ContextVar('llm_priority', default=INTERACTIVE)
+
+
+class TokenBucket:
+    """Ведро токенов: rate_per_minute единиц в минуту, запас не больше минутной квоты"""
+
+    def __init__(self, rate_per_minute: int):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = float(rate_per_minute)
+        self.level = float(rate_per_minute)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate_per_minute / 60)
+        self.updated_at = now
+
+    def delay_for(self, amount: float, now: float) -> float:
+        """Сколько секунд ждать, пока в ведре наберётся amount единиц"""
+        if self.rate_per_minute <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.rate_per_minute
+
+    def consume(self, amount: float):
+        # Уровень может уйти в минус, если запрос оказался дороже оценки
+        if self.rate_per_minute > 0:
+            self.level -= amount
+
+
+def estimate_tokens(contents: Any) -> int:
+    """Грубая оценка числа токенов запроса вместе с ответом (около 4 символов на токен)"""
+    if isinstance(contents, (list, tuple)):
+        characters = sum(len(str(part)) for part in contents)
+    else:
+        characters = len(str(contents))
+    return characters // 4 + LLM_ESTIMATED_OUTPUT_TOKENS
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Превышение квоты (429) и временная недоступность модели (503) стоит повторить"""
+    return isinstance(error, (google_exceptions.TooManyRequests, google_exceptions.ServiceUnavailable))
+
+
+def _used_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return None
+    return int(getattr(usage, 'prompt_token_count', 0) or 0) + int(getattr(usage, 'candidates_token_count', 0) or 0)
+
+
+class LLMScheduler:
+    """
+    Общая очередь запросов к модели
+
+    Запрос допускается, когда он первый в очереди по приоритету, есть свободный слот
+    и в вёдрах RPM и TPM хватает запаса. При 429 и 503 запрос повторяется
+    с экспоненциальной задержкой и случайным разбросом.
+    """
+
+    def __init__(self, rpm: int = LLM_RPM_LIMIT, tpm: int = LLM_TPM_LIMIT, concurrency: int = LLM_CONCURRENCY):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = max(1, concurrency)
+        self.active = 0
+        self._lock = threading.Lock()
+        self._waiting = []
+        self._sequence = itertools.count()
+
+    def _enqueue(self, priority: int) -> tuple:
+        ticket = (priority, next(self._sequence))
+        with self._lock:
+            heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _discard(self, ticket: tuple):
+        with self._lock:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+
+    def _try_admit(self, ticket: tuple, tokens: int) -> float:
+        """Допускает запрос (возвращает 0) или возвращает, сколько секунд подождать"""
+        with self._lock:
+            if self._waiting[0] != ticket or self.active >= self.concurrency:
+                return _POLL_INTERVAL
+            now = time.monotonic()
+            delay = max(self.requests.delay_for(1, now), self.tokens.delay_for(tokens, now))
+            if delay > 0:
+                return min(delay, _POLL_INTERVAL * 10)
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            heapq.heappop(self._waiting)
+            self.active += 1
+            return 0.0
+
+    def _release(self, estimated_tokens: int, response: Any = None):
+        with self._lock:
+            self.active -= 1
+            used = _used_tokens(response)
+            if used is not None:
+                # Поправляем ведро TPM на разницу между оценкой и фактическим расходом
+                self.tokens.consume(used - estimated_tokens)
+
+    async def _acquire_async(self, tokens: int, priority: int):
+        ticket = self._enqueue(priority)
+        try:
+            while True:
+                delay = self._try_admit(ticket, tokens)
+                if not delay:
+                    return
+                await asyncio.sleep(delay)
+        except BaseException:
+            self._discard(ticket)
+            raise
+
+    def _acquire_sync(self, tokens: int, priority: int):
+        ticket = self._enqueue(priority)
+        try:
+            while True:
+                delay = self._try_admit(ticket, tokens)
+                if not delay:
+                    return
+                time.sleep(delay)
+        except BaseException:
+            self._discard(ticket)
+            raise
+
+    async def run(self, call: Callable, estimated_tokens: int, operation: str,
+                  priority: Optional[int] = None, can_retry: Optional[Callable[[], bool]] = None):
+        """
+        Выполняет асинхронный запрос к модели через очередь
+
+        Args:
+            call: Функция без аргументов, возвращающая корутину запроса; ответ должен содержать usage_metadata
+            estimated_tokens: Оценка токенов запроса (см. estimate_tokens)
+            operation: Название операции для логов и метрик
+            priority: Полоса приоритета; по умолчанию — заданная через priority_lane
+            can_retry: Дополнительная проверка, можно ли повторить запрос после ошибки
+
+        Returns:
+            Результат call
+        """
+        if priority is None:
+            priority = _current_priority.get()
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            await self._acquire_async(estimated_tokens, priority)
+            response = None
+            try:
+                response = await call()
+                return response
+            except Exception as e:
+                delay = self._next_retry_delay(e, attempt, operation, can_retry)
+                if delay is None:
+                    raise
+            finally:
+                self._release(estimated_tokens, response)
+            await asyncio.sleep(delay)
+
+    def run_sync(self, call: Callable, estimated_tokens: int, operation: str, priority: Optional[int] = None):
+        """Синхронный вариант run для вызовов из рабочих потоков"""
+        if priority is None:
+            priority = _current_priority.get()
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            self._acquire_sync(estimated_tokens, priority)
+            response = None
+            try:
+                response = call()
+                return response
+            except Exception as e:
+                delay = self._next_retry_delay(e, attempt, operation)
+                if delay is None:
+                    raise
+            finally:
+                self._release(estimated_tokens, response)
+            time.sleep(delay)
+
+    def _next_retry_delay(self, error: Exception, attempt: int, operation: str,
+                          can_retry: Optional[Callable[[], bool]] = None) -> Optional[float]:
+        """Возвращает задержку перед повтором или None, если запрос повторять не нужно"""
+        if not is_retryable_error(error) or attempt == LLM_MAX_RETRIES:
+            return None
+        if can_retry is not None and not can_retry():
+            return None
+        delay = min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * (2 ** attempt)) + random.uniform(0, 1)
+        record_retry(operation)
+        print(f"⚠️ Модель перегружена ({operation}), повтор через {delay:.1f} с (попытка {attempt + 1}/{LLM_MAX_RETRIES})")
+        return delay
+
+
+llm_scheduler = LLMScheduler()
+
+
+@contextmanager
+def priority_lane(priority: int):
+    """Задаёт полосу приоритета для всех запросов к модели внутри блока (включая созданные в нём задачи)"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
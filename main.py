@@ -1,13 +1,10 @@
-from aiogram import Bot, Dispatcher, types
+from aiogram import Bot, Dispatcher, Router, types
 from aiogram.filters import CommandStart
 from dotenv import load_dotenv
 import os
 from kb import *
-from scan_handler import scan_router
-from add_info_handler import add_info_router
 import asyncio
-from teleton_client import client
-from google_sheet import update_currency_sheet
+from extraction_pool import start_extraction_pool
 
 load_dotenv()
 token = os.getenv('BOT_TOKEN')
@@ -15,18 +12,10 @@ PHONE_NUMBER = os.getenv('PHONE_NUMBER')
 ADMIN_ID = os.getenv('ADMIN_ID')
 
 
-bot = Bot(token=token)
-dp = Dispatcher()
+start_router = Router()
 
 
-
-
-
-dp.include_router(scan_router)
-dp.include_router(add_info_router)
-
-
-@dp.message(CommandStart())
+@start_router.message(CommandStart())
 async def start(message: types.Message):
     if not message.from_user.username:
         await message.reply("Пожалуйста, укажите ваш username в настройках Telegram, чтобы я мог вас идентифицировать.")
@@ -35,10 +24,27 @@ async def start(message: types.Message):
 
 
 async def main():
+    # Обработчики импортируются здесь, а не на уровне модуля: процессы разбора файлов (forkserver)
+    # заново импортируют main.py, и в них не должны создаваться Bot, GoogleDriveManager и сессия Telethon
+    from scan_handler import scan_router
+    from add_info_handler import add_info_router
+    from teleton_client import client
+    from google_sheet import update_currency_sheet, warm_candidate_index
+    from staging import run_staging_sweeper
+
+    bot = Bot(token=token)
+    dp = Dispatcher()
+    dp.include_router(start_router)
+    dp.include_router(scan_router)
+    dp.include_router(add_info_router)
+
     #await client.start(phone=PHONE_NUMBER)
     asyncio.create_task(update_currency_sheet(bot))
+    asyncio.create_task(run_staging_sweeper())
+    asyncio.create_task(asyncio.to_thread(warm_candidate_index))
     await dp.start_polling(bot)
 
 if __name__ == "__main__":
-    
+    # Процессы разбора файлов создаются до запуска потоков бота
+    start_extraction_pool()
     asyncio.run(main())
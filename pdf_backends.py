@@ -0,0 +1,109 @@
+import io
+import os
+from typing import Dict, Iterator, Optional, Union
+import PyPDF2
+from dotenv import load_dotenv
+
+# Дополнительные движки разбора PDF не обязательны: pip install pypdfium2 / pdfminer.six
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+try:
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LAParams, LTTextContainer
+except ImportError:
+    extract_pages = None
+
+load_dotenv()
+
+# Движок разбора PDF: pypdf2, pypdfium2 или pdfminer
+PDF_BACKEND = os.getenv('PDF_BACKEND', 'pypdf2')
+
+
+def open_binary(source: Union[str, bytes]):
+    """Открывает файл по пути или оборачивает содержимое файла в BytesIO"""
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    return open(source, "rb")
+
+
+class PyPDF2Backend:
+    """PyPDF2: без дополнительных зависимостей, но медленный и путает колонки"""
+
+    name = 'pypdf2'
+    available = True
+
+    def iter_page_texts(self, source: Union[str, bytes], max_pages: int = 0, info: Optional[dict] = None) -> Iterator[str]:
+        with open_binary(source) as f:
+            reader = PyPDF2.PdfReader(f)
+            if info is not None:
+                info['page_count'] = len(reader.pages)
+            pages = reader.pages[:max_pages] if max_pages else reader.pages
+            for page in pages:
+                # Для страниц без текстового слоя (сканы) extract_text может вернуть None
+                yield page.extract_text() or ""
+
+
+class PdfiumBackend:
+    """pypdfium2 (движок PDFium из Chrome): самый быстрый"""
+
+    name = 'pypdfium2'
+    available = pypdfium2 is not None
+
+    def iter_page_texts(self, source: Union[str, bytes], max_pages: int = 0, info: Optional[dict] = None) -> Iterator[str]:
+        # PdfDocument принимает и путь, и содержимое файла
+        pdf = pypdfium2.PdfDocument(source)
+        try:
+            if info is not None:
+                info['page_count'] = len(pdf)
+            count = min(len(pdf), max_pages) if max_pages else len(pdf)
+            for index in range(count):
+                page = pdf[index]
+                text_page = page.get_textpage()
+                try:
+                    text = text_page.get_text_range()
+                finally:
+                    text_page.close()
+                    page.close()
+                yield text.replace('\r\n', '\n').replace('\r', '\n')
+        finally:
+            pdf.close()
+
+
+class PdfminerBackend:
+    """pdfminer.six с анализом раскладки: медленнее, но правильно разделяет колонки"""
+
+    name = 'pdfminer'
+    available = extract_pages is not None
+
+    def iter_page_texts(self, source: Union[str, bytes], max_pages: int = 0, info: Optional[dict] = None) -> Iterator[str]:
+        # Общее число страниц pdfminer узнаёт только обходом всех страниц, поэтому в info его нет
+        with open_binary(source) as f:
+            for page_layout in extract_pages(f, maxpages=max_pages or 0, laparams=LAParams()):
+                yield "".join(
+                    element.get_text() for element in page_layout if isinstance(element, LTTextContainer)
+                )
+
+
+PDF_BACKENDS: Dict[str, object] = {
+    backend.name: backend for backend in (PyPDF2Backend(), PdfiumBackend(), PdfminerBackend())
+}
+_reported_unavailable = set()
+
+
+def get_pdf_backend(name: Optional[str] = None):
+    """
+    Возвращает движок разбора PDF по названию (по умолчанию — из PDF_BACKEND)
+
+    Если движок не установлен или неизвестен, используется PyPDF2
+    """
+    name = (name or PDF_BACKEND).lower()
+    backend = PDF_BACKENDS.get(name)
+    if backend is None or not backend.available:
+        if name not in _reported_unavailable:
+            _reported_unavailable.add(name)
+            print(f"⚠️ Движок PDF '{name}' недоступен, используется pypdf2")
+        return PDF_BACKENDS['pypdf2']
+    return backend
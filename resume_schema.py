@@ -0,0 +1,179 @@
+import os
+import re
+from typing import Any, Dict, List, Optional
+import maps_for_sheet
+
+# Поля-словари вида {"Значение": true}: в схеме ответа это массивы канонических значений
+ENUM_LIST_FIELDS = {
+    'grade': 'GRADE_MAP',
+    'specialization': 'ROLES_MAP',
+    'programmingLanguages': 'PROGRAM_LANG_MAP',
+    'frameworks': 'FRAMEWORKS_MAP',
+    'technologies': 'TECH_MAP',
+    'portfolio': 'PORTFOLIO_MAP',
+    'projectIndustries': 'PRODUCT_INDUSTRIES_MAP',
+    'availability': 'AVAILABILITY_MAP',
+    'workTime': 'WORK_TIME_MAP',
+    'workForm': 'WORK_FORM_MAP',
+}
+
+BILINGUAL_FIELDS = ['firstName', 'lastName', 'patronymic', 'location', 'city']
+STRING_FIELDS = ['dateOfBirth', 'totalExperience', 'specialExperience', 'dateOfExit', 'rateRub']
+
+# Ключи контактов, которые читает основной лист
+CONTACT_KEYS = [
+    'phone', 'email', 'linkedin', 'telegram', 'skype', 'github', 'gitlab', 'whatsapp',
+    'viber', 'discord', 'slack', 'microsoftTeams', 'zoom', 'googleMeet', 'facebook',
+    'instagram', 'twitter', 'vk', 'tiktok', 'reddit', 'stackoverflow', 'habrCareer',
+]
+
+SALARY_CURRENCIES = ['RUB', 'USD', 'EUR', 'BYN']
+
+# Слишком длинные перечисления API отклоняет как слишком сложную схему;
+# для таких полей в схеме остаются строки, а значения проверяет validate_resume_data
+SCHEMA_ENUM_LIMIT = int(os.getenv('SCHEMA_ENUM_LIMIT', '100'))
+
+_DATE_RE = re.compile(r'^\d{2}\.\d{2}\.\d{4}$')
+
+
+def canonical_values(field: str) -> List[str]:
+    """Возвращает канонические значения поля из maps_for_sheet без повторов"""
+    values = getattr(maps_for_sheet, ENUM_LIST_FIELDS[field]).values()
+    return list(dict.fromkeys(values))
+
+
+def _nullable_string() -> Dict[str, Any]:
+    return {'type': 'STRING', 'nullable': True}
+
+
+def _enum_list(values: List[str]) -> Dict[str, Any]:
+    items = {'type': 'STRING'}
+    if len(values) <= SCHEMA_ENUM_LIMIT:
+        items['enum'] = values
+    return {'type': 'ARRAY', 'items': items}
+
+
+def _field_schemas() -> Dict[str, Dict[str, Any]]:
+    fields = {}
+    for field in BILINGUAL_FIELDS:
+        fields[field] = {
+            'type': 'OBJECT',
+            'nullable': True,
+            'properties': {'ru': _nullable_string(), 'en': _nullable_string()},
+        }
+    for field in STRING_FIELDS:
+        fields[field] = _nullable_string()
+    for field in ENUM_LIST_FIELDS:
+        fields[field] = _enum_list(canonical_values(field))
+    language_values = list(dict.fromkeys(maps_for_sheet.LANG_MAP.values()))
+    fields['languages'] = {
+        'type': 'ARRAY',
+        'items': {
+            'type': 'OBJECT',
+            'properties': {
+                'language': {'type': 'STRING', 'enum': language_values},
+                'level': _nullable_string(),
+            },
+            'required': ['language'],
+        },
+    }
+    fields['contacts'] = {
+        'type': 'OBJECT',
+        'nullable': True,
+        'properties': {key: _nullable_string() for key in CONTACT_KEYS},
+    }
+    fields['salaryExpectations'] = {
+        'type': 'OBJECT',
+        'nullable': True,
+        'properties': {
+            'amount': _nullable_string(),
+            'currency': {'type': 'STRING', 'enum': SALARY_CURRENCIES, 'nullable': True},
+        },
+    }
+    return fields
+
+
+def build_response_schema(fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Строит JSON-схему ответа process_resume по мапам из maps_for_sheet
+
+    Args:
+        fields: Список полей для частичной схемы (для повторного запроса); None — все поля
+
+    Returns:
+        Схема в формате response_schema Gemini
+    """
+    all_fields = _field_schemas()
+    if fields is not None:
+        all_fields = {name: schema for name, schema in all_fields.items() if name in fields}
+    return {'type': 'OBJECT', 'properties': all_fields}
+
+
+def to_resume_dict(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Приводит ответ по схеме к формату, с которым работает остальной код:
+    массивы значений становятся словарями {"Значение": true}, языки — {"English": "B2"}
+    (язык без уровня — {"German": None}, как и в ответе без схемы)
+    """
+    data = dict(raw)
+    for field in ENUM_LIST_FIELDS:
+        value = data.get(field)
+        if isinstance(value, list):
+            data[field] = {item: True for item in value if isinstance(item, str)}
+    languages = data.get('languages')
+    if isinstance(languages, list):
+        data['languages'] = {
+            item['language']: item.get('level') or None
+            for item in languages
+            if isinstance(item, dict) and item.get('language')
+        }
+    contacts = data.get('contacts')
+    if isinstance(contacts, dict):
+        data['contacts'] = {key: value for key, value in contacts.items() if value}
+    return data
+
+
+def validate_resume_data(data: Dict[str, Any]) -> List[str]:
+    """
+    Проверяет данные резюме и убирает значения не из канонических списков
+
+    Returns:
+        Список полей, значения которых некорректны и их стоит запросить у модели повторно
+    """
+    invalid_fields = []
+
+    for field in ENUM_LIST_FIELDS:
+        value = data.get(field)
+        if value is None:
+            continue
+        if not isinstance(value, dict):
+            invalid_fields.append(field)
+            continue
+        allowed = set(canonical_values(field))
+        unknown = [key for key in value if key not in allowed]
+        if unknown:
+            print(f"⚠️ Поле {field}: отброшены значения не из списка: {', '.join(unknown[:10])}")
+            data[field] = {key: flag for key, flag in value.items() if key in allowed}
+
+    for field in BILINGUAL_FIELDS:
+        value = data.get(field)
+        if value is not None and not isinstance(value, dict):
+            invalid_fields.append(field)
+
+    date_of_birth = data.get('dateOfBirth')
+    if date_of_birth and not _DATE_RE.match(str(date_of_birth).strip()):
+        invalid_fields.append('dateOfBirth')
+
+    salary = data.get('salaryExpectations')
+    if salary is not None:
+        if not isinstance(salary, dict):
+            invalid_fields.append('salaryExpectations')
+        else:
+            amount = salary.get('amount')
+            currency = salary.get('currency')
+            amount_is_number = amount is None or str(amount).strip().isdigit()
+            currency_is_known = currency is None or currency in SALARY_CURRENCIES
+            if not amount_is_number or not currency_is_known:
+                invalid_fields.append('salaryExpectations')
+
+    return invalid_fields
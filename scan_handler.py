@@ -5,16 +5,39 @@ import os
 from dotenv import load_dotenv
 from aiogram import types
 from aiogram.fsm.context import FSMContext
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+import io
+import time
+import csv
 import json
 import asyncio
+import zipfile
+import re
+import threading
+import mimetypes
+from typing import Dict, Any, Union
 from funcs import *
 from kb import *
-from gpt import process_resume, create_new_resume, fix_color_formatting
+from gpt import (
+    process_resume_async, create_new_resume_async, create_new_resume_stream_async,
+    create_new_resume_split_async,
+    fix_color_formatting, NEW_RESUME_MODE
+)
 from google_sheet import *
 from teleton_client import search_id 
 from google_disk import GoogleDriveManager
 from maps_for_sheet import *
-from docx_generator import create_and_upload_docx_to_drive, save_docx_locally_and_upload
+from docx_generator import (
+    create_and_upload_docx_to_drive, save_docx_locally_and_upload,
+    upload_docx_bytes_to_drive, StreamingDocxBuilder
+)
+from staging import (
+    staged_file_path, fits_in_memory, is_staged_in_memory, stage_bytes, release_memory_upload, take_staged_files,
+    stage_zip_archive
+)
+import llm_metrics
+from text_compaction import compact_resume_text
+from llm_scheduler import priority_lane, INTERACTIVE, BATCH
 
 load_dotenv()
 bot = Bot(token=os.getenv('BOT_TOKEN'))
@@ -22,6 +45,86 @@ scan_router = Router()
 gm = GoogleDriveManager(credentials_path="oauth.json")
 ADMIN_ID = int(os.getenv('ADMIN_ID'))
 
+# Ограничения параллельной обработки пачки резюме
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '3'))
+DRIVE_CONCURRENCY = int(os.getenv('DRIVE_CONCURRENCY', '2'))
+SHEETS_CONCURRENCY = int(os.getenv('SHEETS_CONCURRENCY', '1'))
+
+# Форматы резюме, которые умеет разбирать бот
+RESUME_EXTENSIONS = ('.pdf', '.docx', '.rtf', '.txt')
+# При большем количестве файлов итог пачки отправляется таблицей, а не списком в сообщении
+BATCH_SUMMARY_INLINE_LIMIT = int(os.getenv('BATCH_SUMMARY_INLINE_LIMIT', '20'))
+# Как часто (в секундах) обновлять сообщение с прогрессом большой пачки
+BATCH_PROGRESS_INTERVAL = float(os.getenv('BATCH_PROGRESS_INTERVAL', '5'))
+
+# Отдельный семафор на каждый внешний сервис, чтобы не упираться в квоты
+# (запросы к модели ограничивает общая очередь llm_scheduler)
+drive_semaphore = asyncio.Semaphore(DRIVE_CONCURRENCY)
+sheets_semaphore = asyncio.Semaphore(SHEETS_CONCURRENCY)
+
+_drive_local = threading.local()
+
+
+def get_drive_manager() -> GoogleDriveManager:
+    """Возвращает GoogleDriveManager текущего потока (клиент googleapiclient не потокобезопасен)"""
+    manager = getattr(_drive_local, 'manager', None)
+    if manager is None:
+        manager = GoogleDriveManager(credentials_path="oauth.json")
+        _drive_local.manager = manager
+    return manager
+
+
+async def run_stage(semaphore: asyncio.Semaphore, func, *args, **kwargs):
+    """Выполняет блокирующий вызов в отдельном потоке с ограничением параллелизма этапа"""
+    async with semaphore:
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+
+def clean_resume_text(text: str) -> str:
+    """Убирает markdown-разметку и проблемные символы из сгенерированного резюме"""
+    # Более аккуратная очистка markdown без повреждения кириллицы
+    text = re.sub(r'\*{1,2}([^*]+)\*{1,2}', r'\1', text)
+    text = re.sub(r'#{1,6}\s*', '', text)
+    
+    # Исправляем цветовые значения и убираем проблемные символы
+    text = fix_color_formatting(text)
+    return text.replace('■', '').replace('\ufffd', '').replace('\u25a0', '')
+
+
+class StreamedResumeDocuments:
+    """Собирает Word документы обеих версий резюме по мере потоковой генерации"""
+    
+    LANGUAGE_NAMES = {'russian': 'русская', 'english': 'английская'}
+    
+    def __init__(self):
+        self.builders = {'russian': StreamingDocxBuilder(), 'english': StreamingDocxBuilder()}
+        self.ready = {'russian': asyncio.Event(), 'english': asyncio.Event()}
+    
+    def on_paragraph(self, language: str, line: str):
+        self.builders[language].add_line(clean_resume_text(line))
+    
+    def on_section_done(self, language: str):
+        self.ready[language].set()
+    
+    async def wait_section(self, language: str, generation_task: asyncio.Task) -> bool:
+        """Ждёт завершения раздела или всей генерации; возвращает True, если раздел получен"""
+        waiter = asyncio.create_task(self.ready[language].wait())
+        await asyncio.wait({waiter, generation_task}, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        return self.ready[language].is_set() and self.builders[language].line_count > 0
+    
+    async def upload(self, language: str, generation_task: asyncio.Task, message: types.Message,
+                     source_file_name: str, docx_file_name: str, folder_name: str, title: str) -> Dict[str, Any]:
+        """Загружает версию резюме в Google Drive сразу после её генерации, не дожидаясь второй"""
+        if not await self.wait_section(language, generation_task):
+            return {'success': False, 'error': 'версия резюме не сгенерирована'}
+        await message.answer(f"📝 {source_file_name}: {self.LANGUAGE_NAMES[language]} версия резюме готова, загружаю...")
+        docx_bytes = self.builders[language].to_bytes(title)
+        if not docx_bytes:
+            return {'success': False, 'error': 'Не удалось создать Word документ'}
+        return await run_stage(drive_semaphore, upload_docx_bytes_to_drive, docx_bytes, docx_file_name, folder_name)
+
+
 class Scan(StatesGroup):
     waiting_for_resume = State()
     confirm_add_more = State()
@@ -35,7 +138,7 @@ class DeleteRecord(StatesGroup):
 async def send_welcome(callback: types.CallbackQuery, state: FSMContext):
     await callback.message.delete()
     #await callback.message.answer("Отправьте id вакансии в формате 🆔XX-xxxx или 🆔xxxx")
-    await callback.message.answer("Отправьте резюме в формате PDF/DOCX/RTF/TXT")
+    await callback.message.answer("Отправьте резюме в формате PDF/DOCX/RTF/TXT или ZIP-архив с резюме")
     await state.set_state(Scan.waiting_for_resume)
 
 
@@ -67,13 +170,24 @@ async def save_document(message: types.Message, state: FSMContext):
         await message.answer("Отправьте резюме в формате PDF/DOCX/RTF/TXT")
         return
 
-    file_info = await bot.get_file(document.file_id)
-    file_path = file_info.file_path
     file_name = document.file_name
+    if file_name and file_name.lower().endswith('.zip'):
+        await save_zip_archive(message, state)
+        return
 
-    os.makedirs("downloads", exist_ok=True)
-    local_file_path = os.path.join("downloads", file_name)
-    await bot.download_file(file_path, destination=local_file_path)
+    # У каждого чата своя папка загрузок, файл адресуется по file_unique_id
+    local_file_path = staged_file_path(message.chat.id, document.file_unique_id, file_name)
+    if fits_in_memory(document.file_size):
+        # Небольшие файлы не пишем на диск: содержимое уходит прямо в разбор и в Google Drive.
+        # Если общий бюджет памяти исчерпан, stage_bytes сохранит файл на диск
+        if not is_staged_in_memory(message.chat.id, document.file_unique_id) and not os.path.exists(local_file_path):
+            file_info = await bot.get_file(document.file_id)
+            buffer = await bot.download_file(file_info.file_path)
+            stage_bytes(message.chat.id, document.file_unique_id, file_name, buffer.getvalue())
+    else:
+        if not os.path.exists(local_file_path):
+            file_info = await bot.get_file(document.file_id)
+            await bot.download_file(file_info.file_path, destination=local_file_path)
 
     
 
@@ -93,6 +207,40 @@ async def save_document(message: types.Message, state: FSMContext):
         await state.set_state(Scan.confirm_add_more)
 
 
+async def save_zip_archive(message: types.Message, state: FSMContext):
+    """Раскладывает резюме из ZIP-архива в загрузки чата и сразу запускает обработку пачки"""
+    document = message.document
+    await message.answer("📦 Архив получен, извлекаю резюме...")
+
+    file_info = await bot.get_file(document.file_id)
+    archive_path = None
+    try:
+        if fits_in_memory(document.file_size):
+            source = (await bot.download_file(file_info.file_path)).getvalue()
+        else:
+            archive_path = staged_file_path(message.chat.id, document.file_unique_id, document.file_name)
+            await bot.download_file(file_info.file_path, destination=archive_path)
+            source = archive_path
+        staged, skipped = await asyncio.to_thread(
+            stage_zip_archive, message.chat.id, document.file_unique_id, source, RESUME_EXTENSIONS
+        )
+    except zipfile.BadZipFile:
+        await message.answer(f"❌ {document.file_name}: файл повреждён или не является ZIP-архивом")
+        return
+    finally:
+        # Сам архив больше не нужен: иначе он попал бы в пачку как обычный файл
+        if archive_path and os.path.exists(archive_path):
+            os.remove(archive_path)
+
+    if skipped:
+        await message.answer("⚠️ Пропущены файлы:\n" + "\n".join(skipped))
+    if not staged:
+        await message.answer("❌ В архиве нет резюме в формате PDF/DOCX/RTF/TXT")
+        return
+    await message.answer(f"📥 Из архива добавлено {staged} резюме.")
+    await start_processing(message, state, message.from_user.username, from_archive=True)
+
+
 # --- Кнопка «Да» ---
 @scan_router.callback_query(F.data == "add_more_yes")
 async def cb_add_more_yes(callback: types.CallbackQuery, state: FSMContext):
@@ -108,230 +256,478 @@ async def cb_add_more_no(callback: types.CallbackQuery, state: FSMContext):
     await start_processing(callback.message, state, callback.from_user.username)
 
 
-async def start_processing(message: types.Message, state: FSMContext, rekruter_username: str):
-    folder = "downloads"
-    os.makedirs(folder, exist_ok=True)
-    files = os.listdir(folder)
+async def start_processing(message: types.Message, state: FSMContext, rekruter_username: str,
+                           from_archive: bool = False):
+    items = take_staged_files(message.chat.id)
 
-    if not files:
+    if not items:
         await message.answer("⚠️ В папке нет файлов для обработки.")
         return
 
-    await state.set_state(Scan.processing_files)
-    await message.answer(f"🤖 Найдено {len(files)} резюме. Начинаю обработку...")
-    for file_name in files:
-        local_file_path = os.path.join(folder, file_name)
-        try:
-            await process_single_resume_from_disk(message, local_file_path, file_name, rekruter_username)
-        except Exception as e:
-            await message.answer(f"❌ Ошибка при обработке {file_name}: {str(e)}")
-        finally:
-            # Безопасное удаление файла
-            if os.path.exists(local_file_path):
-                os.remove(local_file_path)
-
-    await message.answer("✅ Обработка завершена.")
+    try:
+        await state.set_state(Scan.processing_files)
+        await message.answer(f"🤖 Найдено {len(items)} резюме. Начинаю обработку (до {BATCH_CONCURRENCY} одновременно)...")
+        # Одиночная загрузка идёт в интерактивной полосе и обгоняет большие пачки
+        lane = INTERACTIVE if len(items) == 1 else BATCH
+        # Для архива и большой пачки сообщения по каждому файлу заменяет одно обновляемое сообщение с прогрессом
+        quiet = from_archive or len(items) > BATCH_SUMMARY_INLINE_LIMIT
+        with llm_metrics.batch() as batch_llm_stats, priority_lane(lane):
+            # process_files_concurrently очищает items, чтобы содержимое файлов не жило до конца пачки
+            results = await process_files_concurrently(message, items, rekruter_username, quiet=quiet)
+    finally:
+        # Файлы, так и не переданные в обработку (например, Telegram не принял сообщение): память
+        # возвращается в общий бюджет, а файлы на диске остаются до следующего запуска или очистки
+        for source, _ in items:
+            if isinstance(source, bytes):
+                release_memory_upload(source)
+
+    if len(results) > BATCH_SUMMARY_INLINE_LIMIT:
+        # Список из десятков файлов не помещается в сообщение — отправляем итог одной таблицей
+        await send_safely(message.answer, format_batch_summary(results, include_files=False) + "\n\n" + batch_llm_stats.format_summary())
+        await send_safely(
+            message.answer_document,
+            types.BufferedInputFile(build_batch_results_csv(results), filename="results.csv"),
+            caption="📊 Результаты обработки по каждому файлу",
+        )
+    else:
+        await send_safely(message.answer, format_batch_summary(results) + "\n\n" + batch_llm_stats.format_summary())
     await state.set_state(Scan.waiting_for_resume)
 
 
+async def send_safely(send, *args, **kwargs):
+    """
+    Отправляет или редактирует сообщение Telegram, не прерывая обработку резюме
+    
+    При flood control (TelegramRetryAfter) ждёт указанное Telegram время и повторяет один раз,
+    остальные ошибки Telegram только записываются в лог.
+    
+    Returns:
+        Результат send или None, если сообщение не отправлено
+    """
+    for attempt in range(2):
+        try:
+            return await send(*args, **kwargs)
+        except TelegramRetryAfter as e:
+            if attempt:
+                break
+            print(f"⏳ Telegram ограничил частоту сообщений, жду {e.retry_after} с")
+            await asyncio.sleep(e.retry_after)
+        except TelegramAPIError as e:
+            print(f"⚠️ Не удалось отправить сообщение в Telegram: {e}")
+            return None
+    print("⚠️ Сообщение в Telegram не отправлено из-за ограничения частоты")
+    return None
+
+
+class BatchChat:
+    """
+    Сообщения в чат во время обработки пачки
+    
+    Передаётся в process_single_resume вместо message: answer не бросает ошибок Telegram,
+    а в тихом режиме (архив, большая пачка) сообщения по этапам только пишутся в лог,
+    и прогресс показывается одним сообщением, которое редактируется не чаще BATCH_PROGRESS_INTERVAL.
+    """
+
+    def __init__(self, message: types.Message, total: int, quiet: bool):
+        self._message = message
+        self.total = total
+        self.quiet = quiet
+        self.done = 0
+        self._status = None
+        self._status_updated_at = 0.0
+
+    def __getattr__(self, name):
+        # Остальные атрибуты (from_user, chat) берутся из исходного сообщения
+        return getattr(self._message, name)
+
+    async def answer(self, text: str, **kwargs):
+        if self.quiet:
+            print(f"💬 {text}")
+            return None
+        return await send_safely(self._message.answer, text, **kwargs)
+
+    async def file_started(self, index: int, file_name: str):
+        if not self.quiet:
+            await self.answer(f"⏳ [{index}/{self.total}] Обрабатываю {file_name}...")
+        elif self._status is None:
+            self._status = await send_safely(self._message.answer, self._progress_text())
+            self._status_updated_at = time.monotonic()
+
+    async def file_finished(self):
+        self.done += 1
+        if not self.quiet or self._status is None:
+            return
+        finished = self.done == self.total
+        if not finished and time.monotonic() - self._status_updated_at < BATCH_PROGRESS_INTERVAL:
+            return
+        self._status_updated_at = time.monotonic()
+        await send_safely(self._status.edit_text, self._progress_text())
+
+    def _progress_text(self) -> str:
+        return f"⏳ Обработано {self.done} из {self.total} резюме..."
+
+
+async def process_files_concurrently(message: types.Message, items: list, rekruter_username: str,
+                                     concurrency: int = BATCH_CONCURRENCY, quiet: bool = False) -> list:
+    """
+    Обрабатывает резюме пулом воркеров с ограничением параллелизма
+    
+    Args:
+        message: Сообщение, в чат которого отправляется прогресс
+        items: Список пар (путь к файлу или содержимое файла, имя файла); список очищается
+        rekruter_username: Username рекрутера
+        concurrency: Максимальное количество одновременно обрабатываемых файлов
+        quiet: Не отправлять сообщения по каждому файлу, а обновлять одно сообщение с прогрессом
+    
+    Returns:
+        Список результатов обработки в исходном порядке файлов
+    """
+    queue = asyncio.Queue()
+    for index, (source, file_name) in enumerate(items, start=1):
+        queue.put_nowait((index, source, file_name))
+
+    total = len(items)
+    # Файлы из памяти держит только очередь: содержимое освобождается сразу после обработки файла
+    items.clear()
+    results = []
+    chat = BatchChat(message, total, quiet)
+
+    async def worker():
+        while True:
+            try:
+                index, source, file_name = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            try:
+                await chat.file_started(index, file_name)
+                result = await process_single_resume(chat, source, file_name, rekruter_username)
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+                await chat.answer(f"❌ Ошибка при обработке {file_name}: {str(e)}")
+            finally:
+                # Безопасное удаление файла; память файла из памяти возвращается в общий бюджет
+                if isinstance(source, bytes):
+                    release_memory_upload(source)
+                elif os.path.exists(source):
+                    os.remove(source)
+                source = None
+
+            result.update({'index': index, 'file_name': file_name})
+            results.append(result)
+            await chat.file_finished()
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, total)))))
+    finally:
+        # Если обработку прервали, необработанные файлы всё равно освобождают память и диск
+        while not queue.empty():
+            _, source, _ = queue.get_nowait()
+            if isinstance(source, bytes):
+                release_memory_upload(source)
+            elif os.path.exists(source):
+                os.remove(source)
+    return sorted(results, key=lambda r: r['index'])
+
+
+def format_batch_summary(results: list, include_files: bool = True) -> str:
+    """Формирует итоговое сообщение по пачке резюме; include_files=False — только общие цифры"""
+    succeeded = [r for r in results if r.get('success')]
+    failed = [r for r in results if not r.get('success')]
+
+    lines = [f"✅ Обработка завершена: успешно {len(succeeded)} из {len(results)}."]
+    if not include_files:
+        return lines[0]
+    for r in succeeded:
+        lines.append(f"✅ {r['file_name']} — ID {r.get('resume_id')}")
+    for r in failed:
+        lines.append(f"❌ {r['file_name']} — {r.get('error') or 'неизвестная ошибка'}")
+    return "\n".join(lines)
+
+
+def build_batch_results_csv(results: list) -> bytes:
+    """Формирует таблицу результатов пачки в CSV (с BOM, чтобы Excel правильно открыл кириллицу)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(['№', 'Файл', 'Результат', 'ID кандидата', 'Ошибка'])
+    for r in results:
+        writer.writerow([
+            r['index'],
+            r['file_name'],
+            'успешно' if r.get('success') else 'ошибка',
+            r.get('resume_id') or '',
+            r.get('error') or '',
+        ])
+    return buffer.getvalue().encode('utf-8-sig')
+
+
+def upload_original_to_drive(source: Union[str, bytes], folder_name: str, file_name: str) -> Dict[str, Any]:
+    """Создаёт папку кандидата в Google Drive, загружает исходный файл (путь или содержимое) и открывает к нему доступ"""
+    drive_manager = get_drive_manager()
+    folder_id = drive_manager.get_or_create_folder(folder_name)
+    if not folder_id:
+        return {'success': False, 'folder_id': None, 'error': 'Не удалось создать папку в Google Drive'}
+
+    if isinstance(source, bytes):
+        upload_result = drive_manager.upload_file_from_bytes(
+            source,
+            file_name,
+            mime_type=mimetypes.guess_type(file_name)[0] or 'application/octet-stream',
+            folder_id=folder_id,
+        )
+    else:
+        upload_result = drive_manager.upload_file(
+            file_path=source,
+            folder_id=folder_id,
+            file_name=file_name,
+        )
+    upload_result['folder_id'] = folder_id
+
+    if upload_result.get('success'):
+        file_id = upload_result.get('file_id')
+        
+        # Делаем файл общедоступным
+        if file_id:
+            permissions_set = drive_manager.set_file_permissions(file_id, permission_type='reader', role='anyone')
+            if permissions_set:
+                print(f"✅ Файл успешно загружен в Google Drive и сделан общедоступным!\n🔗")
+            else:
+                print(f"✅ Файл загружен в Google Drive, но не удалось сделать его общедоступным\n🔗")
+        elif upload_result.get('web_link'):
+            print(f"✅ Файл успешно загружен в Google Drive!\n🔗")
+        else:
+            print(f"✅ Файл успешно загружен в Google Drive!")
+    return upload_result
+
+
+def delete_drive_folder(folder_id: str) -> bool:
+    """Удаляет папку кандидата из Google Drive вместе с загруженными в неё файлами"""
+    return get_drive_manager().delete_file(folder_id)
+
+
+async def discard_unfinished_resume(pending_tasks: list, folder_id: str, file_name: str):
+    """Отменяет генерацию и загрузки резюме, которое не будет добавлено, и удаляет созданную папку кандидата"""
+    for task in pending_tasks:
+        if not task.done():
+            task.cancel()
+    # Дожидаемся отмены, чтобы загрузка не закончилась уже после удаления папки
+    await asyncio.gather(*pending_tasks, return_exceptions=True)
+    if folder_id:
+        if await run_stage(drive_semaphore, delete_drive_folder, folder_id):
+            print(f"🗑 {file_name}: папка кандидата удалена из Google Drive")
+        else:
+            print(f"⚠️ {file_name}: не удалось удалить папку кандидата из Google Drive")
+
 
-async def process_single_resume_from_disk(message: types.Message, local_file_path: str, file_name: str, rekruter_username: str):
+
+async def process_single_resume(message: types.Message, source: Union[str, bytes], file_name: str, rekruter_username: str):
     resume_id = generate_random_id()
     ext = file_name.split(".")[-1].lower()
 
     if ext == "pdf":
-        text = await process_pdf(local_file_path)
+        text = await process_pdf(source)
         
-        await message.answer(f"✅ PDF принят и обработан\n\n Обрабатываю текст...")
+        await message.answer(f"✅ PDF {file_name} принят и обработан\n\n Обрабатываю текст...")
     elif ext == "docx":
-        text = await process_docx(local_file_path)
+        text = await process_docx(source)
         
-        await message.answer(f"✅ DOCX принят и обработан\n\n Обрабатываю текст...")
+        await message.answer(f"✅ DOCX {file_name} принят и обработан\n\n Обрабатываю текст...")
     elif ext == "rtf":
-        text = await process_rtf(local_file_path)
+        text = await process_rtf(source)
         
-        await message.answer(f"✅ RTF принят и обработан\n\n Обрабатываю текст...")
+        await message.answer(f"✅ RTF {file_name} принят и обработан\n\n Обрабатываю текст...")
     elif ext == "txt":
-        text = await process_txt(local_file_path)
+        text = await process_txt(source)
         
-        await message.answer(f"✅ TXT принят и обработан\n\n Обрабатываю текст...")
+        await message.answer(f"✅ TXT {file_name} принят и обработан\n\n Обрабатываю текст...")
     else:
-        await message.answer("❌ Поддерживаются только PDF, DOCX, RTF и TXT файлы")
-        return
+        await message.answer(f"❌ {file_name}: поддерживаются только PDF, DOCX, RTF и TXT файлы")
+        return {'success': False, 'error': 'неподдерживаемый формат файла'}
+    
+    # Убираем колонтитулы, номера страниц и слишком длинные разделы: текст уходит в несколько промптов.
+    # Исходный текст остаётся для локального извлечения контактов — они часто именно в колонтитулах
+    raw_text = text
+    text, compaction = compact_resume_text(raw_text)
+    if compaction['saved_tokens']:
+        print(f"✂️ {file_name}: текст сокращён с {compaction['chars_before']} до {compaction['chars_after']} символов "
+              f"(≈ −{compaction['saved_tokens']} токенов на запрос)")
+        llm_metrics.record_compaction(compaction['saved_tokens'])
     
     
     user_id = message.from_user.id
     
-    resume_data = process_resume(text, file_name)
-    if not resume_data:
-        message.answer('Не удалось извлечь данные')
-        return
-    first_name = resume_data.get("firstName", {}).get('ru') if resume_data.get("firstName") else None
-    first_name_en = resume_data.get("firstName", {}).get('en') if resume_data.get("firstName") else None
-    last_name = resume_data.get("lastName", {}).get('ru') if resume_data.get("lastName") else None
-    last_name_en = resume_data.get("lastName", {}).get('en') if resume_data.get("lastName") else None
-    patronymic = resume_data.get("patronymic", {}).get('ru') if resume_data.get("patronymic") else None
-    patronymic_en = resume_data.get("patronymic", {}).get('en') if resume_data.get("patronymic") else None
-    date_of_birth = resume_data.get("dateOfBirth")
-    languages = resume_data.get("languages")
-    if first_name is None and first_name_en is None:
-        await message.answer("❌ В резюме нет имени. Пожалуйста уточните его")
-        return
-    if last_name is None and last_name_en is None:
-        await message.answer("❌ В резюме нет фамилии. Пожалуйста уточните его")
-        return
-    if patronymic is None:
-        await message.answer("❌ В резюме нет отчества. Пожалуйста уточните его")
+    # Для форматирования нужен только текст резюме, поэтому запускаем его параллельно с извлечением данных.
+    # Если кандидат будет отклонён (дубликат, нет имени), запрос отменяется в finally.
+    streamed_documents = None
+    docx_upload_tasks = {}
+    if NEW_RESUME_MODE == 'stream':
+        # Документы собираются по мере генерации, каждая версия загружается сразу после готовности
+        streamed_documents = StreamedResumeDocuments()
+        new_resume_coro = create_new_resume_stream_async(
+            text, resume_id, streamed_documents.on_paragraph, streamed_documents.on_section_done
+        )
+    elif NEW_RESUME_MODE == 'split':
+        new_resume_coro = create_new_resume_split_async(text, resume_id)
+    else:
+        new_resume_coro = create_new_resume_async(text, resume_id)
+    new_resume_task = asyncio.create_task(new_resume_coro)
+    folder_id = None
+    resume_ready = False
+    try:
+        resume_data = await process_resume_async(text, file_name)
+        if not resume_data:
+            await message.answer(f'❌ {file_name}: не удалось извлечь данные')
+            return {'success': False, 'error': 'не удалось извлечь данные'}
+        # Контакты, дату рождения и зарплату из названия файла надёжнее взять регулярными выражениями
+        resume_data = apply_local_fields(resume_data, raw_text, file_name)
+        first_name = resume_data.get("firstName", {}).get('ru') if resume_data.get("firstName") else None
+        first_name_en = resume_data.get("firstName", {}).get('en') if resume_data.get("firstName") else None
+        last_name = resume_data.get("lastName", {}).get('ru') if resume_data.get("lastName") else None
+        last_name_en = resume_data.get("lastName", {}).get('en') if resume_data.get("lastName") else None
+        patronymic = resume_data.get("patronymic", {}).get('ru') if resume_data.get("patronymic") else None
+        patronymic_en = resume_data.get("patronymic", {}).get('en') if resume_data.get("patronymic") else None
+        date_of_birth = resume_data.get("dateOfBirth")
+        languages = resume_data.get("languages")
+        if first_name is None and first_name_en is None:
+            await message.answer(f"❌ {file_name}: в резюме нет имени. Пожалуйста уточните его")
+            return {'success': False, 'error': 'в резюме нет имени'}
+        if last_name is None and last_name_en is None:
+            await message.answer(f"❌ {file_name}: в резюме нет фамилии. Пожалуйста уточните его")
+            return {'success': False, 'error': 'в резюме нет фамилии'}
+        if patronymic is None:
+            await message.answer(f"❌ {file_name}: в резюме нет отчества. Пожалуйста уточните его")
         
-    if date_of_birth is None:
-        await message.answer("❌ В резюме нет даты рождения. Пожалуйста уточните его")
+        if date_of_birth is None:
+            await message.answer(f"❌ {file_name}: в резюме нет даты рождения. Пожалуйста уточните его")
         
         
-    # Проверяем наличие языков
-    if languages is None or not languages or all(not v for v in languages.values() if isinstance(v, (str, bool))):
-        await message.answer("❌ В резюме нет сведений об языках. Пожалуйста уточните сведения об языках")
+        # Проверяем наличие языков
+        if languages is None or not languages or all(not v for v in languages.values() if isinstance(v, (str, bool))):
+            await message.answer(f"❌ {file_name}: в резюме нет сведений об языках. Пожалуйста уточните сведения об языках")
         
-    is_duplicate = None
-    # Проверяем на дубликаты по ФИ
-    if first_name and last_name:
-        is_duplicate = check_duplicate_by_fio(first_name, last_name)
-    elif first_name_en and last_name_en:
-        is_duplicate = check_duplicate_by_fio(first_name_en, last_name_en)
-    
-    if is_duplicate:
-        await message.answer(f"⚠️ Кандидат {last_name} {first_name} уже существует в базе данных!")
-        return
+        is_duplicate = None
+        # Проверяем на дубликаты по ФИ
+        if first_name and last_name:
+            is_duplicate = await run_stage(sheets_semaphore, check_duplicate_by_fio, first_name, last_name)
+        elif first_name_en and last_name_en:
+            is_duplicate = await run_stage(sheets_semaphore, check_duplicate_by_fio, first_name_en, last_name_en)
     
-    new_resume_data = create_new_resume(text, resume_id)
+        if is_duplicate:
+            await message.answer(f"⚠️ Кандидат {last_name} {first_name} уже существует в базе данных!")
+            return {'success': False, 'error': 'кандидат уже есть в базе'}
     
-    # Очищаем markdown символы из обеих версий и исправляем цветовые значения
-    if isinstance(new_resume_data, dict):
-        new_resume_russian = new_resume_data.get('russian', '')
-        new_resume_english = new_resume_data.get('english', '')
+        # Папку и исходный файл загружаем, пока модель ещё форматирует резюме
+        first = resume_data.get("firstName" or {}).get('ru') or None
+        last = resume_data.get("lastName" or {}).get('ru') or None
+        first_en = resume_data.get("firstName" or {}).get('en') or None
+        last_en = resume_data.get("lastName" or {}).get('en') or None
+    
+        if first and last:
+            folder_name = f"{resume_id}\n{first} {last}"
+        elif first:
+            folder_name = f"{resume_id}\n{first}"
+        elif last:
+            folder_name = f"{resume_id}\n{last}"
+        else:
+            folder_name = f"{resume_id}\nРезюме"
+    
+        # Создаем папку и загружаем исходный файл
+        upload_result = await run_stage(drive_semaphore, upload_original_to_drive, source, folder_name, file_name)
+        file_url = None
+        folder_id = upload_result.get('folder_id')
+    
+        if not folder_id:
+            await message.answer(f"❌ {file_name}: не удалось отправить в Google Drive")
+            return {'success': False, 'error': 'не удалось отправить в Google Drive'}
+        if upload_result.get('success'):
+            file_url = upload_result.get('web_link')
+        else:
+            await message.answer(f"❌ Не удалось загрузить файл в Google Drive: {upload_result.get('error', 'Неизвестная ошибка')}")
         
-        # Более аккуратная очистка markdown без повреждения кириллицы
-        import re
-        new_resume_russian = re.sub(r'\*{1,2}([^*]+)\*{1,2}', r'\1', new_resume_russian)
-        new_resume_russian = re.sub(r'#{1,6}\s*', '', new_resume_russian)
-        new_resume_english = re.sub(r'\*{1,2}([^*]+)\*{1,2}', r'\1', new_resume_english)
-        new_resume_english = re.sub(r'#{1,6}\s*', '', new_resume_english)
+        # Имена и заголовки обработанных резюме (русская и английская версии)
+        base_file_name = file_name.replace('.pdf', '').replace('.docx', '')
+        new_resume_filename_ru = f"Обработанное_RU_{base_file_name}"
+        new_resume_title_ru = f"{first} {last}" if first and last else "Резюме (RU)"
+        new_resume_filename_en = f"Обработанное_EN_{base_file_name}"
+        new_resume_title_en = f"{first_en} {last_en}" if first_en and last_en else "Resume (EN)"
         
-        # Исправляем цветовые значения и убираем проблемные символы
-        new_resume_russian = fix_color_formatting(new_resume_russian)
-        new_resume_english = fix_color_formatting(new_resume_english)
+        if streamed_documents:
+            # Папка уже создана, поэтому каждую версию можно загружать сразу после её генерации
+            for language, docx_file_name, title in (
+                ('russian', new_resume_filename_ru, new_resume_title_ru),
+                ('english', new_resume_filename_en, new_resume_title_en),
+            ):
+                docx_upload_tasks[language] = asyncio.create_task(streamed_documents.upload(
+                    language, new_resume_task, message, file_name, docx_file_name, folder_name, title
+                ))
         
-        # Убираем символы ■ и другие проблемные символы
-        new_resume_russian = new_resume_russian.replace('■', '').replace('\ufffd', '').replace('\u25a0', '')
-        new_resume_english = new_resume_english.replace('■', '').replace('\ufffd', '').replace('\u25a0', '')
+        new_resume_data = await new_resume_task
+        if new_resume_data is None:
+            await message.answer(f"❌ {file_name}: не удалось сформировать новое резюме")
+            return {'success': False, 'error': 'не удалось сформировать новое резюме'}
+        resume_ready = True
+    finally:
+        if not resume_ready:
+            # Кандидат отклонён или резюме не сформировано: папка в Google Drive не должна остаться
+            await discard_unfinished_resume([new_resume_task, *docx_upload_tasks.values()], folder_id, file_name)
+    
+    # Очищаем markdown символы из обеих версий и исправляем цветовые значения
+    if isinstance(new_resume_data, dict):
+        new_resume_russian = clean_resume_text(new_resume_data.get('russian', ''))
+        new_resume_english = clean_resume_text(new_resume_data.get('english', ''))
     else:
         # Fallback для старого формата
-        new_resume_russian = str(new_resume_data)
+        new_resume_russian = clean_resume_text(str(new_resume_data))
         new_resume_english = new_resume_russian
-        
-        # Более аккуратная очистка markdown
-        import re
-        new_resume_russian = re.sub(r'\*{1,2}([^*]+)\*{1,2}', r'\1', new_resume_russian)
-        new_resume_russian = re.sub(r'#{1,6}\s*', '', new_resume_russian)
-        new_resume_english = re.sub(r'\*{1,2}([^*]+)\*{1,2}', r'\1', new_resume_english)
-        new_resume_english = re.sub(r'#{1,6}\s*', '', new_resume_english)
-        
-        # Исправляем цветовые значения и убираем проблемные символы
-        new_resume_russian = fix_color_formatting(new_resume_russian)
-        new_resume_english = fix_color_formatting(new_resume_english)
-        
-        # Убираем символы ■ и другие проблемные символы
-        new_resume_russian = new_resume_russian.replace('■', '').replace('\ufffd', '').replace('\u25a0', '')
-        new_resume_english = new_resume_english.replace('■', '').replace('\ufffd', '').replace('\u25a0', '')
-    if not resume_data:
-        await message.answer("❌ Не удалось извлечь данные из резюме")
-        return
-    
-    await message.answer(f"✅ Данные извлечены!")
-    
     
-    
-    first = resume_data.get("firstName" or {}).get('ru') or None
-    last = resume_data.get("lastName" or {}).get('ru') or None
-    first_en = resume_data.get("firstName" or {}).get('en') or None
-    last_en = resume_data.get("lastName" or {}).get('en') or None
-    
-
-    if first and last:
-        folder_name = f"{resume_id}\n{first} {last}"
-    elif first:
-        folder_name = f"{resume_id}\n{first}"
-    elif last:
-        folder_name = f"{resume_id}\n{last}"
-    else:
-        folder_name = f"{resume_id}\nРезюме"
-    
-    # Получаем или создаем папку
-    folder_id = gm.get_or_create_folder(folder_name)
-    if not folder_id:
-        await message.answer("❌ Не удалось отправить в Google Drive")
-        return
-    # Загружаем файл и получаем результат с информацией о файле
-    upload_result = gm.upload_file(
-        file_path=local_file_path,
-        folder_id=folder_id,
-        file_name=file_name,
-    )
-    
-    if upload_result.get('success'):
-        file_id = upload_result.get('file_id')
-        file_url = upload_result.get('web_link')
-        
-        # Делаем файл общедоступным
-        if file_id:
-            permissions_set = gm.set_file_permissions(file_id, permission_type='reader', role='anyone')
-            if permissions_set:
-                print(f"✅ Файл успешно загружен в Google Drive и сделан общедоступным!\n🔗")
-            else:
-                print(f"✅ Файл загружен в Google Drive, но не удалось сделать его общедоступным\n🔗")
-        elif file_url:
-            print(f"✅ Файл успешно загружен в Google Drive!\n🔗")
-        else:
-            print(f"✅ Файл успешно загружен в Google Drive!")
-    else:
-        await message.answer(f"❌ Не удалось загрузить файл в Google Drive: {upload_result.get('error', 'Неизвестная ошибка')}")
+    await message.answer(f"✅ {file_name}: данные извлечены!")
     
     # Загружаем обработанные резюме как Word документы (русская и английская версии)
     new_resume_url_russian = None
     new_resume_url_english = None
     
-    if new_resume_russian:
+    docx_upload_result_ru = None
+    docx_upload_result_en = None
+    if streamed_documents:
+        # Документы уже собраны во время генерации и загружаются в фоне
+        docx_upload_result_ru = await docx_upload_tasks['russian']
+        docx_upload_result_en = await docx_upload_tasks['english']
+    
+    if docx_upload_result_ru is None and new_resume_russian:
         # Загружаем русскую версию
-        new_resume_filename_ru = f"Обработанное_RU_{file_name.replace('.pdf', '').replace('.docx', '')}"
-        new_resume_title_ru = f"{first} {last}" if first and last else "Резюме (RU)"
         print(new_resume_russian)
         
-        docx_upload_result_ru = create_and_upload_docx_to_drive(
+        docx_upload_result_ru = await run_stage(
+            drive_semaphore,
+            create_and_upload_docx_to_drive,
             text=new_resume_russian,
             file_name=new_resume_filename_ru,
             folder_name=folder_name,
             title=new_resume_title_ru,
             credentials_path="oauth.json"
         )
-        
+    
+    if docx_upload_result_ru is not None:
         if docx_upload_result_ru.get('success'):
             new_resume_url_russian = docx_upload_result_ru.get('web_link')
             print(f"✅ Русское резюме загружено в Word!\n🔗")
         else:
             await message.answer(f"⚠️ Не удалось загрузить русское резюме: {docx_upload_result_ru.get('error', 'Неизвестная ошибка')}")
     
-    if new_resume_english:
+    if docx_upload_result_en is None and new_resume_english:
         # Загружаем английскую версию
-        new_resume_filename_en = f"Обработанное_EN_{file_name.replace('.pdf', '').replace('.docx', '')}"
-        new_resume_title_en = f"{first_en} {last_en}" if first_en and last_en else "Resume (EN)"
         print(new_resume_english)
-        docx_upload_result_en = create_and_upload_docx_to_drive(
+        docx_upload_result_en = await run_stage(
+            drive_semaphore,
+            create_and_upload_docx_to_drive,
             text=new_resume_english,
             file_name=new_resume_filename_en,
             folder_name=folder_name,
             title=new_resume_title_en,
             credentials_path="oauth.json"
         )
-        
+    
+    if docx_upload_result_en is not None:
         if docx_upload_result_en.get('success'):
             new_resume_url_english = docx_upload_result_en.get('web_link')
             print(f"✅ Английское резюме загружено в Word!\n🔗")
@@ -343,6 +739,8 @@ async def process_single_resume_from_disk(message: types.Message, local_file_pat
     rate_sng_for_main_table = None
     rate_eur_for_main_table = None
     salary_expectations = None
+    # Все строки резюме собираются здесь и записываются одним запросом
+    rows_for_table = {}
     
     salary = resume_data.get("salaryExpectations")
     salaru = salary.get('amount') if salary else None
@@ -364,14 +762,14 @@ async def process_single_resume_from_disk(message: types.Message, local_file_pat
         
         
             
-        contract_data_sng = search_and_extract_values(search_col, salaru, ["M",'N','O','P'], "Расчет ставки (штат/контракт) СНГ")
-        ip_data_sng = search_and_extract_values(search_col, salaru, ["M",'N','O','P'], "Расчет ставки (ИП) СНГ")
-        samozanyatii_data_sng = search_and_extract_values(search_col, salaru, ["M",'N','O','P'], "Расчет ставки (Самозанятый) СНГ")
+        contract_data_sng = await run_stage(sheets_semaphore, search_and_extract_values, search_col, salaru, ["M",'N','O','P'], "Расчет ставки (штат/контракт) СНГ")
+        ip_data_sng = await run_stage(sheets_semaphore, search_and_extract_values, search_col, salaru, ["M",'N','O','P'], "Расчет ставки (ИП) СНГ")
+        samozanyatii_data_sng = await run_stage(sheets_semaphore, search_and_extract_values, search_col, salaru, ["M",'N','O','P'], "Расчет ставки (Самозанятый) СНГ")
             
         
-        contract_data_es = search_and_extract_values(search_col, salaru, ['M','N','O', 'P'], "Расчет ставки (штат/контракт) ЕС/США")
-        ip_data_es = search_and_extract_values(search_col, salaru, ["M",'N','O','P'], "Расчет ставки (ИП) ЕС/США")
-        samozanyatii_data_es = search_and_extract_values(search_col, salaru, ["M",'N','O','P'], "Расчет ставки (Самозанятый) ЕС/США")
+        contract_data_es = await run_stage(sheets_semaphore, search_and_extract_values, search_col, salaru, ['M','N','O', 'P'], "Расчет ставки (штат/контракт) ЕС/США")
+        ip_data_es = await run_stage(sheets_semaphore, search_and_extract_values, search_col, salaru, ["M",'N','O','P'], "Расчет ставки (ИП) ЕС/США")
+        samozanyatii_data_es = await run_stage(sheets_semaphore, search_and_extract_values, search_col, salaru, ["M",'N','O','P'], "Расчет ставки (Самозанятый) ЕС/США")
         print(contract_data_es)
         print(ip_data_es)
         print(samozanyatii_data_es)
@@ -417,12 +815,7 @@ async def process_single_resume_from_disk(message: types.Message, local_file_pat
         }
         
         for k, v in date_for_eu_sng_rates.items():
-            print(f"Добавление {v} в Google таблицу...")
-            success = await add_data_to_worksheet(v, worksheet_name=k)
-            if success:
-                print(f"📊 {k} добавлено в Google таблицу!")
-            else:
-                await message.answer(f"⚠️ Не удалось добавить {k} в Google таблицу. Проверьте настройки.")
+            rows_for_table[k] = [v]
                 
                 
         rate_sng_for_main_table = f"Штат/контракт-{data_for_sng_rate_sheet.get('contract_data_sng_rub')}\nИП-{data_for_sng_rate_sheet.get('ip_data_sng_rub')}\nСамозанятый-{data_for_sng_rate_sheet.get('samozanyatii_data_sng_rub')}"
@@ -528,7 +921,7 @@ async def process_single_resume_from_disk(message: types.Message, local_file_pat
     
     data_for_work_form_sheet = build_row_symbols(resume_id, resume_data.get('workForm'), WORK_FORM_MAP)
     
-    data_for_contacts_sheet = build_row(resume_id, resume_data.get('contacts'), CONTACTS_MAP)
+    data_for_contacts_sheet = build_row(resume_id, contacts_for_sheet(resume_data.get('contacts')), CONTACTS_MAP)
     
     data_for_avaliable_sheet = build_row_symbols(resume_id, resume_data.get('availability'), AVAILABILITY_MAP)
 
@@ -556,23 +949,27 @@ async def process_single_resume_from_disk(message: types.Message, local_file_pat
     
     
     for k, v in data_for_table.items():
-        print(f"Добавление {v} в Google таблицу...")
-        success = await add_data_to_worksheet(v, worksheet_name=k)
-        if success:
-            print(f"📊 {k} добавлено в Google таблицу!")
-        else:
-            await message.answer(f"⚠️ Не удалось добавить {k} в Google таблицу. Проверьте настройки.")
+        rows_for_table[k] = [v]
+    
+    print(f"Добавление данных резюме {resume_id} в {len(rows_for_table)} листов Google таблицы...")
+    async with sheets_semaphore:
+        write_results = await add_rows_to_worksheets(rows_for_table)
+    failed_sheets = [k for k, success in write_results.items() if not success]
+    if failed_sheets:
+        await message.answer(f"⚠️ Не удалось добавить {', '.join(failed_sheets)} в Google таблицу. Проверьте настройки.")
+    else:
+        print(f"📊 Резюме {resume_id} добавлено в Google таблицу!")
     
     
-    # Сообщение об успехе будет отправлено в конце цикла
     await message.answer(f"✅ Резюме '{file_name}' успешно добавлено!")
+    return {'success': True, 'resume_id': resume_id}
 
 
 @scan_router.callback_query(F.data == 'delete_record')
 async def show_delete_menu(callback: types.CallbackQuery, state: FSMContext):
     """Запрашивает ID для удаления"""
     await callback.message.delete()
-    await callback.message.answer("🗑️ Введите ID записи для удаления:")
+    await callback.message.answer("🗑️ Введите ID записи для удаления (несколько ID — через пробел или запятую):")
     await state.set_state(DeleteRecord.waiting_for_id)
 
 
@@ -580,22 +977,50 @@ async def show_delete_menu(callback: types.CallbackQuery, state: FSMContext):
 async def process_delete_id(message: types.Message, state: FSMContext):
     """Обрабатывает введенный ID и запрашивает подтверждение"""
     await state.clear()
-    resume_id = message.text.strip()
+    resume_ids = list(dict.fromkeys(i for i in re.split(r'[\s,;]+', message.text.strip()) if i))
+    if not resume_ids:
+        await message.answer("⚠️ Не указан ID записи", reply_markup=await start_kb())
+        return
 
     # Подтверждение удаления
     from aiogram.utils.keyboard import InlineKeyboardBuilder
     confirm_kb = InlineKeyboardBuilder()
-    confirm_kb.button(text="✅ Да, удалить", callback_data=f"confirm_delete_{resume_id}")
+    if len(resume_ids) == 1:
+        confirm_kb.button(text="✅ Да, удалить", callback_data=f"confirm_delete_{resume_ids[0]}")
+    else:
+        # Список ID может не поместиться в callback_data, поэтому храним его в состоянии
+        await state.update_data(delete_ids=resume_ids)
+        confirm_kb.button(text="✅ Да, удалить", callback_data="confirm_delete_batch")
     confirm_kb.button(text="❌ Отмена", callback_data="cancel_delete")
     confirm_kb.adjust(1)
 
     await message.answer(
-        f"⚠️ Вы уверены, что хотите удалить запись с ID: {resume_id}?\n\n"
-        f"Это действие удалит все данные кандидата из всех листов таблицы и не может быть отменено!",
+        f"⚠️ Вы уверены, что хотите удалить записи с ID: {', '.join(resume_ids)}?\n\n"
+        f"Это действие удалит все данные кандидатов из всех листов таблицы и не может быть отменено!",
         reply_markup=confirm_kb.as_markup()
     )
 
 
+@scan_router.callback_query(F.data == 'confirm_delete_batch')
+async def confirm_delete_batch(callback: types.CallbackQuery, state: FSMContext):
+    """Подтверждает и выполняет удаление нескольких записей одним запросом"""
+    await callback.message.delete()
+    data = await state.get_data()
+    resume_ids = data.get('delete_ids') or []
+    await state.clear()
+
+    await callback.message.answer(f"🗑️ Удаляю {len(resume_ids)} записей...")
+    async with sheets_semaphore:
+        deleted = await asyncio.to_thread(delete_resumes_by_ids, resume_ids)
+
+    removed = [resume_id for resume_id in resume_ids if deleted.get(resume_id)]
+    missing = [resume_id for resume_id in resume_ids if not deleted.get(resume_id)]
+    lines = [f"✅ Удалено записей: {len(removed)} из {len(resume_ids)}"]
+    if missing:
+        lines.append(f"❌ Не найдены или не удалены: {', '.join(missing)}")
+    await callback.message.answer("\n".join(lines), reply_markup=await start_kb())
+
+
 @scan_router.callback_query(F.data.startswith('confirm_delete_'))
 async def confirm_delete_record(callback: types.CallbackQuery):
     """Подтверждает и выполняет удаление записи"""
@@ -607,7 +1032,8 @@ async def confirm_delete_record(callback: types.CallbackQuery):
     await callback.message.answer(f"🗑️ Удаляю запись с ID: {resume_id}...")
     
     # Выполняем удаление
-    success = delete_resume_by_id(resume_id)
+    async with sheets_semaphore:
+        success = await asyncio.to_thread(delete_resume_by_id, resume_id)
     
     if success:
         await callback.message.answer(
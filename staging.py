@@ -0,0 +1,304 @@
+import io
+import os
+import time
+import zlib
+import asyncio
+import zipfile
+import threading
+from typing import Dict, List, Tuple, Union
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Корневая папка для загрузок: внутри неё у каждого чата своя подпапка
+STAGING_ROOT = os.getenv('STAGING_DIR', 'downloads')
+# Через сколько секунд брошенная загрузка считается устаревшей
+STAGING_TTL = int(os.getenv('STAGING_TTL', str(6 * 60 * 60)))
+# Как часто запускать очистку устаревших загрузок
+STAGING_SWEEP_INTERVAL = int(os.getenv('STAGING_SWEEP_INTERVAL', str(30 * 60)))
+
+# Файлы не больше этого размера хранятся в памяти, а не в папке загрузок (0 — всегда на диске)
+STAGING_MEMORY_MAX_BYTES = int(os.getenv('STAGING_MEMORY_MAX_BYTES', str(10 * 1024 * 1024)))
+# Сколько байт загрузок всех чатов можно держать в памяти одновременно, включая файлы в обработке;
+# сверх этого файлы сохраняются на диск
+STAGING_MEMORY_BUDGET_BYTES = int(os.getenv('STAGING_MEMORY_BUDGET_BYTES', str(100 * 1024 * 1024)))
+
+# Ограничения для ZIP-архивов с резюме (защита от архивов-бомб)
+ZIP_MAX_MEMBERS = int(os.getenv('ZIP_MAX_MEMBERS', '200'))
+ZIP_MAX_MEMBER_BYTES = int(os.getenv('ZIP_MAX_MEMBER_BYTES', str(20 * 1024 * 1024)))
+ZIP_MAX_TOTAL_BYTES = int(os.getenv('ZIP_MAX_TOTAL_BYTES', str(200 * 1024 * 1024)))
+# Сколько записей (файлов и папок) может быть в архиве: архив с большим числом записей не разбирается
+ZIP_MAX_ENTRIES = int(os.getenv('ZIP_MAX_ENTRIES', '1000'))
+# Сколько пропущенных файлов перечислять в отчёте, остальные только считаются
+ZIP_MAX_SKIPPED_REPORTED = 30
+
+# Разделитель между file_unique_id и оригинальным именем файла
+_NAME_SEPARATOR = "__"
+
+_memory_lock = threading.Lock()
+# Загрузки в памяти: chat_id -> {file_unique_id: (время загрузки, имя файла, содержимое)}
+_memory_uploads: Dict[int, Dict[str, Tuple[float, str, bytes]]] = {}
+# Сколько байт сейчас занято загрузками в памяти (в том числе уже забранными в обработку)
+_memory_in_use = 0
+
+
+def get_staging_dir(chat_id: int) -> str:
+    """Возвращает (и при необходимости создаёт) папку загрузок конкретного чата"""
+    staging_dir = os.path.join(STAGING_ROOT, str(chat_id))
+    os.makedirs(staging_dir, exist_ok=True)
+    return staging_dir
+
+
+def staged_file_path(chat_id: int, file_unique_id: str, file_name: str) -> str:
+    """
+    Формирует путь для файла в папке загрузок чата
+
+    Файл адресуется по file_unique_id из Telegram, поэтому одноимённые файлы
+    не перезаписывают друг друга, а повторно отправленный файл не дублируется.
+
+    Args:
+        chat_id: ID чата
+        file_unique_id: Уникальный ID файла в Telegram
+        file_name: Оригинальное имя файла
+
+    Returns:
+        Путь к файлу в папке загрузок чата
+    """
+    safe_name = os.path.basename(file_name or "file").replace(_NAME_SEPARATOR, "_")
+    return os.path.join(get_staging_dir(chat_id), f"{file_unique_id}{_NAME_SEPARATOR}{safe_name}")
+
+
+def original_file_name(staged_name: str) -> str:
+    """Восстанавливает оригинальное имя файла по имени в папке загрузок"""
+    if _NAME_SEPARATOR in staged_name:
+        return staged_name.split(_NAME_SEPARATOR, 1)[1]
+    return staged_name
+
+
+def list_staged_files(chat_id: int) -> List[Tuple[str, str]]:
+    """
+    Возвращает файлы, загруженные в указанном чате, в порядке загрузки
+
+    Returns:
+        Список пар (путь к файлу, оригинальное имя файла)
+    """
+    staging_dir = get_staging_dir(chat_id)
+    paths = [
+        os.path.join(staging_dir, name)
+        for name in os.listdir(staging_dir)
+        if os.path.isfile(os.path.join(staging_dir, name))
+    ]
+    paths.sort(key=os.path.getmtime)
+    return [(path, original_file_name(os.path.basename(path))) for path in paths]
+
+
+def fits_in_memory(file_size) -> bool:
+    """Проверяет, можно ли держать файл такого размера в памяти"""
+    return bool(file_size) and file_size <= STAGING_MEMORY_MAX_BYTES
+
+
+def is_staged_in_memory(chat_id: int, file_unique_id: str) -> bool:
+    with _memory_lock:
+        return file_unique_id in _memory_uploads.get(chat_id, {})
+
+
+def stage_in_memory(chat_id: int, file_unique_id: str, file_name: str, data: bytes) -> bool:
+    """
+    Сохраняет загруженный файл в памяти до начала обработки
+    
+    Returns:
+        False, если общий бюджет памяти STAGING_MEMORY_BUDGET_BYTES исчерпан и файл нужно сохранить на диск
+    """
+    global _memory_in_use
+    with _memory_lock:
+        uploads = _memory_uploads.get(chat_id, {})
+        if file_unique_id in uploads:
+            return True
+        if _memory_in_use + len(data) > STAGING_MEMORY_BUDGET_BYTES:
+            return False
+        _memory_uploads.setdefault(chat_id, {})[file_unique_id] = (time.time(), file_name, data)
+        _memory_in_use += len(data)
+        return True
+
+
+def release_memory_upload(data: bytes):
+    """Возвращает в общий бюджет память файла, обработка которого закончена"""
+    global _memory_in_use
+    with _memory_lock:
+        _memory_in_use = max(0, _memory_in_use - len(data))
+
+
+def stage_bytes(chat_id: int, file_unique_id: str, file_name: str, data: bytes):
+    """Сохраняет скачанный файл в памяти, а если бюджет памяти исчерпан — в папке загрузок чата"""
+    if not stage_in_memory(chat_id, file_unique_id, file_name, data):
+        with open(staged_file_path(chat_id, file_unique_id, file_name), 'wb') as f:
+            f.write(data)
+
+
+def take_staged_files(chat_id: int) -> List[Tuple[Union[str, bytes], str]]:
+    """
+    Забирает все загрузки чата для обработки в порядке загрузки
+    
+    Файлы из памяти удаляются из хранилища и возвращаются содержимым,
+    для файлов на диске возвращаются пути (их удаляет обработчик).
+    
+    Returns:
+        Список пар (путь к файлу или содержимое файла, оригинальное имя файла)
+    """
+    with _memory_lock:
+        memory_uploads = _memory_uploads.pop(chat_id, {})
+    items = [(added_at, data, file_name) for added_at, file_name, data in memory_uploads.values()]
+    items.extend((os.path.getmtime(path), path, file_name) for path, file_name in list_staged_files(chat_id))
+    items.sort(key=lambda item: item[0])
+    return [(source, file_name) for _, source, file_name in items]
+
+
+def _zip_member_name(info: zipfile.ZipInfo) -> str:
+    name = info.filename
+    if not info.flag_bits & 0x800:
+        # Без флага UTF-8 архиваторы Windows записывают имена в cp866, а zipfile читает их как cp437
+        try:
+            name = name.encode('cp437').decode('cp866')
+        except UnicodeError:
+            pass
+    return os.path.basename(name.rstrip('/'))
+
+
+def _copy_limited(member, path: str, limit: int) -> int:
+    """Потоково копирует файл из архива на диск; пустую или превысившую limit копию удаляет (для неё возвращает -1)"""
+    size = 0
+    with open(path, 'wb') as f:
+        while True:
+            chunk = member.read(64 * 1024)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limit:
+                break
+            f.write(chunk)
+    if size == 0 or size > limit:
+        os.remove(path)
+        return -1 if size else 0
+    return size
+
+
+def stage_zip_archive(chat_id: int, archive_unique_id: str, source: Union[str, bytes],
+                      allowed_extensions: Tuple[str, ...]) -> Tuple[int, List[str]]:
+    """
+    Раскладывает файлы из ZIP-архива в загрузки чата, не распаковывая архив целиком
+    
+    Каждый файл читается из архива потоком и сохраняется в папке загрузок чата: в памяти архив
+    на сотни мегабайт оставался бы целиком до конца обработки пачки.
+    Реальный размер проверяется при чтении, а не по заголовку архива.
+    
+    Args:
+        chat_id: ID чата
+        archive_unique_id: file_unique_id архива в Telegram
+        source: Путь к архиву или его содержимое
+        allowed_extensions: Допустимые расширения файлов (в нижнем регистре, с точкой)
+    
+    Returns:
+        Кортеж (количество добавленных файлов, список пропущенных файлов с причиной,
+        не длиннее ZIP_MAX_SKIPPED_REPORTED строк и строки с числом остальных)
+    
+    Raises:
+        zipfile.BadZipFile: если файл не является ZIP-архивом
+    """
+    staged = 0
+    total_size = 0
+    skipped = []
+    archive_file = io.BytesIO(source) if isinstance(source, bytes) else source
+    with zipfile.ZipFile(archive_file) as archive:
+        entries = archive.infolist()
+        if len(entries) > ZIP_MAX_ENTRIES:
+            return 0, [f"в архиве {len(entries)} записей, допускается не больше {ZIP_MAX_ENTRIES} — архив не обработан"]
+        for index, info in enumerate(entries):
+            name = _zip_member_name(info)
+            if info.is_dir() or not name or name.startswith('.') or info.filename.startswith('__MACOSX/'):
+                continue
+            if not name.lower().endswith(allowed_extensions):
+                skipped.append(f"{name} — неподдерживаемый формат")
+                continue
+            if staged >= ZIP_MAX_MEMBERS:
+                skipped.append(f"{name} — в архиве больше {ZIP_MAX_MEMBERS} файлов")
+                continue
+            if info.file_size == 0:
+                skipped.append(f"{name} — пустой файл")
+                continue
+            if info.file_size > ZIP_MAX_MEMBER_BYTES or total_size + info.file_size > ZIP_MAX_TOTAL_BYTES:
+                skipped.append(f"{name} — слишком большой файл")
+                continue
+
+            member_id = f"{archive_unique_id}_{index}"
+            try:
+                with archive.open(info) as member:
+                    size = _copy_limited(member, staged_file_path(chat_id, member_id, name), ZIP_MAX_MEMBER_BYTES)
+            except (zipfile.BadZipFile, RuntimeError, NotImplementedError, OSError, zlib.error) as e:
+                # RuntimeError — файл зашифрован, NotImplementedError — неподдерживаемое сжатие
+                skipped.append(f"{name} — не удалось извлечь: {e}")
+                continue
+            if size <= 0:
+                skipped.append(f"{name} — слишком большой файл" if size else f"{name} — пустой файл")
+                continue
+            total_size += size
+            staged += 1
+    if len(skipped) > ZIP_MAX_SKIPPED_REPORTED:
+        skipped = skipped[:ZIP_MAX_SKIPPED_REPORTED] + [f"… и ещё {len(skipped) - ZIP_MAX_SKIPPED_REPORTED}"]
+    return staged, skipped
+
+
+def sweep_stale_uploads(ttl: int = STAGING_TTL) -> int:
+    """
+    Удаляет брошенные загрузки старше ttl секунд и пустые папки чатов
+
+    Returns:
+        Количество удалённых файлов
+    """
+    global _memory_in_use
+    deadline = time.time() - ttl
+    removed = 0
+    with _memory_lock:
+        for chat_id in list(_memory_uploads):
+            uploads = _memory_uploads[chat_id]
+            for file_unique_id in [key for key, (added_at, _, _) in uploads.items() if added_at < deadline]:
+                _memory_in_use = max(0, _memory_in_use - len(uploads.pop(file_unique_id)[2]))
+                removed += 1
+            if not uploads:
+                del _memory_uploads[chat_id]
+
+    if not os.path.isdir(STAGING_ROOT):
+        return removed
+
+    for chat_dir_name in os.listdir(STAGING_ROOT):
+        chat_dir = os.path.join(STAGING_ROOT, chat_dir_name)
+        if not os.path.isdir(chat_dir):
+            continue
+        for name in os.listdir(chat_dir):
+            path = os.path.join(chat_dir, name)
+            try:
+                if os.path.isfile(path) and os.path.getmtime(path) < deadline:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                # Файл уже удалён обработчиком
+                continue
+        try:
+            if not os.listdir(chat_dir):
+                os.rmdir(chat_dir)
+        except OSError:
+            # В папку успели загрузить новый файл
+            pass
+
+    if removed:
+        print(f"🧹 Удалено {removed} устаревших загрузок")
+    return removed
+
+
+async def run_staging_sweeper(interval: int = STAGING_SWEEP_INTERVAL, ttl: int = STAGING_TTL):
+    """Фоновая задача: периодически очищает устаревшие загрузки"""
+    while True:
+        try:
+            await asyncio.to_thread(sweep_stale_uploads, ttl)
+        except Exception as e:
+            print(f"❌ Ошибка при очистке загрузок: {e}")
+        await asyncio.sleep(interval)
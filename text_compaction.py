@@ -0,0 +1,169 @@
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+# Ограничение длины одного раздела резюме и всего текста в символах (0 — без ограничения)
+COMPACT_SECTION_MAX_CHARS = int(os.getenv('COMPACT_SECTION_MAX_CHARS', '6000'))
+COMPACT_MAX_CHARS = int(os.getenv('COMPACT_MAX_CHARS', '40000'))
+
+# Разделитель страниц в тексте, который возвращает process_pdf
+PAGE_SEPARATOR = "\f"
+# Сколько строк в начале и в конце страницы проверять на колонтитулы и номера страниц
+_EDGE_LINES = 3
+_TRUNCATION_MARK = "[…]"
+
+_PAGE_NUMBER_RE = re.compile(
+    r'^[-–—\s]*(?:(?:стр\.?|страница|page|p\.)\s*)?\d{1,3}(?:\s*(?:из|of|/)\s*\d{1,3})?[-–—\s]*$',
+    re.IGNORECASE,
+)
+# Подпись с номером страницы в колонтитуле: "стр. 2", "Page 3 of 5", "2/5"
+_PAGE_LABEL_RE = re.compile(r'(стр\.?\s*|страница\s*|page\s*|p\.\s*|\s)\d{1,3}(?:\s*(?:из|of|/)\s*\d{1,3})?\s*$', re.IGNORECASE)
+_PAGE_LABEL_MAX_CHARS = 80
+# Сколько страниц (минимум) должна повторяться строка, чтобы считаться колонтитулом
+_MIN_REPEATED_PAGES = 3
+_SPACES_RE = re.compile(r'[ \t ]+')
+
+# Типичные заголовки разделов резюме (в нижнем регистре, без двоеточия)
+_SECTION_HEADINGS = {
+    'опыт работы', 'опыт', 'профессиональный опыт', 'места работы', 'проекты', 'портфолио',
+    'образование', 'навыки', 'ключевые навыки', 'технические навыки', 'технологии', 'языки',
+    'сертификаты', 'курсы', 'о себе', 'дополнительная информация', 'контакты', 'достижения',
+    'experience', 'work experience', 'professional experience', 'employment history', 'projects',
+    'portfolio', 'education', 'skills', 'technical skills', 'key skills', 'technologies',
+    'languages', 'certifications', 'certificates', 'courses', 'about me', 'summary', 'profile',
+    'additional information', 'contacts', 'achievements',
+}
+
+
+def approx_tokens(text: str) -> int:
+    """Грубая оценка числа токенов (около 4 символов на токен)"""
+    return len(text) // 4
+
+
+def _edge_key(line: str) -> str:
+    # Цифры не учитываются только в коротких строках с номером страницы: "Иванов И. — стр. 2" и
+    # "Иванов И. — стр. 3" — один колонтитул, а "2015 – 2017" и "2018 – 2020" — разные строки опыта
+    if len(line) <= _PAGE_LABEL_MAX_CHARS and _PAGE_LABEL_RE.search(line):
+        return _PAGE_LABEL_RE.sub(r'\1#', line.lower())
+    return line.lower()
+
+
+def _edge_indexes(page: List[str]) -> List[int]:
+    count = len(page)
+    return sorted(set(range(min(_EDGE_LINES, count))) | set(range(max(0, count - _EDGE_LINES), count)))
+
+
+def _remove_page_furniture(pages: List[List[str]]) -> Tuple[List[List[str]], int]:
+    """Убирает номера страниц и колонтитулы, повторяющиеся на нескольких страницах"""
+    repeated = set()
+    if len(pages) > 1:
+        counts = Counter()
+        for page in pages:
+            counts.update({_edge_key(page[i]) for i in _edge_indexes(page)})
+        # Колонтитул повторяется на большинстве страниц и хотя бы на трёх (в резюме из двух страниц — на обеих)
+        threshold = max(2, min(_MIN_REPEATED_PAGES, len(pages)), (len(pages) + 1) // 2)
+        repeated = {key for key, count in counts.items() if count >= threshold}
+
+    removed = 0
+    seen = set()
+    cleaned_pages = []
+    for page in pages:
+        edges = set(_edge_indexes(page))
+        cleaned = []
+        for index, line in enumerate(page):
+            if index in edges:
+                if _PAGE_NUMBER_RE.match(line):
+                    removed += 1
+                    continue
+                key = _edge_key(line)
+                if key in repeated:
+                    # Первое вхождение оставляем: в колонтитуле часто имя кандидата
+                    if key in seen:
+                        removed += 1
+                        continue
+                    seen.add(key)
+            cleaned.append(line)
+        cleaned_pages.append(cleaned)
+    return cleaned_pages, removed
+
+
+def _is_heading(line: str) -> bool:
+    if len(line) > 40 or line.endswith('.'):
+        return False
+    normalized = line.rstrip(':').strip().lower()
+    if normalized in _SECTION_HEADINGS:
+        return True
+    letters = [ch for ch in line if ch.isalpha()]
+    return len(letters) >= 4 and all(ch.isupper() for ch in letters)
+
+
+def _cap_sections(lines: List[str], max_chars: int) -> Tuple[List[str], int]:
+    """Обрезает слишком длинные разделы по границе строки"""
+    if max_chars <= 0:
+        return lines, 0
+    result = []
+    truncated = 0
+    section_length = 0
+    section_truncated = False
+    for line in lines:
+        if _is_heading(line):
+            section_length = 0
+            section_truncated = False
+            result.append(line)
+            continue
+        if section_truncated:
+            continue
+        if section_length + len(line) > max_chars:
+            result.append(_TRUNCATION_MARK)
+            section_truncated = True
+            truncated += 1
+            continue
+        section_length += len(line) + 1
+        result.append(line)
+    return result, truncated
+
+
+def compact_resume_text(text: str, section_max_chars: int = COMPACT_SECTION_MAX_CHARS,
+                        max_chars: int = COMPACT_MAX_CHARS) -> Tuple[str, Dict[str, Any]]:
+    """
+    Сжимает текст резюме перед отправкой в модель
+
+    Убирает номера страниц и повторяющиеся колонтитулы (страницы разделены символом \\f),
+    схлопывает пробелы, ограничивает длину разделов и всего текста.
+
+    Args:
+        text: Извлечённый текст резюме
+        section_max_chars: Максимальная длина одного раздела в символах
+        max_chars: Максимальная длина всего текста в символах
+
+    Returns:
+        Кортеж (сжатый текст, статистика: символы и токены до и после, удалённые строки, обрезанные разделы)
+    """
+    text = text or ""
+    pages = []
+    for page in text.split(PAGE_SEPARATOR):
+        lines = [_SPACES_RE.sub(' ', line).strip() for line in page.split('\n')]
+        pages.append([line for line in lines if line])
+
+    pages, removed_lines = _remove_page_furniture(pages)
+    lines = [line for page in pages for line in page]
+    lines, truncated_sections = _cap_sections(lines, section_max_chars)
+
+    compacted = '\n'.join(lines)
+    if max_chars > 0 and len(compacted) > max_chars:
+        compacted = compacted[:max_chars].rsplit('\n', 1)[0] + '\n' + _TRUNCATION_MARK
+        truncated_sections += 1
+
+    tokens_before = approx_tokens(text)
+    tokens_after = approx_tokens(compacted)
+    stats = {
+        'chars_before': len(text),
+        'chars_after': len(compacted),
+        'tokens_before': tokens_before,
+        'tokens_after': tokens_after,
+        'saved_tokens': max(0, tokens_before - tokens_after),
+        'removed_lines': removed_lines,
+        'truncated_sections': truncated_sections,
+    }
+    return compacted, stats